@@ -0,0 +1,175 @@
+"""
+Benchmarks of `upload_file` on synthetic inputs, against a local stand-in of the APIs.
+
+Each benchmark uploads one input into an empty Drive on the stand-in server (see
+``fake_google.py``) and reports, next to the timings, the requests and bytes it took,
+the throughput and the peak memory of the upload:
+
+* ``many_small_files``: a tree of 10,000 small files in 100 folders, uploaded file by
+  file or as one archive.
+* ``deep_nesting``: a chain of 64 nested folders with a few files each.
+* ``small_files_throttled``: 1,000 small files while 5% of the calls fail with 429.
+* ``large_csv``: a CSV of 200,000 rows written with the values API (in one go or
+  streamed), imported by Drive, or sharded across tabs.
+* ``large_binary``: a 256 MiB file sent as a resumable upload.
+
+Usage::
+
+    pip install gpush[benchmarks]
+    pytest benchmarks [--latency 0.01] [--scale 1.0] [--benchmark-json results.json]
+
+``--scale`` shrinks or grows every input, e.g. ``--scale 0.1`` for a quick check. Save a
+baseline with ``--benchmark-autosave`` and compare later runs against it with
+``--benchmark-compare``.
+"""
+
+import csv
+import os
+import random
+import string
+from typing import Any, Tuple
+
+import pytest
+
+from gpush.handlers.upload import FileDetails, UploadType
+
+JOBS = 16
+SMALL_FILE_SIZE = 512
+BLOCK = 1024 * 1024
+
+
+def write_tree(root: str, files: int, folders: int) -> Tuple[int, int]:
+    """Spread `files` small files evenly over `folders` folders under `root`."""
+    size = 0
+    for index in range(files):
+        folder = os.path.join(root, f"folder_{index % folders:03d}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"file_{index:05d}.txt"), "wb") as f:
+            size += f.write(os.urandom(SMALL_FILE_SIZE))
+    return files, size
+
+
+def write_csv(path: str, rows: int, columns: int = 10) -> int:
+    alphabet = string.ascii_letters + string.digits
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([f"column_{index}" for index in range(columns)])
+        for _ in range(rows):
+            writer.writerow(
+                ["".join(random.choices(alphabet, k=8)) for _ in range(columns)]
+            )
+    return os.path.getsize(path)
+
+
+def directory(path: str, name: str) -> FileDetails:
+    return FileDetails(
+        path=path, name=name, sheet="Sheet1", type=UploadType.DIR, jobs=JOBS
+    )
+
+
+@pytest.fixture(scope="module")
+def small_files(tmp_path_factory: Any, scale: float) -> Tuple[str, int, int]:
+    root = str(tmp_path_factory.mktemp("small_files"))
+    files, size = write_tree(root, max(int(10_000 * scale), 1), folders=100)
+    return root, files, size
+
+
+@pytest.fixture(scope="module")
+def few_small_files(tmp_path_factory: Any, scale: float) -> Tuple[str, int, int]:
+    root = str(tmp_path_factory.mktemp("few_small_files"))
+    files, size = write_tree(root, max(int(1_000 * scale), 1), folders=10)
+    return root, files, size
+
+
+@pytest.fixture(scope="module")
+def deep_tree(tmp_path_factory: Any, scale: float) -> Tuple[str, int, int]:
+    root = str(tmp_path_factory.mktemp("deep_tree"))
+    folder, files, size = root, 0, 0
+    for depth in range(max(int(64 * scale), 2)):
+        folder = os.path.join(folder, f"level_{depth:02d}")
+        os.makedirs(folder)
+        for index in range(4):
+            with open(os.path.join(folder, f"file_{index}.txt"), "wb") as f:
+                size += f.write(os.urandom(SMALL_FILE_SIZE))
+            files += 1
+    return root, files, size
+
+
+@pytest.fixture(scope="module")
+def large_csv(tmp_path_factory: Any, scale: float) -> Tuple[str, int]:
+    path = str(tmp_path_factory.mktemp("large_csv") / "large.csv")
+    return path, write_csv(path, max(int(200_000 * scale), 1))
+
+
+@pytest.fixture(scope="module")
+def large_binary(tmp_path_factory: Any, scale: float) -> Tuple[str, int]:
+    path = str(tmp_path_factory.mktemp("large_binary") / "large.bin")
+    with open(path, "wb") as f:
+        for _ in range(max(int(256 * scale), 1)):
+            f.write(os.urandom(BLOCK))
+    return path, os.path.getsize(path)
+
+
+@pytest.mark.benchmark(group="trees")
+def test_many_small_files(measure_upload: Any, small_files: Any) -> None:
+    root, files, size = small_files
+    measure_upload(directory(root, "small_files"), files=files, size=size)
+
+
+@pytest.mark.benchmark(group="trees")
+@pytest.mark.parametrize("archive", ["tar", "tar.gz", "zip"])
+def test_many_small_files_archive(
+    measure_upload: Any, small_files: Any, archive: str
+) -> None:
+    root, files, size = small_files
+    file = directory(root, "small_files")
+    file.archive = archive
+    measure_upload(file, files=files, size=size)
+
+
+@pytest.mark.benchmark(group="trees")
+def test_deep_nesting(measure_upload: Any, deep_tree: Any) -> None:
+    root, files, size = deep_tree
+    measure_upload(directory(root, "deep_tree"), files=files, size=size)
+
+
+@pytest.mark.benchmark(group="trees")
+def test_small_files_throttled(
+    measure_upload: Any, google: Any, few_small_files: Any
+) -> None:
+    root, files, size = few_small_files
+    google.configure(error_rate=0.05)
+    try:
+        stats = measure_upload(directory(root, "throttled"), files=files, size=size)
+    finally:
+        google.configure(error_rate=0.0)
+    assert stats["errors_injected"] > 0
+
+
+@pytest.mark.benchmark(group="csv")
+@pytest.mark.parametrize(
+    "mode, options",
+    [
+        ("values", dict(import_mode="never")),
+        ("stream", dict(import_mode="never", stream=True)),
+        ("import", dict(import_mode="always")),
+        ("shard", dict(shard=True, shard_rows=50_000, jobs=4)),
+    ],
+)
+def test_large_csv(
+    measure_upload: Any, large_csv: Any, mode: str, options: dict
+) -> None:
+    path, size = large_csv
+    file = FileDetails(
+        path=path, name="large.csv", sheet="Sheet1", type=UploadType.CSV, **options
+    )
+    measure_upload(file, size=size)
+
+
+@pytest.mark.benchmark(group="binary")
+def test_large_binary(measure_upload: Any, large_binary: Any) -> None:
+    path, size = large_binary
+    file = FileDetails(
+        path=path, name="large.bin", sheet="Sheet1", type=UploadType.OTHER
+    )
+    measure_upload(file, size=size)
@@ -0,0 +1,110 @@
+"""
+Fixtures of the benchmark suite in ``bench_upload.py``.
+
+The suite runs against the local stand-in of the Google APIs in ``fake_google.py``,
+started once per session in a child process. Client-side rate limits are lifted, since
+the stand-in has no quota.
+"""
+
+import os
+import tempfile
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator
+
+# Keep resumable upload sessions and checksums of the suite out of the user's state
+os.environ["GPUSH_STATE_DIR"] = tempfile.mkdtemp(prefix="gpush-bench-")
+
+import pytest  # noqa: E402
+from bench_upload import JOBS  # noqa: E402
+from fake_google import FakeGoogleProcess, local_services  # noqa: E402
+
+from gpush.auth.services import Services  # noqa: E402
+from gpush.handlers.caches import forget_listings  # noqa: E402
+from gpush.handlers.upload import FileDetails, upload_file  # noqa: E402
+from gpush.requests.retry import configure_rate_limit, retry_stats  # noqa: E402
+
+
+def pytest_addoption(parser: Any) -> None:
+    group = parser.getgroup("gpush")
+    group.addoption(
+        "--latency",
+        type=float,
+        default=0.01,
+        help="Seconds the stand-in server waits before answering each request.",
+    )
+    group.addoption(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Scale the size of the synthetic inputs, e.g. 0.1 for a quick run.",
+    )
+
+
+@pytest.fixture(scope="session")
+def scale(request: Any) -> float:
+    return request.config.getoption("--scale")
+
+
+@pytest.fixture(scope="session")
+def google(request: Any) -> Iterator[FakeGoogleProcess]:
+    with FakeGoogleProcess(latency=request.config.getoption("--latency")) as google:
+        yield google
+
+
+@pytest.fixture(scope="session")
+def services(google: FakeGoogleProcess) -> Services:
+    for api in ("drive", "sheets.read", "sheets.write"):
+        configure_rate_limit(api, 1_000_000_000)
+    return local_services(google.url, pool_size=JOBS)
+
+
+@pytest.fixture
+def measure_upload(
+    benchmark: Any, google: FakeGoogleProcess, services: Services
+) -> Callable[..., Dict[str, Any]]:
+    """
+    Benchmark `upload_file` on one input, starting every round from an empty Drive.
+
+    Besides the timings, the benchmark's `extra_info` records the requests and API calls
+    the stand-in received and the bytes sent to it in the last round, the throughput,
+    and the peak memory allocated by Python during an extra, traced run. The extra run
+    is kept out of the timings, as tracing slows the upload down.
+    """
+
+    def setup() -> Any:
+        google.reset()
+        forget_listings()
+        retry_stats.reset()
+        return (services, "root", file), {}
+
+    def measure(
+        upload: FileDetails, files: int = 1, size: int = 0, rounds: int = 3
+    ) -> Dict[str, Any]:
+        nonlocal file
+        file = upload
+        benchmark.pedantic(upload_file, setup=setup, rounds=rounds)
+        stats = google.stats()
+
+        args, _ = setup()
+        tracemalloc.start()
+        try:
+            upload_file(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        benchmark.extra_info.update(
+            requests=stats["requests"],
+            calls=sum(stats["calls"].values()),
+            errors_injected=stats["errors_injected"],
+            mib_sent=round(stats["bytes_received"] / 2**20, 2),
+            peak_memory_mib=round(peak / 2**20, 2),
+        )
+        if benchmark.stats:
+            seconds = benchmark.stats.stats.mean
+            benchmark.extra_info["files_per_second"] = round(files / seconds, 1)
+            benchmark.extra_info["mib_per_second"] = round(size / 2**20 / seconds, 2)
+        return stats
+
+    file: Any = None
+    return measure
@@ -0,0 +1,98 @@
+"""
+Compare the two ways gpush loads a CSV into a Google Sheet.
+
+The local stand-in of the Drive and Sheets APIs (see ``fake_google.py``) answers every
+request after one round-trip time (``--rtt``), so the benchmark measures what happens on
+the client: parsing the CSV, encoding the requests and the number of round-trips. The
+time Google spends converting or storing the data is not modelled. The paths are:
+
+* ``values``: the CSV is parsed into memory and written with the Sheets values API.
+* ``values --stream``: the CSV is parsed lazily and written in blocks of rows.
+* ``import``: the CSV is sent as a resumable media upload and converted by Drive.
+
+For each path the wall-clock time, the number of requests and the number of bytes sent
+are reported.
+
+Usage::
+
+    python benchmarks/csv_import.py [--rows 200000] [--columns 10] [--rtt 0.02]
+"""
+
+import csv
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from dataclasses import replace
+
+# Keep resumable upload sessions of the benchmark out of the user's state directory
+os.environ["GPUSH_STATE_DIR"] = tempfile.mkdtemp(prefix="gpush-bench-")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_google import FakeGoogleProcess, local_services  # noqa: E402
+
+from gpush.handlers.caches import forget_listings  # noqa: E402
+from gpush.handlers.upload import FileDetails, UploadType  # noqa: E402
+from gpush.requests.retry import configure_rate_limit  # noqa: E402
+
+
+def write_csv(path: str, rows: int, columns: int) -> None:
+    alphabet = string.ascii_letters + string.digits
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([f"column_{index}" for index in range(columns)])
+        for _ in range(rows):
+            writer.writerow(
+                ["".join(random.choices(alphabet, k=8)) for _ in range(columns)]
+            )
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--columns", type=int, default=10)
+    parser.add_argument("--rtt", type=float, default=0.02, help="Round trip, seconds.")
+    args = parser.parse_args()
+
+    # The stand-in server has no quota
+    for api in ("drive", "sheets.read", "sheets.write"):
+        configure_rate_limit(api, 1_000_000)
+
+    from gpush.handlers.spreadsheet import spreadsheet_handler
+
+    with FakeGoogleProcess(
+        latency=args.rtt
+    ) as google, tempfile.TemporaryDirectory() as directory:
+        services = local_services(google.url)
+        path = os.path.join(directory, "bench.csv")
+        write_csv(path, args.rows, args.columns)
+        size = os.path.getsize(path)
+        print(f"{args.rows} rows x {args.columns} columns, {size / 2**20:.1f} MiB")
+
+        base = FileDetails(
+            path=path, name="bench.csv", sheet="Sheet1", type=UploadType.CSV
+        )
+        paths = {
+            "values": dict(import_mode="never"),
+            "values --stream": dict(import_mode="never", stream=True),
+            "import": dict(import_mode="always"),
+        }
+        for name, options in paths.items():
+            file = replace(base, **options)
+            google.reset()
+            forget_listings()
+            start = time.perf_counter()
+            spreadsheet_handler(services, "root", file)
+            seconds = time.perf_counter() - start
+            stats = google.stats()
+            print(
+                f"{name:<18}{seconds:8.2f} s{stats['requests']:8d} requests"
+                f"{stats['bytes_received'] / 2**20:10.1f} MiB sent"
+            )
+
+
+if __name__ == "__main__":
+    main()
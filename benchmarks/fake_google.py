@@ -0,0 +1,959 @@
+"""
+A local stand-in for the parts of the Google Drive v3 and Sheets v4 APIs used by gpush.
+
+The server keeps Drive files, folders and spreadsheets in memory and implements the
+calls gpush makes:
+
+* Drive: ``files.list``, ``files.get`` (including ranged media downloads),
+  ``files.create``, ``files.update``, ``files.copy``, resumable media uploads (including
+  the conversion of CSVs into spreadsheets) and batch requests.
+* Sheets: ``spreadsheets.get`` and ``spreadsheets.batchUpdate`` (``addSheet``,
+  ``deleteSheet``, ``updateSheetProperties`` and ``updateCells``), and ``values.get``,
+  ``values.update``, ``values.append`` and ``values.batchUpdate``.
+
+Like the real APIs it enforces the limits gpush has to respect: at most 100 calls per
+batch, cell writes within the grid, and 10 million cells per spreadsheet. Every request
+waits ``latency`` seconds before it is answered, and a fraction ``error_rate`` of the
+calls is rejected with ``429 Too Many Requests`` to exercise the retry paths.
+
+The server runs in a process of its own (see `FakeGoogleProcess`), so that it competes
+with the client neither for the GIL nor in the client's memory measurements. It is
+controlled through a few extra endpoints: ``GET /_fake/stats`` returns the number of
+requests and calls and the bytes transferred, ``POST /_fake/reset`` drops all state and
+``POST /_fake/config`` changes ``latency``, ``error_rate`` and ``retry_after``.
+
+Usage::
+
+    python benchmarks/fake_google.py [--port 8080] [--latency 0.02] [--error-rate 0.01]
+"""
+
+from __future__ import annotations
+
+import copy
+import csv
+import email.parser
+import hashlib
+import io
+import json
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from argparse import ArgumentParser
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+SPREADSHEET_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+MAX_BATCH_SIZE = 100
+SPREADSHEET_CELL_LIMIT = 10_000_000
+DEFAULT_ROWS = 1000
+DEFAULT_COLUMNS = 26
+ROOT_FOLDER = "root"
+
+
+class ApiError(Exception):
+    """An error response in the format of the Google APIs."""
+
+    def __init__(
+        self,
+        status: int,
+        message: str,
+        reason: str = "invalid",
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.reason = reason
+        self.headers = headers or {}
+
+    def response(self) -> Response:
+        body = {
+            "error": {
+                "code": self.status,
+                "message": self.message,
+                "errors": [{"reason": self.reason, "message": self.message}],
+            }
+        }
+        return Response.json(self.status, body, self.headers)
+
+
+@dataclass
+class Response:
+    status: int
+    body: bytes = b""
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @staticmethod
+    def json(
+        status: int, body: Any, headers: Optional[Dict[str, str]] = None
+    ) -> Response:
+        headers = {"Content-Type": "application/json; charset=UTF-8", **(headers or {})}
+        return Response(status, json.dumps(body).encode(), headers)
+
+
+@dataclass
+class Sheet:
+    sheet_id: int
+    title: str
+    rows: int = DEFAULT_ROWS
+    columns: int = DEFAULT_COLUMNS
+    hidden: bool = False
+    # Only rows holding values are stored, keyed by their 0-based index
+    cells: Dict[int, List[Any]] = field(default_factory=dict)
+
+    def properties(self, index: int) -> Dict[str, Any]:
+        return {
+            "sheetId": self.sheet_id,
+            "title": self.title,
+            "index": index,
+            "sheetType": "GRID",
+            "hidden": self.hidden,
+            "gridProperties": {"rowCount": self.rows, "columnCount": self.columns},
+        }
+
+    def write(self, row: int, column: int, values: List[List[Any]]) -> None:
+        for offset, new in enumerate(values):
+            current = self.cells.setdefault(row + offset, [])
+            end = column + len(new)
+            if len(current) < end:
+                current.extend([""] * (end - len(current)))
+            current[column:end] = new
+
+    def resize(self, rows: int, columns: int) -> None:
+        self.rows, self.columns = rows, columns
+        for index in [index for index in self.cells if index >= rows]:
+            del self.cells[index]
+        for values in self.cells.values():
+            del values[columns:]
+
+    def last_row(self) -> int:
+        """The 0-based index of the last row holding a value, or -1."""
+        filled = [index for index, values in self.cells.items() if any(values)]
+        return max(filled, default=-1)
+
+
+@dataclass
+class Spreadsheet:
+    id: str
+    sheets: List[Sheet] = field(default_factory=list)
+    next_sheet_id: int = 0
+
+    def add(self, title: str, **properties: Any) -> Sheet:
+        if self.find(title) is not None:
+            raise ApiError(
+                400, f'A sheet with the name "{title}" already exists.', "badRequest"
+            )
+        sheet = Sheet(sheet_id=self.next_sheet_id, title=title, **properties)
+        self.next_sheet_id += 1
+        self.sheets.append(sheet)
+        return sheet
+
+    def find(self, title: str) -> Optional[Sheet]:
+        return next((sheet for sheet in self.sheets if sheet.title == title), None)
+
+    def by_id(self, sheet_id: int) -> Sheet:
+        for sheet in self.sheets:
+            if sheet.sheet_id == sheet_id:
+                return sheet
+        raise ApiError(400, f"No grid with id: {sheet_id}", "badRequest")
+
+    def check_cell_limit(self) -> None:
+        cells = sum(sheet.rows * sheet.columns for sheet in self.sheets)
+        if cells > SPREADSHEET_CELL_LIMIT:
+            raise ApiError(
+                400,
+                f"This action would increase the number of cells in the workbook above "
+                f"the limit of {SPREADSHEET_CELL_LIMIT} cells.",
+                "badRequest",
+            )
+
+
+@dataclass
+class UploadSession:
+    metadata: Dict[str, Any]
+    file_id: Optional[str] = None
+    received: int = 0
+    md5: Any = field(default_factory=hashlib.md5)
+    content: bytearray = field(default_factory=bytearray)
+    # Whether Drive converts the upload into a spreadsheet
+    convert: bool = False
+    result: Optional[Dict[str, Any]] = None
+
+
+def column_index(letters: str) -> int:
+    """Convert column letters into a 0-based index, e.g. "A" -> 0 and "AB" -> 27."""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+def column_letters(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+CELL = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+
+def parse_range(a1: str) -> Tuple[str, int, int, Optional[int], Optional[int]]:
+    """
+    Parse an A1 range into the sheet title, the 0-based first row and column and the
+    0-based last row and column, which are None for open ranges.
+    """
+    if a1.startswith("'"):
+        end = 1
+        while True:
+            end = a1.index("'", end)
+            if a1[end + 1 : end + 2] == "'":
+                end += 2
+                continue
+            break
+        title, rest = a1[1:end].replace("''", "'"), a1[end + 1 :]
+    else:
+        title, _, rest = a1.partition("!")
+        rest = "!" + rest if rest else ""
+    match = CELL.match(rest.lstrip("!"))
+    if match is None:
+        raise ApiError(400, f"Unable to parse range: {a1}", "badRequest")
+    first_column, first_row, last_column, last_row = match.groups()
+    return (
+        title,
+        int(first_row) - 1 if first_row else 0,
+        column_index(first_column) if first_column else 0,
+        int(last_row) - 1 if last_row else None,
+        column_index(last_column) if last_column else None,
+    )
+
+
+def format_range(title: str, row: int, column: int, rows: int, columns: int) -> str:
+    quoted = title.replace("'", "''")
+    return (
+        f"'{quoted}'!{column_letters(column)}{row + 1}:"
+        f"{column_letters(column + max(columns, 1) - 1)}{row + max(rows, 1)}"
+    )
+
+
+def _cell_value(cell: Dict[str, Any]) -> Any:
+    value = cell.get("userEnteredValue", {})
+    for key in ("stringValue", "numberValue", "boolValue", "formulaValue"):
+        if key in value:
+            return value[key]
+    return ""
+
+
+class FakeGoogle:
+    """The in-memory state of the stand-in server and the request dispatcher."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: float = 0.05,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        # Like Drive IDs, IDs are never reused, not even after a reset; clients may
+        # still have the old files cached
+        self.ids = count()
+        self.reset()
+
+    def reset(self) -> None:
+        self.files: Dict[str, Dict[str, Any]] = {
+            ROOT_FOLDER: {
+                "id": ROOT_FOLDER,
+                "name": "My Drive",
+                "mimeType": FOLDER_MIME_TYPE,
+                "parents": [],
+            }
+        }
+        self.spreadsheets: Dict[str, Spreadsheet] = {}
+        # The content of uploaded files, for media downloads
+        self.contents: Dict[str, bytearray] = {}
+        self.sessions: Dict[str, UploadSession] = {}
+        self.stats: Dict[str, Any] = {
+            "requests": 0,
+            "bytes_received": 0,
+            "bytes_sent": 0,
+            "errors_injected": 0,
+            "calls": Counter(),
+        }
+
+    def configure(self, options: Dict[str, Any]) -> None:
+        for name in ("latency", "error_rate", "retry_after"):
+            if name in options:
+                setattr(self, name, float(options[name]))
+
+    def handle(
+        self, method: str, target: str, headers: Dict[str, str], body: bytes
+    ) -> Response:
+        """Answer one HTTP request."""
+        url = urlsplit(target)
+        if url.path.startswith("/_fake/"):
+            return self._control(method, url.path, body)
+
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_received"] += len(body)
+        time.sleep(self.latency)
+
+        if url.path.startswith("/batch/"):
+            response = self._batch(headers, body)
+        else:
+            response = self.call(method, target, headers, body)
+        with self.lock:
+            self.stats["bytes_sent"] += len(response.body)
+        return response
+
+    def call(
+        self, method: str, target: str, headers: Dict[str, str], body: bytes
+    ) -> Response:
+        """Answer one API call, which may be part of a batch."""
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        # Ranges in Sheets paths may contain encoded slashes, so split before decoding
+        path = [unquote(part) for part in url.path.strip("/").split("/")]
+        lower_headers = {key.lower(): value for key, value in headers.items()}
+        data = None
+        if body and "json" in lower_headers.get("content-type", ""):
+            data = json.loads(body)
+
+        try:
+            with self.lock:
+                operation, handler = self._route(method, path)
+                self.stats["calls"][operation] += 1
+                self._inject_error()
+                return handler(path, query, lower_headers, body, data)
+        except ApiError as e:
+            return e.response()
+        except Exception as e:
+            # A bug in the stand-in; answer instead of dropping the connection
+            return ApiError(500, f"{type(e).__name__}: {e}", "backendError").response()
+
+    def _inject_error(self) -> None:
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats["errors_injected"] += 1
+            raise ApiError(
+                429,
+                "Rate Limit Exceeded",
+                "rateLimitExceeded",
+                {"Retry-After": f"{self.retry_after:g}"},
+            )
+
+    def _route(self, method: str, path: List[str]) -> Tuple[str, Any]:
+        match method, path:
+            case "GET", ["drive", "v3", "files"]:
+                return "drive.files.list", self._list_files
+            case "POST", ["drive", "v3", "files"]:
+                return "drive.files.create", self._create_file
+            case "GET", ["drive", "v3", "files", _]:
+                return "drive.files.get", self._get_file
+            case "PATCH", ["drive", "v3", "files", _]:
+                return "drive.files.update", self._update_file
+            case "POST", ["drive", "v3", "files", _, "copy"]:
+                return "drive.files.copy", self._copy_file
+            case "POST", ["upload", "drive", "v3", "files"]:
+                return "drive.files.create[upload]", self._start_upload
+            case "PATCH", ["upload", "drive", "v3", "files", _]:
+                return "drive.files.update[upload]", self._start_upload
+            case "PUT", ["upload", "session", _]:
+                return "drive.files[chunk]", self._upload_chunk
+            case "GET", ["v4", "spreadsheets", _]:
+                return "sheets.spreadsheets.get", self._get_spreadsheet
+            case "POST", ["v4", "spreadsheets", target] if target.endswith(
+                ":batchUpdate"
+            ):
+                return "sheets.spreadsheets.batchUpdate", self._batch_update
+            case "POST", ["v4", "spreadsheets", _, "values:batchUpdate"]:
+                return "sheets.values.batchUpdate", self._values_batch_update
+            case "POST", ["v4", "spreadsheets", _, "values", target] if target.endswith(
+                ":append"
+            ):
+                return "sheets.values.append", self._values_append
+            case "PUT", ["v4", "spreadsheets", _, "values", _]:
+                return "sheets.values.update", self._values_update
+            case "GET", ["v4", "spreadsheets", _, "values", _]:
+                return "sheets.values.get", self._values_get
+        raise ApiError(
+            404, f"{method} /{'/'.join(path)} is not implemented.", "notFound"
+        )
+
+    def _control(self, method: str, path: str, body: bytes) -> Response:
+        with self.lock:
+            if method == "GET" and path == "/_fake/stats":
+                return Response.json(200, self.stats)
+            if method == "POST" and path == "/_fake/reset":
+                self.reset()
+                return Response.json(200, {})
+            if method == "POST" and path == "/_fake/config":
+                self.configure(json.loads(body or b"{}"))
+                return Response.json(200, {})
+        return ApiError(404, f"Unknown control endpoint {path}.").response()
+
+    # Drive
+
+    def _file(self, file_id: str) -> Dict[str, Any]:
+        try:
+            return self.files[file_id]
+        except KeyError:
+            raise ApiError(404, f"File not found: {file_id}.", "notFound") from None
+
+    def _new_file(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        parents = metadata.get("parents") or [ROOT_FOLDER]
+        for parent in parents:
+            if self._file(parent)["mimeType"] != FOLDER_MIME_TYPE:
+                raise ApiError(400, f"Parent {parent} is not a folder.", "badRequest")
+        file = {
+            "id": f"file{next(self.ids)}",
+            "name": metadata.get("name", "Untitled"),
+            "mimeType": metadata.get("mimeType", "application/octet-stream"),
+            "parents": parents,
+            "appProperties": dict(metadata.get("appProperties", {})),
+        }
+        self.files[file["id"]] = file
+        if file["mimeType"] == SPREADSHEET_MIME_TYPE:
+            spreadsheet = Spreadsheet(id=file["id"])
+            spreadsheet.add("Sheet1")
+            self.spreadsheets[file["id"]] = spreadsheet
+        return file
+
+    def _list_files(self, path, query, headers, body, data) -> Response:
+        files = list(self.files.values())
+        parent = re.search(r"'([^']+)' in parents", query.get("q", ""))
+        if parent:
+            files = [f for f in files if parent.group(1) in f["parents"]]
+        if "trashed = false" in query.get("q", ""):
+            files = [f for f in files if not f.get("trashed")]
+        for key in ("name", "mimeType"):
+            value = re.search(rf"{key} = '((?:[^'\\]|\\.)*)'", query.get("q", ""))
+            if value:
+                wanted = re.sub(r"\\(.)", r"\1", value.group(1))
+                files = [f for f in files if f[key] == wanted]
+        start = int(query.get("pageToken") or 0)
+        page_size = int(query.get("pageSize") or 100)
+        result: Dict[str, Any] = {"files": files[start : start + page_size]}
+        if start + page_size < len(files):
+            result["nextPageToken"] = str(start + page_size)
+        return Response.json(200, result)
+
+    def _create_file(self, path, query, headers, body, data) -> Response:
+        return Response.json(200, self._new_file(data or {}))
+
+    def _get_file(self, path, query, headers, body, data) -> Response:
+        file = self._file(path[3])
+        if query.get("alt") != "media":
+            return Response.json(200, file)
+
+        content = self.contents.get(file["id"])
+        if content is None:
+            raise ApiError(
+                403,
+                "Only files with binary content can be downloaded.",
+                "fileNotDownloadable",
+            )
+        # "bytes=0-1023" or "bytes=1024-"
+        span = headers.get("range", "").partition("=")[2]
+        if not span:
+            return Response(200, bytes(content))
+        first, _, last = span.partition("-")
+        start, end = int(first), min(int(last or len(content) - 1), len(content) - 1)
+        if start > end:
+            raise ApiError(
+                416, "Request range not satisfiable.", "requestedRangeNotSatisfiable"
+            )
+        return Response(
+            206,
+            bytes(content[start : end + 1]),
+            {"Content-Range": f"bytes {start}-{end}/{len(content)}"},
+        )
+
+    @staticmethod
+    def _set_properties(file: Dict[str, Any], properties: Dict[str, Any]) -> None:
+        # Null values delete a property
+        for key, value in properties.items():
+            if value is None:
+                file["appProperties"].pop(key, None)
+            else:
+                file["appProperties"][key] = value
+
+    def _update_file(self, path, query, headers, body, data) -> Response:
+        file = self._file(path[3])
+        for key, value in (data or {}).items():
+            if key == "appProperties":
+                self._set_properties(file, value)
+            elif key in ("name", "mimeType", "trashed"):
+                file[key] = value
+        return Response.json(200, file)
+
+    def _copy_file(self, path, query, headers, body, data) -> Response:
+        source = self._file(path[3])
+        if source["mimeType"] == FOLDER_MIME_TYPE:
+            raise ApiError(403, "Folders cannot be copied.", "cannotCopyFile")
+        file = self._new_file(
+            {
+                "name": source["name"],
+                "mimeType": source["mimeType"],
+                "parents": source["parents"],
+                **(data or {}),
+            }
+        )
+        for key in ("md5Checksum", "size"):
+            if key in source:
+                file[key] = source[key]
+        if source["id"] in self.contents:
+            self.contents[file["id"]] = self.contents[source["id"]]
+        if source["id"] in self.spreadsheets:
+            self.spreadsheets[file["id"]] = copy.deepcopy(
+                self.spreadsheets[source["id"]]
+            )
+            self.spreadsheets[file["id"]].id = file["id"]
+        return Response.json(200, file)
+
+    def _start_upload(self, path, query, headers, body, data) -> Response:
+        if query.get("uploadType") != "resumable":
+            raise ApiError(400, "Only resumable uploads are implemented.", "badRequest")
+        file_id = path[4] if len(path) > 4 else None
+        metadata = data or {}
+        mime_type = metadata.get("mimeType")
+        if file_id is not None:
+            # New media for a Google Sheet is converted like an import
+            mime_type = mime_type or self._file(file_id).get("mimeType")
+        session = UploadSession(metadata=metadata, file_id=file_id)
+        session.convert = mime_type == SPREADSHEET_MIME_TYPE
+        session_id = f"session{next(self.ids)}"
+        self.sessions[session_id] = session
+        location = (
+            f"http://{headers.get('host', 'localhost')}/upload/session/{session_id}"
+        )
+        return Response.json(200, {}, {"Location": location})
+
+    def _upload_chunk(self, path, query, headers, body, data) -> Response:
+        session = self.sessions.get(path[2])
+        if session is None:
+            raise ApiError(404, "Upload session not found.", "notFound")
+        if session.result is not None:
+            return Response.json(200, session.result)
+
+        # "bytes 0-1023/4096", "bytes 0-1023/*" or "bytes */4096"
+        span, _, total = headers.get("content-range", "").split(" ")[-1].partition("/")
+        if span != "*":
+            first = int(span.split("-")[0])
+            if first > session.received:
+                raise ApiError(400, "Chunk starts after the confirmed bytes.")
+            new = body[session.received - first :]
+            session.md5.update(new)
+            session.content += new
+            session.received += len(new)
+
+        if total != "*" and session.received >= int(total):
+            session.result = self._finish_upload(session)
+            return Response.json(200, session.result)
+        headers = (
+            {"Range": f"bytes=0-{session.received - 1}"} if session.received else {}
+        )
+        return Response(308, b"", headers)
+
+    def _finish_upload(self, session: UploadSession) -> Dict[str, Any]:
+        if session.file_id is None:
+            file = self._new_file(session.metadata)
+        else:
+            file = self._file(session.file_id)
+            file.update(
+                {k: v for k, v in session.metadata.items() if k in ("name", "mimeType")}
+            )
+            self._set_properties(file, session.metadata.get("appProperties", {}))
+        if session.convert:
+            # A CSV converted into a spreadsheet whose one sheet holds the data
+            rows = list(csv.reader(io.StringIO(session.content.decode("utf-8"))))
+            spreadsheet = Spreadsheet(id=file["id"])
+            sheet = spreadsheet.add(
+                file["name"],
+                rows=max(len(rows), 1),
+                columns=max((len(row) for row in rows), default=1) or 1,
+            )
+            sheet.write(0, 0, rows)
+            spreadsheet.check_cell_limit()
+            self.spreadsheets[file["id"]] = spreadsheet
+        else:
+            file["md5Checksum"] = session.md5.hexdigest()
+            file["size"] = str(session.received)
+            self.contents[file["id"]] = session.content
+        return file
+
+    def _batch(self, headers: Dict[str, str], body: bytes) -> Response:
+        content_type = next(
+            (v for k, v in headers.items() if k.lower() == "content-type"), ""
+        )
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        if not message.is_multipart():
+            return ApiError(400, "Batch requests must be multipart.").response()
+        parts = message.get_payload()
+        if len(parts) > MAX_BATCH_SIZE:
+            return ApiError(
+                400, f"A batch may contain at most {MAX_BATCH_SIZE} calls."
+            ).response()
+
+        boundary = f"batch_{next(self.ids)}"
+        output = []
+        for part in parts:
+            # A request line followed by a MIME message, e.g. "GET /drive/v3/files HTTP/1.1"
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, target, _ = request_line.strip().split(" ", 2)
+            request = email.parser.Parser().parsestr(rest)
+            response = self.call(
+                method,
+                target,
+                dict(request.items()),
+                request.get_payload().encode(),
+            )
+            reason = "OK" if response.status < 400 else "Error"
+            lines = [f"HTTP/1.1 {response.status} {reason}"]
+            lines += [f"{k}: {v}" for k, v in response.headers.items()]
+            output.append(
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'].strip('<>')}>\r\n\r\n"
+                + "\r\n".join(lines)
+                + "\r\n\r\n"
+                + response.body.decode()
+                + "\r\n"
+            )
+        payload = ("".join(output) + f"--{boundary}--\r\n").encode()
+        return Response(
+            200, payload, {"Content-Type": f"multipart/mixed; boundary={boundary}"}
+        )
+
+    # Sheets
+
+    def _spreadsheet(self, spreadsheet_id: str) -> Spreadsheet:
+        spreadsheet_id = spreadsheet_id.split(":")[0]
+        try:
+            return self.spreadsheets[spreadsheet_id]
+        except KeyError:
+            raise ApiError(
+                404, f"Requested entity was not found: {spreadsheet_id}.", "notFound"
+            ) from None
+
+    def _sheet(self, spreadsheet: Spreadsheet, title: str) -> Sheet:
+        sheet = spreadsheet.find(title)
+        if sheet is None:
+            raise ApiError(400, f"Unable to parse range: {title}", "badRequest")
+        return sheet
+
+    def _get_spreadsheet(self, path, query, headers, body, data) -> Response:
+        spreadsheet = self._spreadsheet(path[2])
+        return Response.json(
+            200,
+            {
+                "spreadsheetId": spreadsheet.id,
+                "sheets": [
+                    {"properties": sheet.properties(index)}
+                    for index, sheet in enumerate(spreadsheet.sheets)
+                ],
+            },
+        )
+
+    def _batch_update(self, path, query, headers, body, data) -> Response:
+        spreadsheet = self._spreadsheet(path[2])
+        replies = [self._apply(spreadsheet, request) for request in data["requests"]]
+        spreadsheet.check_cell_limit()
+        return Response.json(200, {"spreadsheetId": spreadsheet.id, "replies": replies})
+
+    def _apply(self, spreadsheet: Spreadsheet, request: Dict[str, Any]) -> Any:
+        (kind, details), *_ = request.items()
+        if kind == "addSheet":
+            properties = details.get("properties", {})
+            grid = properties.get("gridProperties", {})
+            sheet = spreadsheet.add(
+                properties.get("title", f"Sheet{spreadsheet.next_sheet_id + 1}"),
+                rows=grid.get("rowCount", DEFAULT_ROWS),
+                columns=grid.get("columnCount", DEFAULT_COLUMNS),
+                hidden=properties.get("hidden", False),
+            )
+            index = spreadsheet.sheets.index(sheet)
+            return {"addSheet": {"properties": sheet.properties(index)}}
+        if kind == "deleteSheet":
+            spreadsheet.sheets.remove(spreadsheet.by_id(details["sheetId"]))
+            return {}
+        if kind == "updateSheetProperties":
+            properties = details["properties"]
+            sheet = spreadsheet.by_id(properties.get("sheetId", 0))
+            if "title" in properties:
+                if spreadsheet.find(properties["title"]) not in (None, sheet):
+                    raise ApiError(400, "A sheet with that name already exists.")
+                sheet.title = properties["title"]
+            if "hidden" in properties:
+                sheet.hidden = properties["hidden"]
+            grid = properties.get("gridProperties", {})
+            if grid:
+                sheet.resize(
+                    grid.get("rowCount", sheet.rows),
+                    grid.get("columnCount", sheet.columns),
+                )
+            return {}
+        if kind == "updateCells":
+            if "range" in details:
+                # gpush only sends whole-sheet ranges, to clear a sheet
+                spreadsheet.by_id(details["range"].get("sheetId", 0)).cells.clear()
+                return {}
+            start = details["start"]
+            sheet = spreadsheet.by_id(start.get("sheetId", 0))
+            row, column = start.get("rowIndex", 0), start.get("columnIndex", 0)
+            values = [
+                [_cell_value(cell) for cell in data.get("values", [])]
+                for data in details.get("rows", [])
+            ]
+            width = max((len(v) for v in values), default=0)
+            if row + len(values) > sheet.rows or column + width > sheet.columns:
+                raise ApiError(
+                    400,
+                    f"Range ({sheet.title}!{column_letters(column)}{row + 1}) exceeds "
+                    f"grid limits. Max rows: {sheet.rows}, max columns: "
+                    f"{sheet.columns}",
+                    "badRequest",
+                )
+            sheet.write(row, column, values)
+            return {}
+        raise ApiError(400, f"Request {kind} is not implemented.", "badRequest")
+
+    def _write_values(
+        self,
+        spreadsheet: Spreadsheet,
+        a1: str,
+        values: List[List[Any]],
+        append: bool = False,
+    ) -> Dict[str, Any]:
+        title, row, column, _, _ = parse_range(a1)
+        sheet = self._sheet(spreadsheet, title)
+        if append:
+            row = max(row, sheet.last_row() + 1)
+        width = max((len(v) for v in values), default=0)
+        # Writes through the values API grow the grid as needed
+        sheet.resize(
+            max(sheet.rows, row + len(values)), max(sheet.columns, column + width)
+        )
+        spreadsheet.check_cell_limit()
+        sheet.write(row, column, values)
+        return {
+            "spreadsheetId": spreadsheet.id,
+            "updatedRange": format_range(title, row, column, len(values), width),
+            "updatedRows": len(values),
+            "updatedColumns": width,
+            "updatedCells": sum(len(v) for v in values),
+        }
+
+    def _values_update(self, path, query, headers, body, data) -> Response:
+        spreadsheet = self._spreadsheet(path[2])
+        result = self._write_values(spreadsheet, path[4], data.get("values", []))
+        return Response.json(200, result)
+
+    def _values_append(self, path, query, headers, body, data) -> Response:
+        spreadsheet = self._spreadsheet(path[2])
+        a1 = path[4][: -len(":append")]
+        updates = self._write_values(
+            spreadsheet, a1, data.get("values", []), append=True
+        )
+        return Response.json(200, {"spreadsheetId": spreadsheet.id, "updates": updates})
+
+    def _values_batch_update(self, path, query, headers, body, data) -> Response:
+        spreadsheet = self._spreadsheet(path[2])
+        responses = [
+            self._write_values(spreadsheet, item["range"], item.get("values", []))
+            for item in data.get("data", [])
+        ]
+        return Response.json(
+            200,
+            {
+                "spreadsheetId": spreadsheet.id,
+                "totalUpdatedCells": sum(r["updatedCells"] for r in responses),
+                "responses": responses,
+            },
+        )
+
+    def _values_get(self, path, query, headers, body, data) -> Response:
+        spreadsheet = self._spreadsheet(path[2])
+        title, row, column, last_row, last_column = parse_range(path[4])
+        sheet = self._sheet(spreadsheet, title)
+        last_row = sheet.last_row() if last_row is None else last_row
+        end = None if last_column is None else last_column + 1
+        values = []
+        for index in range(row, last_row + 1):
+            values.append(sheet.cells.get(index, [])[column:end])
+        # Like the real API, trailing empty cells and rows are left out
+        values = [list(v) for v in values]
+        for v in values:
+            while v and v[-1] == "":
+                v.pop()
+        while values and not values[-1]:
+            values.pop()
+        result: Dict[str, Any] = {"range": path[4], "majorDimension": "ROWS"}
+        if values:
+            result["values"] = values
+        return Response.json(200, result)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _handle(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        response = self.server.fake.handle(  # type: ignore[attr-defined]
+            self.command, self.path, dict(self.headers.items()), body
+        )
+        self.send_response(response.status)
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(response.body)))
+        self.end_headers()
+        self.wfile.write(response.body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def serve(fake: FakeGoogle, port: int = 0) -> ThreadingHTTPServer:
+    """Start serving `fake` on a background thread and return the server."""
+    server = ThreadingHTTPServer(("localhost", port), Handler)
+    server.daemon_threads = True
+    server.fake = fake  # type: ignore[attr-defined]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeGoogleProcess:
+    """
+    Runs the stand-in server in a child process and talks to its control endpoints.
+
+    Example:
+        with FakeGoogleProcess(latency=0.02) as google:
+            services = local_services(google.url)
+            ...
+            print(google.stats()["requests"])
+    """
+
+    def __init__(
+        self, latency: float = 0.0, error_rate: float = 0.0, retry_after: float = 0.05
+    ) -> None:
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                __file__,
+                "--latency",
+                str(latency),
+                "--error-rate",
+                str(error_rate),
+                "--retry-after",
+                str(retry_after),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        # The server announces its URL once it is listening
+        self.url = self.process.stdout.readline().strip()  # type: ignore[union-attr]
+        if not self.url:
+            self.close()
+            raise RuntimeError("The stand-in server failed to start.")
+
+    def __enter__(self) -> FakeGoogleProcess:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _control(self, path: str, options: Optional[Dict[str, Any]] = None) -> Any:
+        data = None if options is None else json.dumps(options).encode()
+        with urllib.request.urlopen(f"{self.url}/_fake/{path}", data=data) as response:
+            return json.loads(response.read())
+
+    def stats(self) -> Dict[str, Any]:
+        return self._control("stats")
+
+    def reset(self) -> None:
+        self._control("reset", {})
+
+    def configure(self, **options: float) -> None:
+        self._control("config", options)
+
+    def close(self) -> None:
+        self.process.terminate()
+        self.process.wait()
+
+
+def local_services(url: str, pool_size: int = 10) -> Any:
+    """
+    Return gpush `Services` whose Drive and Sheets clients talk to the server at `url`.
+
+    Like the CLI does for ``--jobs``, pass a `pool_size` of at least the number of
+    concurrent workers.
+
+    The client libraries are imported here rather than at the top of the module, so the
+    server process does not pay for them.
+    """
+    from google.auth.credentials import AnonymousCredentials
+    from googleapiclient.discovery import build_from_document
+
+    from gpush.auth.services import Services, _discovery_document
+    from gpush.auth.transport import PooledTransport
+
+    def transport_factory(credentials: Any) -> PooledTransport:
+        transport = PooledTransport(credentials, pool_size=pool_size)
+        # Otherwise proxy settings from the environment would apply to localhost
+        transport.session.trust_env = False
+        return transport
+
+    services = Services(
+        credentials=AnonymousCredentials(), transport_factory=transport_factory
+    )
+    for api, version in (("drive", "v3"), ("sheets", "v4")):
+        document = copy.deepcopy(_discovery_document(api, version))
+        document["rootUrl"] = f"{url}/"
+        document["baseUrl"] = f"{url}/{document['servicePath']}"
+        # The clients are built eagerly, in place of the ones `Services` would build
+        setattr(
+            services, f"_{api}", build_from_document(document, http=services.transport)
+        )
+    return services
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.05, help="Seconds.")
+    args = parser.parse_args()
+
+    fake = FakeGoogle(args.latency, args.error_rate, args.retry_after)
+    server = serve(fake, args.port)
+    print(f"http://localhost:{server.server_address[1]}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measure the fixed start-up cost of gpush.
+
+Each scenario runs in a fresh interpreter, as it would when gpush is started from cron,
+and the median wall-clock time over several runs is reported:
+
+* ``help``: ``gpush --help``.
+* ``single-upload``: everything a single small upload does before its first request,
+  i.e. importing the upload handlers and building the Drive client.
+
+Usage::
+
+    python benchmarks/startup.py [--runs 20]
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+SCENARIOS = {
+    "help": [
+        "import sys",
+        "sys.argv = ['gpush', '--help']",
+        "from gpush.cli import main",
+        "try:\n    main()\nexcept SystemExit:\n    pass",
+    ],
+    "single-upload": [
+        "from google.auth.credentials import AnonymousCredentials",
+        "from gpush.auth.services import Services",
+        "import gpush.handlers.upload",
+        "Services(credentials=AnonymousCredentials()).drive",
+    ],
+}
+
+
+def run(code: str, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL
+        )
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    baseline = run("pass", args.runs)
+    print(f"{'python -c pass':<16}{baseline * 1000:8.1f} ms")
+    for name, lines in SCENARIOS.items():
+        elapsed = run("\n".join(lines), args.runs)
+        print(f"{name:<16}{elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
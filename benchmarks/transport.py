@@ -0,0 +1,166 @@
+"""
+Compare the per-request latency of gpush's HTTP transports.
+
+A local HTTPS server with a self-signed certificate stands in for the Google APIs. To
+model a real network, it waits one round-trip time (``--rtt``) per request and two more
+per new connection for the TCP and TLS handshakes. The benchmark runs a number of pushes,
+each of which sends small requests from a fresh pool of worker threads, the way
+`gpush --jobs` does, and reports the mean latency per request:
+
+* ``httplib2 per request``: a new `httplib2.Http` for every request, i.e. a handshake
+  per request.
+* ``httplib2 per thread``: one `httplib2.Http` per worker thread of each push, which is
+  what gpush used before the pooled transport (`ThreadLocalServices` cloning a client
+  per thread).
+* ``pooled``: one `PooledTransport` shared by all threads and pushes.
+
+Usage (needs ``cryptography`` for the certificate, see ``gpush[benchmarks]``)::
+
+    python benchmarks/transport.py [--pushes 10] [--requests 40] [--threads 8] [--rtt 0.02]
+"""
+
+import datetime
+import json
+import os
+import ssl
+import statistics
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Tuple
+
+import httplib2
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from google.auth.credentials import AnonymousCredentials
+
+from gpush.auth.transport import PooledTransport
+
+
+def self_signed_certificate(directory: str) -> Tuple[str, str]:
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False
+        )
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+    return cert_path, key_path
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, which stalls on delayed ACKs otherwise
+    disable_nagle_algorithm = True
+    rtt = 0.0
+
+    def setup(self) -> None:
+        super().setup()
+        time.sleep(2 * self.rtt)
+
+    def do_GET(self) -> None:
+        time.sleep(self.rtt)
+        body = json.dumps({"files": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def serve(cert_path: str, key_path: str) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("localhost", 0), Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(
+    send: Callable[[threading.local], None], pushes: int, requests: int, threads: int
+) -> float:
+    timings = []
+
+    def timed(local: threading.local) -> None:
+        start = time.perf_counter()
+        send(local)
+        timings.append(time.perf_counter() - start)
+
+    for _ in range(pushes):
+        local = threading.local()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(lambda _: timed(local), range(requests)))
+    return statistics.mean(timings)
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--pushes", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=40, help="Requests per push.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rtt", type=float, default=0.02, help="Round trip, seconds.")
+    args = parser.parse_args()
+    Handler.rtt = args.rtt
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert_path, key_path = self_signed_certificate(directory)
+        server = serve(cert_path, key_path)
+        url = f"https://localhost:{server.server_address[1]}/drive/v3/files"
+
+        def per_request(local: threading.local) -> None:
+            httplib2.Http(ca_certs=cert_path).request(url)
+
+        def per_thread(local: threading.local) -> None:
+            if not hasattr(local, "http"):
+                local.http = httplib2.Http(ca_certs=cert_path)
+            local.http.request(url)
+
+        pooled = PooledTransport(AnonymousCredentials(), pool_size=args.threads)
+        pooled.session.verify = cert_path
+        # Otherwise REQUESTS_CA_BUNDLE would take precedence over `verify`
+        pooled.session.trust_env = False
+
+        counts = (args.pushes, args.requests, args.threads)
+        results = {
+            "httplib2 per request": measure(per_request, *counts),
+            "httplib2 per thread": measure(per_thread, *counts),
+            "pooled": measure(lambda local: pooled.request(url), *counts),
+        }
+        server.shutdown()
+
+    for name, latency in results.items():
+        print(f"{name:<22}{latency * 1000:8.2f} ms/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,43 @@
 import logging
 import sys
 
-from rich.logging import RichHandler
-from rich.traceback import install as install_rich_traceback
+logger = logging.getLogger(__name__)
 
-# Set up logging and error handling
-install_rich_traceback()
-logging.basicConfig(
-    level="INFO", format="%(message)s", datefmt="[%X]", handlers=[RichHandler()]
-)
 
-logger = logging.getLogger(__name__)
+def setup_logging() -> None:
+    """
+    Set up rich logging and tracebacks for the command line tool.
+
+    This is deliberately not done on import: it is slow, and applications that use gpush
+    as a library should configure logging themselves.
+    """
+    from rich.logging import RichHandler
+    from rich.traceback import install as install_rich_traceback
+
+    install_rich_traceback()
+    logging.basicConfig(
+        level="INFO", format="%(message)s", datefmt="[%X]", handlers=[RichHandler()]
+    )
+
+
+def __getattr__(name: str) -> str:
+    # Looking up the installed version scans the installed distributions, which is slow,
+    # so it is only done when `__version__` is first accessed.
+    if name != "__version__":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    if sys.version_info[:2] >= (3, 8):
+        # TODO: Import directly (no need for conditional) when `python_requires = >= 3.8`
+        from importlib.metadata import PackageNotFoundError, version  # pragma: no cover
+    else:
+        from importlib_metadata import PackageNotFoundError, version  # pragma: no cover
+
+    try:
+        # Change here if project is renamed and does not equal the package name
+        dist_name = __name__
+        __version__ = version(dist_name)
+    except PackageNotFoundError:  # pragma: no cover
+        __version__ = "unknown"
 
-if sys.version_info[:2] >= (3, 8):
-    # TODO: Import directly (no need for conditional) when `python_requires = >= 3.8`
-    from importlib.metadata import PackageNotFoundError, version  # pragma: no cover
-else:
-    from importlib_metadata import PackageNotFoundError, version  # pragma: no cover
-
-try:
-    # Change here if project is renamed and does not equal the package name
-    dist_name = __name__
-    __version__ = version(dist_name)
-except PackageNotFoundError:  # pragma: no cover
-    __version__ = "unknown"
-finally:
-    del version, PackageNotFoundError
+    globals()["__version__"] = __version__
+    return __version__
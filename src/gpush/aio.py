@@ -0,0 +1,718 @@
+"""
+An asyncio API for embedding gpush in asynchronous applications.
+
+The coroutines in this module mirror `gpush.handlers.upload.upload_file` and the request
+functions of `gpush.requests`, but send their requests through a non-blocking `httpx`
+client, so that any number of uploads can overlap on a single event loop thread. The
+number of requests in flight is bounded by the semaphore of `AsyncServices`, and the
+shared rate limits and retry policy of `gpush.requests.retry` apply as usual::
+
+    async with AsyncServices(concurrency=32) as services:
+        await asyncio.gather(
+            *(upload_file(services, folder_id, file) for file in files)
+        )
+
+Cancelling a coroutine cancels its requests. Uploads that need one of the synchronous
+handlers (Excel workbooks, archives and the sync, dedup, shard, append, upsert, stream
+and import modes) run in a worker thread instead; those cannot be interrupted once
+started.
+
+This module requires the optional `httpx` package (``pip install gpush[aio]``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import mimetypes
+import os
+import socket
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
+from urllib.parse import quote
+
+from gpush import logger
+from gpush.auth.services import Services, authenticate_service_account
+from gpush.auth.transport import DEFAULT_CONNECT_TIMEOUT, DEFAULT_TIMEOUT
+from gpush.handlers.upload import FileDetails, UploadType, dir_children
+from gpush.handlers.upload import upload_file as _upload_file_sync
+from gpush.requests.gdrive import (
+    FILE_FIELDS,
+    FOLDER_MIME_TYPE,
+    LIST_FIELDS,
+    LIST_PAGE_SIZE,
+    SPREADSHEET_MIME_TYPE,
+    RemoteFile,
+    _keep_existing,
+    folder_index,
+    folder_query,
+    typed_query,
+)
+from gpush.requests.gsheets import a1_range
+from gpush.requests.instrumentation import instrumentation
+from gpush.requests.retry import (
+    IDEMPOTENT_METHODS,
+    RetryPolicy,
+    backoff_delay,
+    default_policy,
+    is_retryable,
+    rate_limits,
+    retry_stats,
+)
+from gpush.requests.utilities import error_handler
+
+if TYPE_CHECKING:
+    import httpx
+    from google.auth.credentials import Credentials  # type: ignore
+
+DRIVE_URL = "https://www.googleapis.com/drive/v3"
+UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3"
+SHEETS_URL = "https://sheets.googleapis.com/v4"
+DEFAULT_CONCURRENCY = 16
+
+
+class MissingAioDependency(Exception):
+    pass
+
+
+class AsyncServices:
+    """
+    The asynchronous counterpart of `Services`: an authorized `httpx.AsyncClient` for the
+    Drive and Sheets REST APIs.
+
+    At most `concurrency` requests are in flight at once; further requests wait on a
+    semaphore, not on the network. Likewise at most `concurrency` files are uploaded at
+    once, however many files a directory holds. Failed requests are retried like the synchronous ones
+    (see `gpush.requests.retry.execute`), sleeping with `asyncio.sleep` so the event loop
+    is never blocked. Access tokens are refreshed in a worker thread.
+
+    Args:
+        service_account_path (str, optional): Path to the service account file. Defaults
+                                              to the SERVICE_ACCOUNT_FILE variable.
+        credentials (Credentials, optional): Credentials to use instead of a service
+                                             account file.
+        concurrency (int, optional): The maximum number of requests in flight.
+        timeout (float, optional): Seconds to wait for the server to send data.
+        drive_url, upload_url, sheets_url (str, optional): The API endpoints, e.g. of a
+                                                          local test server.
+    """
+
+    def __init__(
+        self,
+        service_account_path: Optional[str] = None,
+        credentials: Optional[Credentials] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT,
+        drive_url: str = DRIVE_URL,
+        upload_url: str = UPLOAD_URL,
+        sheets_url: str = SHEETS_URL,
+    ) -> None:
+        try:
+            import httpx
+        except ImportError:
+            raise MissingAioDependency(
+                "The asyncio API requires the 'httpx' package. "
+                "Install it with `pip install gpush[aio]`."
+            ) from None
+
+        if credentials is None:
+            credentials = authenticate_service_account(service_account_path)
+        self.credentials = credentials
+        self.drive_url = drive_url
+        self.upload_url = upload_url
+        self.sheets_url = sheets_url
+        self.policy: RetryPolicy = default_policy
+
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=DEFAULT_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=concurrency, max_keepalive_connections=concurrency
+            ),
+        )
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.file_slots = asyncio.Semaphore(concurrency)
+        self._token_lock = asyncio.Lock()
+        self._folder_locks: Dict[str, asyncio.Lock] = {}
+        self._sheet_locks: Dict[str, asyncio.Lock] = {}
+        self._sheet_titles: Dict[str, Set[str]] = {}
+        self._sync_services: Optional[Services] = None
+
+    @property
+    def sync_services(self) -> Services:
+        """Synchronous clients with the same credentials, for the threaded fallbacks."""
+        if self._sync_services is None:
+            from gpush.auth.transport import PooledTransport
+
+            self._sync_services = Services(
+                credentials=self.credentials, transport_factory=PooledTransport
+            )
+        return self._sync_services
+
+    async def __aenter__(self) -> AsyncServices:
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        operation: str,
+        api: str = "drive",
+        idempotent: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        Send an authorized request, retrying it with exponential backoff when that is safe.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL of the request.
+            operation (str): The name the call is reported under to `instrumentation`,
+                             e.g. "drive.files.list".
+            api (str, optional): The rate limit the request counts against (see
+                                 `gpush.requests.retry.rate_limits`).
+            idempotent (bool, optional): Whether the request may safely be sent twice.
+                                         Defaults to a guess based on the HTTP method.
+            **kwargs: Passed on to `httpx.AsyncClient.request`.
+
+        Returns:
+            httpx.Response: The response; error statuses are raised as `HttpError`.
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        bucket = rate_limits[api]
+
+        measurement = instrumentation.measure(operation)
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            retry_stats.record(requests=1, throttle=wait)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await self._send(method, url, **kwargs)
+            except Exception as e:
+                measurement.error(e)
+                if attempt >= self.policy.max_retries or not is_retryable(
+                    e, idempotent
+                ):
+                    measurement.finish(retries=attempt)
+                    raise
+                await asyncio.sleep(backoff_delay(e, attempt, bucket, self.policy))
+                attempt += 1
+            else:
+                if measurement.active:
+                    measurement.bytes_sent += len(response.request.content)
+                measurement.response(response.status_code, response.content)
+                measurement.finish(retries=attempt)
+                return response
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        import httpx
+
+        headers = dict(headers or {})
+        await self._authorize(headers)
+
+        async with self.semaphore:
+            try:
+                response = await self.client.request(
+                    method, url, headers=headers, **kwargs
+                )
+            except httpx.TimeoutException as e:
+                raise socket.timeout(str(e)) from e
+            except httpx.TransportError as e:
+                # Raised as the built-in error so that it is retried like any dropped connection
+                raise ConnectionError(str(e)) from e
+
+        if response.status_code >= 400:
+            raise _http_error(response)
+        return response
+
+    async def _authorize(self, headers: Dict[str, str]) -> None:
+        if not self.credentials.valid:
+            async with self._token_lock:
+                if not self.credentials.valid:
+                    from google.auth.transport.requests import Request  # type: ignore
+
+                    await asyncio.to_thread(self.credentials.refresh, Request())
+        self.credentials.apply(headers)
+
+
+def _http_error(response: httpx.Response) -> Exception:
+    # Raising the client library's error lets the retry rules inspect it as usual
+    import httplib2  # type: ignore
+    from googleapiclient.errors import HttpError  # type: ignore
+
+    info = {key.lower(): value for key, value in response.headers.items()}
+    info["status"] = str(response.status_code)
+    return HttpError(httplib2.Response(info), response.content, uri=str(response.url))
+
+
+async def _list_folder(
+    services: AsyncServices, folder_id: str
+) -> Dict[str, RemoteFile]:
+    lock = services._folder_locks.setdefault(folder_id, asyncio.Lock())
+    async with lock:
+        entries = folder_index.get(folder_id)
+        if entries is not None:
+            return entries
+
+        entries = {}
+        params = {
+            "q": folder_query(folder_id),
+            "spaces": "drive",
+            "fields": LIST_FIELDS,
+            "pageSize": LIST_PAGE_SIZE,
+        }
+        while True:
+            response = await services.request(
+                "GET",
+                f"{services.drive_url}/files",
+                "drive.files.list",
+                params=params,
+            )
+            page = response.json()
+            for item in page.get("files", []):
+                remote_file = RemoteFile.from_api(item)
+                if not _keep_existing(entries.get(remote_file.name), remote_file):
+                    entries[remote_file.name] = remote_file
+            if not page.get("nextPageToken"):
+                break
+            params["pageToken"] = page["nextPageToken"]
+
+        folder_index.store(folder_id, entries)
+        return folder_index.get(folder_id) or entries
+
+
+@error_handler
+async def list_folder(services: AsyncServices, folder_id: str) -> Dict[str, RemoteFile]:
+    """
+    List the contents of a Google Drive folder; see `gpush.requests.gdrive.list_folder`.
+
+    The listing is shared with the synchronous API through `folder_index`.
+    """
+    return await _list_folder(services, folder_id)
+
+
+@error_handler
+async def find_file(
+    services: AsyncServices,
+    folder_id: str,
+    file_name: str,
+    mime_type: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Search for a file with a specific name in a given Google Drive folder.
+
+    See `gpush.requests.gdrive.find_file`, including how `mime_type` is matched.
+
+    Args:
+        services (AsyncServices): The asynchronous API clients.
+        folder_id (str): The ID of the Google Drive folder to search in.
+        file_name (str): The name of the file to search for.
+        mime_type (str, optional): The MIME type the file must have.
+
+    Returns:
+        Optional[str]: The ID of the found file, or None if no file was found.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the API request.
+    """
+    remote_file = (await _list_folder(services, folder_id)).get(file_name)
+    if remote_file is None:
+        return None
+    if mime_type is None or remote_file.mime_type == mime_type:
+        return remote_file.id
+
+    response = await services.request(
+        "GET",
+        f"{services.drive_url}/files",
+        "drive.files.list",
+        params={
+            "q": typed_query(folder_id, file_name, mime_type),
+            "spaces": "drive",
+            "fields": LIST_FIELDS,
+            "pageSize": 1,
+        },
+    )
+    files = response.json().get("files", [])
+    return files[0]["id"] if files else None
+
+
+async def _create_file(
+    services: AsyncServices, metadata: Dict[str, Any]
+) -> Dict[str, Any]:
+    response = await services.request(
+        "POST",
+        f"{services.drive_url}/files",
+        "drive.files.create",
+        params={"fields": "id, name, mimeType"},
+        json=metadata,
+    )
+    return response.json()
+
+
+@error_handler
+async def create_drive_folder(
+    services: AsyncServices, folder_name: str, parent_folder_id: str
+) -> str:
+    """
+    Create or find a folder within a specific Google Drive folder.
+
+    If a folder with the same name already exists in the parent folder, its ID is
+    returned. Otherwise a new folder is created.
+
+    Args:
+        services (AsyncServices): The asynchronous API clients.
+        folder_name (str): The name of the folder to be created or found.
+        parent_folder_id (str): The ID of the parent folder.
+
+    Returns:
+        str: The ID of the created or found folder.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the API request.
+    """
+    existing = (await _list_folder(services, parent_folder_id)).get(folder_name)
+    if existing is not None and existing.is_folder:
+        logger.warning(
+            f"Folder '{folder_name}' already exists. Continuing with upload but some files may be overwritten."
+        )
+        return existing.id
+
+    folder = await _create_file(
+        services,
+        {
+            "name": folder_name,
+            "mimeType": FOLDER_MIME_TYPE,
+            "parents": [parent_folder_id],
+        },
+    )
+    folder_index.add(parent_folder_id, RemoteFile.from_api(folder))
+    # A new folder has no children, so there is no need to list it later
+    folder_index.add_empty(folder["id"])
+    logger.debug(f"Created new folder '{folder_name}' with ID: {folder['id']}")
+    return folder["id"]
+
+
+@error_handler
+async def create_google_sheet(
+    services: AsyncServices, folder_id: str, file_name: str
+) -> str:
+    """
+    Create a new Google Sheet in the specified folder.
+
+    Args:
+        services (AsyncServices): The asynchronous API clients.
+        folder_id (str): The ID of the folder where the new Google Sheet will be created.
+        file_name (str): The name of the new Google Sheet.
+
+    Returns:
+        str: The ID of the newly created Google Sheet.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the API request.
+    """
+    file = await _create_file(
+        services,
+        {"name": file_name, "mimeType": SPREADSHEET_MIME_TYPE, "parents": [folder_id]},
+    )
+    folder_index.add(folder_id, RemoteFile.from_api(file))
+    logger.info(f"Created new Google Sheets File ID: {file['id']}")
+    return file["id"]
+
+
+async def _ensure_sheet(
+    services: AsyncServices, spreadsheet_id: str, sheet: str
+) -> None:
+    url = f"{services.sheets_url}/spreadsheets/{spreadsheet_id}"
+    lock = services._sheet_locks.setdefault(spreadsheet_id, asyncio.Lock())
+    async with lock:
+        titles = services._sheet_titles.get(spreadsheet_id)
+        if titles is None:
+            response = await services.request(
+                "GET",
+                url,
+                "sheets.spreadsheets.get",
+                api="sheets.read",
+                params={"fields": "sheets(properties(title))"},
+            )
+            titles = {
+                item["properties"]["title"]
+                for item in response.json().get("sheets", [])
+            }
+            services._sheet_titles[spreadsheet_id] = titles
+
+        if sheet in titles:
+            return
+        await services.request(
+            "POST",
+            f"{url}:batchUpdate",
+            "sheets.spreadsheets.batchUpdate",
+            api="sheets.write",
+            json={"requests": [{"addSheet": {"properties": {"title": sheet}}}]},
+        )
+        titles.add(sheet)
+        logger.debug(f"Created new sheet: {sheet}")
+
+
+@error_handler
+async def upload_data_to_spreadsheet(
+    services: AsyncServices,
+    spreadsheet_id: str,
+    name: str,
+    data: List[List[Any]],
+    sheet: str = "Sheet1",
+) -> None:
+    """
+    Upload data to the specified Google Sheet, creating the sheet if it does not exist.
+
+    Args:
+        services (AsyncServices): The asynchronous API clients.
+        spreadsheet_id (str): The ID of the Google Sheet to update.
+        name (str): The name of the upload, used for logging.
+        data (List[List[Any]]): The data to upload. Each inner list represents a row.
+        sheet (str, optional): The name of the sheet to write to. Defaults to "Sheet1".
+
+    Raises:
+        GoogleApiAccessError: If an error occurs while making the API request.
+    """
+    await _ensure_sheet(services, spreadsheet_id, sheet)
+
+    response = await services.request(
+        "PUT",
+        f"{services.sheets_url}/spreadsheets/{spreadsheet_id}/values/"
+        f"{quote(a1_range(sheet), safe='')}",
+        "sheets.spreadsheets.values.update",
+        api="sheets.write",
+        params={"valueInputOption": "RAW"},
+        json={"values": data},
+    )
+    logger.debug(f"{response.json().get('updatedCells')} cells updated.")
+
+    sheet_url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/"
+    logger.info(f"Uploaded {name} to {sheet_url}.")
+
+
+async def _upload_media(
+    services: AsyncServices,
+    path: str,
+    metadata: Dict[str, Any],
+    chunk_size: int,
+) -> Dict[str, Any]:
+    # The resumable upload protocol, sending the file in chunks read off the event loop
+    size = os.path.getsize(path)
+    start = await services.request(
+        "POST",
+        f"{services.upload_url}/files",
+        "drive.files.create",
+        params={"uploadType": "resumable", "fields": FILE_FIELDS},
+        headers={
+            "X-Upload-Content-Type": metadata["mimeType"],
+            "X-Upload-Content-Length": str(size),
+        },
+        json=metadata,
+    )
+    session_url = start.headers["location"]
+
+    offset = 0
+    attempt = 0
+    with open(path, "rb") as f:
+        while True:
+            f.seek(offset)
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if chunk:
+                content_range = f"bytes {offset}-{offset + len(chunk) - 1}/{size}"
+            else:
+                content_range = f"bytes */{size}"
+            try:
+                response = await services.request(
+                    "PUT",
+                    session_url,
+                    "drive.files.create[chunk]",
+                    content=chunk,
+                    headers={"Content-Range": content_range},
+                    idempotent=False,
+                )
+            except Exception as e:
+                if attempt >= services.policy.max_retries or not is_retryable(
+                    e, idempotent=True
+                ):
+                    raise
+                await asyncio.sleep(
+                    backoff_delay(e, attempt, rate_limits["drive"], services.policy)
+                )
+                attempt += 1
+                # The server may have stored part of the failed chunk: ask which bytes
+                # it confirmed and resend from there
+                response = await services.request(
+                    "PUT",
+                    session_url,
+                    "drive.files.create[status]",
+                    headers={"Content-Range": f"bytes */{size}"},
+                    idempotent=True,
+                )
+            else:
+                attempt = 0
+            if response.status_code != 308:
+                return response.json()
+
+            confirmed = response.headers.get("range")
+            offset = int(confirmed.rsplit("-", 1)[1]) + 1 if confirmed else 0
+            logger.debug(f"Uploaded {offset} of {size} bytes of {path}...")
+
+
+def _needs_sync_handler(file: FileDetails) -> bool:
+    if file.type in (UploadType.XLSX, UploadType.XLS):
+        return True
+    if file.sync or file.dedup or file.shard or file.append or file.upsert:
+        return True
+    if file.archive:
+        return True
+    if file.resume and file.type is UploadType.DIR:
+        # Interrupted pushes are journaled by the plan executor
+        return True
+    if file.type is UploadType.CSV:
+        if file.stream or file.import_mode == "always":
+            return True
+        return (
+            file.import_mode == "auto"
+            and os.path.getsize(file.path) >= file.import_threshold
+        )
+    return False
+
+
+def _read_csv(path: str) -> List[List[str]]:
+    with open(path) as f:
+        return list(csv.reader(f))
+
+
+async def _upload_csv(
+    services: AsyncServices, folder_id: str, file: FileDetails
+) -> None:
+    file_id = await find_file(services, folder_id, file.name, SPREADSHEET_MIME_TYPE)
+    if not file_id:
+        file_id = await create_google_sheet(services, folder_id, file.name)
+
+    data = await asyncio.to_thread(_read_csv, file.path)
+    await upload_data_to_spreadsheet(
+        services, file_id, file.name, data, sheet=file.sheet
+    )
+
+
+@error_handler
+async def _upload_generic(
+    services: AsyncServices, folder_id: str, file: FileDetails
+) -> None:
+    if (await _list_folder(services, folder_id)).get(file.name) is not None:
+        logger.warning(f"File {file.name} already exists in the folder.")
+
+    mime_type, _ = mimetypes.guess_type(file.path)
+    metadata = {
+        "name": file.name,
+        "mimeType": mime_type or "application/octet-stream",
+        "parents": [folder_id],
+    }
+    result = await _upload_media(services, file.path, metadata, file.chunk_size)
+    folder_index.add(folder_id, RemoteFile.from_api(result))
+
+    file_url = f"https://drive.google.com/file/d/{result['id']}/view"
+    logger.info(f"File '{file.name}' uploaded; URL: {file_url}")
+
+
+def _is_native_dir(file: FileDetails) -> bool:
+    return file.type is UploadType.DIR and not _needs_sync_handler(file)
+
+
+async def _upload_in_slot(
+    services: AsyncServices, folder_id: str, file: FileDetails
+) -> None:
+    # The caller took one of the file slots for this upload
+    try:
+        await _upload_entry(services, folder_id, file)
+    finally:
+        services.file_slots.release()
+
+
+async def _upload_dir(
+    services: AsyncServices, folder_id: str, file: FileDetails
+) -> None:
+    new_folder_id = await create_drive_folder(services, file.name, folder_id)
+    children = await asyncio.to_thread(dir_children, file)
+
+    # Subdirectories start right away. A file is only started once it has a slot, so a
+    # directory of many files never has more than `concurrency` of them in flight.
+    tasks: List[asyncio.Future] = []
+    try:
+        for child in children:
+            if _is_native_dir(child):
+                coroutine = _upload_dir(services, new_folder_id, child)
+            else:
+                await services.file_slots.acquire()
+                coroutine = _upload_in_slot(services, new_folder_id, child)
+            tasks.append(asyncio.ensure_future(coroutine))
+            failed = next((t for t in tasks if t.done() and t.exception()), None)
+            if failed is not None:
+                raise failed.exception()  # type: ignore
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def _upload_entry(
+    services: AsyncServices, folder_id: str, file: FileDetails
+) -> None:
+    if _needs_sync_handler(file):
+        await asyncio.to_thread(
+            _upload_file_sync, services.sync_services, folder_id, file
+        )
+        return
+
+    match file.type:
+        case UploadType.CSV:
+            await _upload_csv(services, folder_id, file)
+        case UploadType.DIR:
+            await _upload_dir(services, folder_id, file)
+        case _:
+            await _upload_generic(services, folder_id, file)
+
+
+async def upload_file(
+    services: AsyncServices, folder_id: str, file: FileDetails
+) -> None:
+    """
+    Upload a file or directory to Google Drive without blocking the event loop.
+
+    This is the asynchronous counterpart of `gpush.handlers.upload.upload_file`. CSV
+    files are written to a Google Sheet, directories are uploaded recursively with up to
+    `concurrency` files in parallel (see `AsyncServices`), and any other file is sent as
+    a resumable upload. Files that need one of the synchronous handlers are uploaded in
+    a worker thread (see the module documentation).
+
+    Args:
+        services (AsyncServices): The asynchronous API clients.
+        folder_id (str): The ID of the folder where the file should be uploaded.
+        file (FileDetails): The details of the file to be uploaded.
+
+    Raises:
+        Exception: If there is an error during the upload process. When a directory is
+                   uploaded, the first error cancels the uploads still in progress.
+    """
+    if _is_native_dir(file):
+        await _upload_dir(services, folder_id, file)
+        return
+    async with services.file_slots:
+        await _upload_entry(services, folder_id, file)
@@ -1,13 +1,33 @@
+from __future__ import annotations
+
+import json
 import logging
 import os
+import threading
 from contextlib import contextmanager
-from typing import Any, Generator, Optional
-
-from google.oauth2.service_account import Credentials  # type: ignore
-from googleapiclient.discovery import build  # type: ignore
+from functools import lru_cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .transport import Httplib2Transport, PooledTransport
+
+if TYPE_CHECKING:
+    # Any credentials work, e.g. those of a service account or of a user
+    from google.auth.credentials import Credentials  # type: ignore
+    from googleapiclient.discovery import Resource  # type: ignore
 
 logger = logging.getLogger(__name__)
 
+Transport = Union[PooledTransport, Httplib2Transport]
+
 
 class MissingServiceAccountFile(Exception):
     pass
@@ -43,6 +63,7 @@ def authenticate_service_account(
     service_account_file: Optional[str] = None,
 ) -> Credentials:
     """Authenticate the service account and return the credentials."""
+    from google.oauth2 import service_account  # type: ignore
 
     if not service_account_file:
         service_account_file = _read_service_account_file()
@@ -52,16 +73,118 @@ def authenticate_service_account(
         "https://www.googleapis.com/auth/spreadsheets",
     ]
 
-    credentials = Credentials.from_service_account_file(
+    credentials = service_account.Credentials.from_service_account_file(
         service_account_file,
         scopes=scopes,
     )
     return credentials
 
 
+@lru_cache(maxsize=None)
+def _discovery_document(api: str, version: str) -> Dict[str, Any]:
+    """
+    Load the discovery document of an API from the copy bundled with the client library.
+
+    The documents are large, so each one is parsed once per process and shared by every
+    client built from it. Nothing is fetched over the network.
+    """
+    from googleapiclient.discovery_cache import get_static_doc  # type: ignore
+
+    document = get_static_doc(api, version)
+    if document is None:
+        raise ValueError(f"No bundled discovery document for {api} {version}.")
+    return json.loads(document)
+
+
+def build_service(api: str, version: str, transport: Transport) -> Resource:
+    """Build an API client from the bundled discovery document."""
+    from googleapiclient.discovery import build_from_document  # type: ignore
+
+    with _temp_log_level(logging.ERROR):
+        return build_from_document(_discovery_document(api, version), http=transport)
+
+
 class Services:
-    def __init__(self, service_account_path: Optional[str] = None) -> None:
-        self.credentials = authenticate_service_account(service_account_path)
-        with _temp_log_level(logging.ERROR):
-            self.drive = build("drive", "v3", credentials=self.credentials)
-            self.sheets = build("sheets", "v4", credentials=self.credentials)
+    """
+    The Google Drive and Sheets API clients used by gpush.
+
+    Both clients send their requests through one transport, built by `transport_factory`
+    from the credentials. The default `PooledTransport` keeps a thread-safe pool of
+    keep-alive connections; pass e.g. `functools.partial(PooledTransport, pool_size=32)`
+    to configure it, or `Httplib2Transport` to use the client library's own transport.
+
+    Each client is built on first use, so commands that only talk to one of the APIs
+    never pay for building the other one.
+    """
+
+    def __init__(
+        self,
+        service_account_path: Optional[str] = None,
+        credentials: Optional[Credentials] = None,
+        transport_factory: Optional[Callable[[Credentials], Transport]] = None,
+    ) -> None:
+        self.credentials = credentials or authenticate_service_account(
+            service_account_path
+        )
+        self.transport_factory = transport_factory or PooledTransport
+        self._transport: Optional[Transport] = None
+        self._drive: Optional[Resource] = None
+        self._sheets: Optional[Resource] = None
+        self._lock = threading.RLock()
+
+    @property
+    def transport(self) -> Transport:
+        if self._transport is None:
+            with self._lock:
+                if self._transport is None:
+                    self._transport = self.transport_factory(self.credentials)
+        return self._transport
+
+    @property
+    def drive(self) -> Resource:
+        if self._drive is None:
+            with self._lock:
+                if self._drive is None:
+                    self._drive = build_service("drive", "v3", self.transport)
+        return self._drive
+
+    @property
+    def sheets(self) -> Resource:
+        if self._sheets is None:
+            with self._lock:
+                if self._sheets is None:
+                    self._sheets = build_service("sheets", "v4", self.transport)
+        return self._sheets
+
+    def warm(self) -> Tuple[Resource, Resource]:
+        """Build both clients now, e.g. before serving, so no request waits for them."""
+        return self.drive, self.sheets
+
+    def clone(self) -> Services:
+        """
+        Return services that can be used from another thread.
+
+        Services on a thread-safe transport are simply shared. Otherwise a fresh set of
+        clients with its own transport is built; the credentials are shared and refreshed
+        in place.
+        """
+        if self.transport.thread_safe:
+            return self
+        return Services(
+            credentials=self.credentials, transport_factory=self.transport_factory
+        )
+
+
+class ThreadLocalServices:
+    """Hands out one `Services` instance per thread, cloned from a parent instance."""
+
+    def __init__(self, services: Services) -> None:
+        self._parent = services
+        self._local = threading.local()
+
+    def get(self) -> Services:
+        services = getattr(self._local, "services", None)
+        if services is None:
+            services = self._parent.clone()
+            self._local.services = services
+        return services
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+import socket
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    import httplib2  # type: ignore
+    from google.auth.credentials import Credentials  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_TIMEOUT = 120.0
+
+
+class PooledTransport:
+    """
+    A thread-safe, keep-alive HTTP transport shared by the Drive and Sheets clients.
+
+    The Google API client expects an `httplib2.Http`-like object, which keeps a single
+    connection per host and cannot be used from several threads. This transport exposes
+    the same `request` method on top of an authorized `requests` session, whose urllib3
+    connection pool keeps up to `pool_size` connections per host open and hands them to
+    whichever thread needs one. Concurrent and back-to-back calls therefore reuse open
+    TLS connections instead of paying a new handshake.
+
+    Args:
+        credentials (Credentials): The credentials used to authorize every request.
+        pool_size (int, optional): The maximum number of open connections per host.
+                                   Should be at least the number of worker threads.
+        connect_timeout (float, optional): Seconds to wait for a connection.
+        timeout (float, optional): Seconds to wait for the server to send data.
+    """
+
+    thread_safe = True
+
+    def __init__(
+        self,
+        credentials: Credentials,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        from google.auth.transport.requests import AuthorizedSession  # type: ignore
+        from requests.adapters import HTTPAdapter
+
+        self.credentials = credentials
+        self.timeout = (connect_timeout, timeout)
+        self.session = AuthorizedSession(credentials)
+
+        # Retries are handled by gpush.requests.retry, not by urllib3
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(
+        self,
+        uri: str,
+        method: str = "GET",
+        body: Union[str, bytes, Any, None] = None,
+        headers: Optional[Dict[str, str]] = None,
+        redirections: int = 5,
+        connection_type: Any = None,
+    ) -> Tuple[httplib2.Response, bytes]:
+        import httplib2  # type: ignore
+        import requests
+
+        read = getattr(body, "read", None)
+        if callable(read):
+            # Chunks of resumable uploads arrive as bounded file-like slices. Reading them
+            # lets requests send a plain body with the Content-Length the client set.
+            body = read()
+
+        try:
+            response = self.session.request(
+                method,
+                uri,
+                data=body,
+                headers=headers,
+                timeout=self.timeout,
+                # 308 is "Resume Incomplete" in the resumable upload protocol
+                allow_redirects=method in ("GET", "HEAD") and redirections > 0,
+            )
+        except requests.exceptions.SSLError:
+            raise
+        except requests.exceptions.Timeout as e:
+            raise socket.timeout(str(e)) from e
+        except requests.exceptions.ConnectionError as e:
+            # Raised as the built-in error so that it is retried like any dropped connection
+            raise ConnectionError(str(e)) from e
+
+        info = {key.lower(): value for key, value in response.headers.items()}
+        info["status"] = str(response.status_code)
+        resp = httplib2.Response(info)
+        resp.reason = response.reason
+        return resp, response.content
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class Httplib2Transport:
+    """
+    The client library's default transport: one authorized `httplib2.Http` connection.
+
+    It is not thread-safe, so `Services.clone` builds a new one for every thread.
+    """
+
+    thread_safe = False
+
+    def __init__(
+        self, credentials: Credentials, timeout: float = DEFAULT_TIMEOUT
+    ) -> None:
+        import google_auth_httplib2  # type: ignore
+        from googleapiclient.http import build_http  # type: ignore
+
+        self.credentials = credentials
+        http = build_http()
+        http.timeout = timeout
+        self._http = google_auth_httplib2.AuthorizedHttp(credentials, http=http)
+
+    def request(self, *args: Any, **kwargs: Any) -> Tuple[httplib2.Response, bytes]:
+        return self._http.request(*args, **kwargs)
+
+    def close(self) -> None:
+        self._http.close()
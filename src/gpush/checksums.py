@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from gpush.state import JsonStateFile
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def md5_file(path: str) -> str:
+    """Compute the MD5 checksum of a file, as reported by Drive's `md5Checksum`."""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """
+    A persistent cache of local file checksums.
+
+    Entries are keyed on the absolute path and only reused while the file's size and
+    modification time are unchanged, so unchanged files are never hashed twice. New
+    hashes are kept in memory and written to the state file every `save_every` entries
+    and whenever `save` is called.
+    """
+
+    def __init__(self, filename: str = "hashes.json", save_every: int = 500) -> None:
+        self._store = JsonStateFile(filename)
+        self._save_every = save_every
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+    def md5(self, path: str) -> str:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+
+        cached = self._store.get(path)
+        if (
+            cached
+            and cached["size"] == stat.st_size
+            and cached["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return cached["md5"]
+
+        checksum = md5_file(path)
+        self._remember(path, stat, checksum)
+        return checksum
+
+    def remember(self, path: str, checksum: str) -> None:
+        """Record the checksum of a file whose content is known, e.g. just downloaded."""
+        path = os.path.abspath(path)
+        self._remember(path, os.stat(path), checksum)
+
+    def _remember(self, path: str, stat: os.stat_result, checksum: str) -> None:
+        self._store.set(
+            path,
+            {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "md5": checksum},
+            save=False,
+        )
+
+        with self._lock:
+            self._unsaved += 1
+            flush = self._unsaved >= self._save_every
+        if flush:
+            self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._unsaved = 0
+        self._store.save()
+
+
+local_hashes = HashCache()
+
+
+class RemoteHashIndex:
+    """
+    A persistent index from MD5 checksums to Drive files with that content.
+
+    Every file gpush uploads with --dedup is recorded, so later pushes of the same content
+    can copy it on the server instead of uploading it again (see `generic_handler`).
+    Files found in folder listings on a miss are recorded as well when they are copied.
+    Copies are not recorded; the entry keeps pointing at the original. Entries whose
+    file was since deleted or changed are found out when they are used and dropped with
+    `forget`. Changes are written to the state file every `save_every` entries and
+    whenever `save` is called.
+    """
+
+    def __init__(
+        self, filename: str = "remote_hashes.json", save_every: int = 100
+    ) -> None:
+        self._store = JsonStateFile(filename)
+        self._save_every = save_every
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+    def get(self, md5: str) -> Optional[Dict[str, Any]]:
+        """Return the `{"id", "size"}` of a Drive file with this checksum, if known."""
+        return self._store.get(md5)
+
+    def record(self, md5: str, file_id: str, size: int) -> None:
+        self._store.set(md5, {"id": file_id, "size": size}, save=False)
+        with self._lock:
+            self._unsaved += 1
+            flush = self._unsaved >= self._save_every
+        if flush:
+            self.save()
+
+    def forget(self, md5: str, file_id: str) -> None:
+        """Drop an entry that no longer holds, unless it was replaced meanwhile."""
+        entry = self._store.get(md5)
+        if entry is not None and entry["id"] == file_id:
+            self._store.delete(md5)
+
+    def save(self) -> None:
+        with self._lock:
+            self._unsaved = 0
+        self._store.save()
+
+
+remote_hashes = RemoteHashIndex()
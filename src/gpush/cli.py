@@ -1,29 +1,57 @@
+from __future__ import annotations
+
 import logging
 import os
-from argparse import ArgumentParser
+import signal
+import sys
+from argparse import ArgumentParser, Namespace
+from dataclasses import replace
+from functools import partial
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from gpush import logger, setup_logging
 
-from gpush import logger
-from gpush.auth.services import Services
-from gpush.handlers.upload import FileDetails, upload_file
+if TYPE_CHECKING:
+    from gpush.auth.services import Services
+    from gpush.handlers.plan import Plan
+    from gpush.handlers.upload import FileDetails
 
 # ---- CLI ----
 # The functions defined in this section are wrappers around the main Python
 # API allowing them to be called directly from the terminal as a CLI
 # executable/script.
+#
+# The heavy imports (the Google API client and the upload handlers) are deferred until
+# after the arguments are parsed, so that `gpush --help` and argument errors are fast.
 
 
-def parse_args() -> FileDetails:
-    parser = ArgumentParser(
-        prog="gpush",
-        description="A CLI tool to upload data to Google Sheets.",
-    )
-
-    parser.add_argument(
-        "path",
-        type=str,
-        help="Path to the file to be uploaded.",
-        default=None,
-    )
+def build_parser(watch: bool = False) -> ArgumentParser:
+    """Build the parser of `gpush`, or of `gpush watch` if `watch` is set."""
+    if watch:
+        parser = ArgumentParser(
+            prog="gpush watch",
+            description="Push a directory, then keep pushing the files that change in "
+            "it, until interrupted.",
+        )
+        parser.add_argument(
+            "path", type=str, help="Path to the directory to watch.", default=None
+        )
+    else:
+        parser = ArgumentParser(
+            prog="gpush",
+            description="A CLI tool to upload data to Google Sheets. See also `gpush "
+            "watch --help` to push the changes of a directory continuously, `gpush "
+            "serve --help` to run a push server, and `gpush pull --help` to download "
+            "from Drive.",
+        )
+        parser.add_argument(
+            "path",
+            type=str,
+            nargs="?",
+            help="Path to the file to be uploaded. Not needed with --plan or "
+            "--manifest.",
+            default=None,
+        )
 
     parser.add_argument(
         "--name",
@@ -42,6 +70,166 @@ def parse_args() -> FileDetails:
         default="Sheet1",  # Default sheet name
     )
 
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        help="Number of files to upload concurrently when pushing a directory.",
+        required=False,
+        default=1,
+    )
+
+    parser.add_argument(
+        "--chunk-size",
+        type=float,
+        help="Size of each chunk of a resumable upload, in MiB. Defaults to 8.",
+        required=False,
+        default=8,
+    )
+
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Read CSV files lazily and write them to the sheet in blocks of rows.",
+        required=False,
+    )
+
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        help="Number of rows per request when streaming a CSV. Defaults to 5000.",
+        required=False,
+        default=5000,
+    )
+
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Only upload files that are new or changed since they were last pushed.",
+        required=False,
+    )
+
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Copy files whose content was pushed before, or is in a folder listed "
+        "during the push, on the server by MD5 checksum instead of uploading them "
+        "again. Files no larger than one --chunk-size are always uploaded.",
+        required=False,
+    )
+
+    parser.add_argument(
+        "--shard",
+        action="store_true",
+        help="Split CSV files that are too large for one Google Sheet across numbered "
+        "tabs and spreadsheets, with an index tab listing the shards.",
+        required=False,
+    )
+
+    parser.add_argument(
+        "--shard-rows",
+        type=int,
+        help="Number of data rows per tab when sharding. Defaults to as many as fit "
+        "into one million cells.",
+        required=False,
+    )
+
+    parser.add_argument(
+        "--import-mode",
+        choices=("auto", "always", "never"),
+        help="Whether to let Google Drive convert CSV files into Google Sheets instead "
+        "of writing their values. 'auto' does so for files larger than "
+        "--import-threshold. Defaults to auto.",
+        required=False,
+        default="auto",
+    )
+
+    parser.add_argument(
+        "--import-threshold",
+        type=float,
+        help="Size in MiB above which CSV files are converted by Google Drive in "
+        "--import-mode auto. Defaults to 20.",
+        required=False,
+        default=20,
+    )
+
+    parser.add_argument(
+        "--archive",
+        choices=("tar", "tar.gz", "zip"),
+        help="Upload a directory as a single archive in this format, packed on the fly, "
+        "instead of file by file.",
+        required=False,
+    )
+
+    parser.add_argument(
+        "--volume-size",
+        type=float,
+        help="Split --archive uploads into volumes of about this many MiB.",
+        required=False,
+    )
+
+    incremental = parser.add_mutually_exclusive_group()
+    incremental.add_argument(
+        "--append",
+        action="store_true",
+        help="Only send CSV rows that were appended or changed since the last push, "
+        "matching rows by position.",
+    )
+    incremental.add_argument(
+        "--upsert",
+        type=str,
+        metavar="KEY_COLUMN",
+        help="Only send CSV rows that are new or changed since the last push, "
+        "matching rows by their value in KEY_COLUMN.",
+    )
+
+    parser.add_argument(
+        "--stats",
+        type=str,
+        metavar="PATH",
+        help="Write per-operation API statistics (calls, retries, bytes and latency "
+        "percentiles) to PATH, as JSON or, if PATH ends in .prom, in the Prometheus "
+        "text format.",
+        required=False,
+    )
+
+    if watch:
+        parser.add_argument(
+            "--debounce",
+            type=float,
+            help="Push changes once no file has changed for this many seconds. "
+            "Defaults to 2.",
+            required=False,
+            default=2.0,
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            help="Look for changes every this many seconds instead of using inotify.",
+            required=False,
+        )
+    else:
+        _add_plan_arguments(parser)
+        parser.add_argument(
+            "--server",
+            type=str,
+            nargs="?",
+            const="",
+            metavar="SOCKET",
+            help="Hand the upload to a push server started with `gpush serve` and wait "
+            "for it, optionally at the given socket path.",
+            required=False,
+        )
+        parser.add_argument(
+            "--manifest",
+            type=str,
+            metavar="PATH",
+            help="Push every entry of a JSON or CSV manifest (source, folder, name, "
+            "sheet, mode and key), --jobs entries at a time, with the other options "
+            "as defaults.",
+            required=False,
+        )
+
     parser.add_argument(
         "--verbose",
         "-v",
@@ -50,27 +238,464 @@ def parse_args() -> FileDetails:
         required=False,
     )
 
-    args = parser.parse_args()
+    return parser
+
+
+def _add_plan_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only list what would be created, updated or skipped, without changing "
+        "anything on Drive.",
+        required=False,
+    )
+
+    parser.add_argument(
+        "--save-plan",
+        type=str,
+        metavar="PATH",
+        help="Write the plan of the upload to PATH as JSON.",
+        required=False,
+    )
+
+    parser.add_argument(
+        "--plan",
+        type=str,
+        metavar="PATH",
+        help="Execute a plan saved with --save-plan, with the options it was made with.",
+        required=False,
+    )
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted directory push: skip the files it already pushed "
+        "and continue its unfinished uploads.",
+        required=False,
+    )
+
+
+def _file_details(
+    parser: ArgumentParser, args: Namespace
+) -> Tuple[FileDetails, Optional[Plan]]:
+    """Return the details of the upload, and the plan it executes if given with --plan."""
+    if args.plan is not None:
+        if args.path is not None:
+            parser.error("a path cannot be combined with --plan")
+        from gpush.handlers.plan import Plan
+
+        plan = Plan.load(args.plan)
+        file = replace(
+            plan.file,
+            stats=args.stats,
+            dry_run=args.dry_run,
+            plan=args.plan,
+            resume=args.resume,
+        )
+        return file, plan
+    if args.path is None:
+        parser.error("the following arguments are required: path")
+
+    from gpush.handlers.upload import FileDetails
+
+    return FileDetails.from_args(args), None
+
+
+def parse_watch_args(argv: List[str]) -> Tuple[FileDetails, Namespace]:
+    parser = build_parser(watch=True)
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.path):
+        parser.error(f"{args.path} is not a directory")
+    if args.archive:
+        parser.error("--archive cannot be used with watch")
+    if args.jobs < 1:
+        parser.error("--jobs must be positive")
+    if args.debounce < 0:
+        parser.error("--debounce cannot be negative")
+    if args.poll_interval is not None and args.poll_interval <= 0:
+        parser.error("--poll-interval must be positive")
+    # Options of the plain command that do not apply to watch
+    args.dry_run, args.save_plan, args.resume = False, None, False
+    setup_logging()
     logger.setLevel(logging.DEBUG) if args.verbose else logger.setLevel(logging.INFO)
 
-    file = FileDetails.from_args(args)
+    from gpush.handlers.upload import FileDetails
 
-    return file
+    return FileDetails.from_args(args), args
 
 
-def main() -> None:
-    file = parse_args()
-    logger.info(f"Uploading {file.path} to Google Drive/Sheets as {file.name}...")
+def _services(jobs: int) -> Services:
+    from gpush.auth.services import Services
+    from gpush.auth.transport import DEFAULT_POOL_SIZE, PooledTransport
 
-    services = Services()
-    folder_id = os.getenv("FOLDER_ID")
+    # Keep a pooled connection open for every worker
+    return Services(
+        transport_factory=partial(
+            PooledTransport, pool_size=max(DEFAULT_POOL_SIZE, jobs)
+        )
+    )
+
+
+def watch(argv: List[str]) -> None:
+    file, args = parse_watch_args(argv)
 
+    from gpush.requests.instrumentation import StatsCollector, instrumentation
+    from gpush.requests.retry import retry_stats
+    from gpush.watch import DirectoryWatch
+
+    collector = instrumentation.add_observer(StatsCollector()) if file.stats else None
+    folder_id = os.getenv("FOLDER_ID")
     if folder_id is None:
         raise ValueError("FOLDER_ID environment variable is not set.")
 
-    upload_file(services, folder_id, file)
+    watcher = DirectoryWatch(
+        _services(file.jobs),
+        folder_id,
+        file,
+        debounce=args.debounce,
+        poll_interval=args.poll_interval,
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching.")
+    finally:
+        logger.info(f"API usage: {retry_stats}.")
+        if collector is not None and file.stats is not None:
+            collector.write(file.stats)
+            logger.info(f"Wrote API statistics to {file.stats}.")
+
+
+def parse_serve_args(argv: List[str]) -> Namespace:
+    parser = ArgumentParser(
+        prog="gpush serve",
+        description="Run a push server that uploads the files handed to it by "
+        "`gpush --server`, keeping one authenticated session and its caches warm.",
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        metavar="PATH",
+        help="Path of the Unix socket to listen on. Defaults to $GPUSH_SOCKET, or "
+        "gpush.sock in $XDG_RUNTIME_DIR or the gpush state directory.",
+        required=False,
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        help="Number of uploads to run concurrently. Defaults to 4.",
+        required=False,
+        default=4,
+    )
+    parser.add_argument(
+        "--stats",
+        type=str,
+        metavar="PATH",
+        help="Write per-operation API statistics to PATH when the server stops.",
+        required=False,
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="store_true",
+        help="Enable verbose logging.",
+        required=False,
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be positive")
+    setup_logging()
+    logger.setLevel(logging.DEBUG) if args.verbose else logger.setLevel(logging.INFO)
+    return args
+
+
+def serve(argv: List[str]) -> None:
+    args = parse_serve_args(argv)
+
+    from gpush.client import default_socket_path
+    from gpush.requests.instrumentation import StatsCollector, instrumentation
+    from gpush.requests.retry import retry_stats
+    from gpush.server import PushServer
+
+    collector = instrumentation.add_observer(StatsCollector()) if args.stats else None
+    server = PushServer(
+        args.socket or default_socket_path(),
+        _services(args.jobs),
+        folder_id=os.getenv("FOLDER_ID"),
+        jobs=args.jobs,
+    )
+    # Stop as cleanly on `kill` as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Stopped the push server. API usage: {retry_stats}.")
+        if collector is not None:
+            collector.write(args.stats)
+            logger.info(f"Wrote API statistics to {args.stats}.")
+
+
+def parse_pull_args(argv: List[str]) -> Namespace:
+    parser = ArgumentParser(
+        prog="gpush pull",
+        description="Mirror a Google Drive folder to a local directory, or download a "
+        "single file. Google Sheets are exported to CSV.",
+    )
+    parser.add_argument(
+        "file_id",
+        type=str,
+        metavar="FOLDER_OR_FILE_ID",
+        help="ID or URL of the Drive folder or file to download.",
+    )
+    parser.add_argument(
+        "dest",
+        type=str,
+        help="Local directory to mirror the folder into, or path of the file.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        help="Number of concurrent download requests. Defaults to 8.",
+        required=False,
+        default=8,
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=float,
+        help="Size of each ranged download request, in MiB. Defaults to 8.",
+        required=False,
+        default=8,
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        help="Number of rows per request when exporting a sheet. Defaults to 5000.",
+        required=False,
+        default=5000,
+    )
+    parser.add_argument(
+        "--stats",
+        type=str,
+        metavar="PATH",
+        help="Write per-operation API statistics to PATH, as JSON or, if PATH ends in "
+        ".prom, in the Prometheus text format.",
+        required=False,
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="store_true",
+        help="Enable verbose logging.",
+        required=False,
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be positive")
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
+    if args.block_size < 1:
+        parser.error("--block-size must be positive")
+    setup_logging()
+    logger.setLevel(logging.DEBUG) if args.verbose else logger.setLevel(logging.INFO)
+    return args
+
+
+def pull(argv: List[str]) -> None:
+    args = parse_pull_args(argv)
+
+    from gpush.checksums import local_hashes
+    from gpush.pull import pull as pull_files
+    from gpush.requests.instrumentation import StatsCollector, instrumentation
+    from gpush.requests.retry import retry_stats
+
+    collector = instrumentation.add_observer(StatsCollector()) if args.stats else None
+    logger.info(f"Pulling {args.file_id} into {args.dest}...")
+    try:
+        stats = pull_files(
+            _services(args.jobs),
+            args.file_id,
+            args.dest,
+            jobs=args.jobs,
+            chunk_size=int(args.chunk_size * 1024 * 1024),
+            block_size=args.block_size,
+        )
+    finally:
+        local_hashes.save()
+        logger.info(f"API usage: {retry_stats}.")
+        if collector is not None:
+            collector.write(args.stats)
+            logger.info(f"Wrote API statistics to {args.stats}.")
+    logger.info(f"Pull complete: {stats}.")
+
+
+def _submit(parser: ArgumentParser, args: Namespace) -> None:
+    """Hand the upload to a push server instead of running it in this process."""
+    for option in ("plan", "save_plan", "dry_run", "stats"):
+        if getattr(args, option):
+            parser.error(f"--{option.replace('_', '-')} cannot be used with --server")
+    if args.path is None:
+        parser.error("the following arguments are required: path")
+
+    from gpush.client import ServerError, submit
+
+    try:
+        response = submit(
+            args, socket_path=args.server or None, folder_id=os.getenv("FOLDER_ID")
+        )
+    except ServerError as e:
+        logger.error(str(e))
+        sys.exit(2)
+    if not response.get("ok"):
+        logger.error(
+            f"The push server could not upload {args.path}: {response.get('error')}"
+        )
+        sys.exit(1)
+    logger.info(
+        f"Uploaded {args.path} through the push server in {response['seconds']:.2f}s."
+    )
+
+
+def _push_manifest(parser: ArgumentParser, args: Namespace) -> None:
+    """Push the entries of a manifest in this process and summarize how they went."""
+    if args.path is not None:
+        parser.error("a path cannot be combined with --manifest")
+    for option in ("plan", "save_plan", "dry_run", "server"):
+        if getattr(args, option) not in (None, False):
+            parser.error(f"--{option.replace('_', '-')} cannot be used with --manifest")
+
+    from gpush.checksums import local_hashes, remote_hashes
+    from gpush.manifest import ManifestError, load_manifest, run_manifest
+    from gpush.requests.instrumentation import StatsCollector, instrumentation
+    from gpush.requests.retry import retry_stats
+
+    try:
+        entries = load_manifest(args.manifest, args, os.getenv("FOLDER_ID"))
+    except (OSError, ManifestError) as e:
+        logger.error(str(e))
+        sys.exit(2)
+
+    collector = instrumentation.add_observer(StatsCollector()) if args.stats else None
+    logger.info(f"Pushing {len(entries)} entries of {args.manifest}...")
+    try:
+        results = run_manifest(_services(args.jobs), entries, jobs=args.jobs)
+    finally:
+        local_hashes.save()
+        remote_hashes.save()
+        logger.info(f"API usage: {retry_stats}.")
+        if collector is not None:
+            collector.write(args.stats)
+            logger.info(f"Wrote API statistics to {args.stats}.")
+
+    failed = [result for result in results if not result.ok]
+    for result in failed:
+        logger.error(
+            f"Failed: {result.entry.location} ({result.entry.source}): {result.error}"
+        )
+    logger.info(
+        f"Pushed {len(results) - len(failed)} of {len(results)} entries; "
+        f"{len(failed)} failed."
+    )
+    if failed:
+        sys.exit(1)
+
+
+def main() -> None:
+    if sys.argv[1:2] == ["watch"]:
+        watch(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["serve"]:
+        serve(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["pull"]:
+        pull(sys.argv[2:])
+        return
+
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs must be positive")
+    setup_logging()
+    logger.setLevel(logging.DEBUG) if args.verbose else logger.setLevel(logging.INFO)
+    if args.manifest is not None:
+        _push_manifest(parser, args)
+        return
+    if args.server is not None:
+        _submit(parser, args)
+        return
+    file, plan = _file_details(parser, args)
+
+    from gpush.checksums import local_hashes, remote_hashes
+    from gpush.handlers.upload import upload_file
+    from gpush.requests.instrumentation import StatsCollector, instrumentation
+    from gpush.requests.retry import retry_stats
+
+    collector = instrumentation.add_observer(StatsCollector()) if file.stats else None
+
+    if file.dry_run:
+        logger.info(f"Planning the upload of {file.path} as {file.name}...")
+    else:
+        logger.info(f"Uploading {file.path} to Google Drive/Sheets as {file.name}...")
+
+    services = _services(file.jobs)
+    folder_id = os.getenv("FOLDER_ID")
+
+    try:
+        if file.plan or file.dry_run or file.save_plan:
+            if not _run_plan(services, folder_id, file, plan):
+                return
+        elif folder_id is None:
+            raise ValueError("FOLDER_ID environment variable is not set.")
+        else:
+            upload_file(services, folder_id, file)
+    finally:
+        local_hashes.save()
+        remote_hashes.save()
+        logger.info(f"API usage: {retry_stats}.")
+        if collector is not None and file.stats is not None:
+            collector.write(file.stats)
+            logger.info(f"Wrote API statistics to {file.stats}.")
     logger.info("Data upload complete.")
 
 
+def _run_plan(
+    services: Services,
+    folder_id: Optional[str],
+    file: FileDetails,
+    plan: Optional[Plan] = None,
+) -> bool:
+    """
+    Make the plan of the upload, unless one was loaded with --plan, and execute it
+    unless this is a dry run.
+    """
+    from gpush.handlers.plan import execute_plan, make_plan, resume_plan
+
+    if plan is not None:
+        if file.resume:
+            plan = resume_plan(plan)
+    elif folder_id is None:
+        # Only a saved plan names its own folder
+        raise ValueError("FOLDER_ID environment variable is not set.")
+    else:
+        plan = make_plan(services, folder_id, file)
+    if file.save_plan is not None:
+        plan.save(file.save_plan)
+        logger.info(f"Wrote the plan to {file.save_plan}.")
+
+    if file.dry_run:
+        for line in plan.describe():
+            print(line)
+        logger.info(f"Dry run: {plan.summary()}.")
+        return False
+
+    logger.info(f"Executing the plan: {plan.summary()}.")
+    execute_plan(services, plan)
+    return True
+
+
 if __name__ == "__main__":
     main()
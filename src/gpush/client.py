@@ -0,0 +1,95 @@
+"""
+The client side of `gpush serve`: hands an upload to a running push server.
+
+This module is kept free of the Google API client and the upload handlers, so that a
+`gpush --server` call only pays for starting Python and parsing its arguments.
+"""
+
+import json
+import os
+import socket
+from argparse import Namespace
+from typing import Any, Dict, Optional
+
+from gpush.state import state_dir
+
+PROTOCOL_VERSION = 1
+# Upper bound on the size of a message, so a bad client cannot exhaust the server
+MAX_MESSAGE_SIZE = 1024 * 1024
+# Command line options that only concern the calling process
+CLIENT_OPTIONS = ("server", "verbose")
+
+
+class ServerError(Exception):
+    """Raised when the push server cannot be reached or answers nonsense."""
+
+    pass
+
+
+def default_socket_path() -> str:
+    """
+    Return the socket path of the push server.
+
+    The path can be set with the GPUSH_SOCKET environment variable, and otherwise lives in
+    ``$XDG_RUNTIME_DIR`` if it is set, or in the gpush state directory.
+    """
+    path = os.getenv("GPUSH_SOCKET")
+    if path:
+        return path
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    return os.path.join(runtime_dir or state_dir(), "gpush.sock")
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message).encode() + b"\n"
+
+
+def read_message(stream: Any) -> Dict[str, Any]:
+    """Read one newline-terminated JSON object from a binary file object."""
+    line = stream.readline(MAX_MESSAGE_SIZE + 1)
+    if not line:
+        raise ServerError("The connection was closed without a message.")
+    if len(line) > MAX_MESSAGE_SIZE:
+        raise ServerError("The message is too large.")
+    try:
+        message = json.loads(line)
+    except ValueError as e:
+        raise ServerError(f"The message is not valid JSON: {e}") from None
+    if not isinstance(message, dict):
+        raise ServerError("The message is not a JSON object.")
+    return message
+
+
+def submit(
+    args: Namespace, socket_path: Optional[str] = None, folder_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Hand an upload to the push server and wait for it to finish.
+
+    Args:
+        args (Namespace): The parsed command line options of the upload.
+        socket_path (str, optional): The server's socket. Defaults to
+                                     `default_socket_path()`.
+        folder_id (str, optional): The Drive folder to upload into. Defaults to the
+                                   server's FOLDER_ID.
+
+    Returns:
+        Dict[str, Any]: The server's response: `ok`, and `error` or `seconds`.
+
+    Raises:
+        ServerError: If the server cannot be reached, or the connection breaks.
+    """
+    options = {k: v for k, v in vars(args).items() if k not in CLIENT_OPTIONS}
+    # The server may run in another working directory
+    options["path"] = os.path.abspath(options["path"])
+    request = {"version": PROTOCOL_VERSION, "folder_id": folder_id, "args": options}
+
+    path = socket_path or default_socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError as e:
+            raise ServerError(f"Cannot reach the push server at {path}: {e}") from None
+        sock.sendall(encode_message(request))
+        with sock.makefile("rb") as stream:
+            return read_message(stream)
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from gpush.requests.gdrive import LISTING_MAX_AGE, folder_index
+from gpush.requests.gsheets import forget_sessions
+
+
+def forget_listings(folder_id: Optional[str] = None) -> None:
+    """
+    Forget the listing of a folder, or of every folder if no ID is given, together with
+    the cached sheets of the spreadsheets in it (see `spreadsheet_session`).
+    """
+    ids = folder_index.invalidate(folder_id)
+    forget_sessions(ids if folder_id is not None else None)
+
+
+def expire_listings(max_age: float = LISTING_MAX_AGE) -> None:
+    """
+    Forget the listings older than `max_age` seconds and the cached sheets of the
+    spreadsheets in them, so changes made on Drive by others are seen again.
+    """
+    forget_sessions(folder_index.expire(max_age))
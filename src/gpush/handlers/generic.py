@@ -1,24 +1,56 @@
 from __future__ import annotations
 
 import mimetypes
-from typing import TYPE_CHECKING
+import os
+from typing import TYPE_CHECKING, Optional
 
+from googleapiclient.errors import HttpError  # type: ignore
 from googleapiclient.http import MediaFileUpload  # type: ignore
 
 from gpush import logger
 from gpush.auth.services import Services
-from gpush.requests.gdrive import find_file
+from gpush.checksums import local_hashes, remote_hashes
+from gpush.requests.gdrive import (
+    FILE_FIELDS,
+    RemoteFile,
+    copy_file,
+    find_file,
+    folder_index,
+    get_file,
+    list_folder,
+)
+from gpush.requests.resumable import execute_resumable, file_fingerprint, upload_key
+from gpush.requests.utilities import GoogleApiAccessError
 
 if TYPE_CHECKING:
     from gpush.handlers.upload import FileDetails
 
+# Files of up to this many chunks are uploaded even with --dedup, as that takes no more
+# requests than looking up and copying an identical file
+DEDUP_MIN_CHUNKS = 1
+
 
 def generic_handler(
     services: Services,
     folder_id: str,
     file: FileDetails,
 ) -> None:
-    """Uploads any file type to Google Drive."""
+    """
+    Uploads any file type to Google Drive.
+
+    The file is sent as a chunked resumable upload. If a previous run was interrupted
+    while uploading the same path, the upload continues where it stopped.
+
+    With `file.sync` set, a file that already exists in the folder is compared with the
+    local copy by size and MD5 checksum. Unchanged files are skipped and changed files
+    have their content replaced instead of being uploaded as a duplicate.
+
+    With `file.dedup` set, new files are first looked up by MD5 checksum among the files
+    gpush uploaded before (see `remote_hashes`) and the files of the folders listed so
+    far (see `folder_index`), and a match is copied into the folder on the server
+    instead of being uploaded again. Files of up to `DEDUP_MIN_CHUNKS` chunks are always
+    uploaded.
+    """
     name = file.name
     path = file.path
 
@@ -27,23 +59,133 @@ def generic_handler(
         # Fallback MIME type or handling if MIME type cannot be determined
         mime_type = "application/octet-stream"
 
-    if find_file(services.drive, folder_id, name):
+    existing: Optional[RemoteFile] = None
+    if file.sync:
+        existing = list_folder(services.drive, folder_id).get(name)
+        # Folders and native Google files have no checksum and cannot be replaced
+        if existing is not None and existing.md5_checksum is None:
+            existing = None
+        if existing is not None and _is_unchanged(existing, path):
+            logger.debug(f"File '{name}' is unchanged; skipping.")
+            return
+    elif find_file(services.drive, folder_id, name):
         logger.warning(f"File {name} already exists in the folder.")
 
-    file_metadata = {"name": name, "mimeType": mime_type, "parents": [folder_id]}
+    dedup = file.dedup and os.path.getsize(path) > DEDUP_MIN_CHUNKS * file.chunk_size
+    if dedup and existing is None:
+        copy = _copy_duplicate(services, folder_id, file)
+        if copy is not None:
+            logger.info(
+                f"File '{name}' copied from an identical file; "
+                f"URL: https://drive.google.com/file/d/{copy.id}/view"
+            )
+            return
 
-    media = MediaFileUpload(path, mimetype=mime_type)
+    media = MediaFileUpload(
+        path, mimetype=mime_type, resumable=True, chunksize=file.chunk_size
+    )
 
-    result = (
-        services.drive.files()
-        .create(body=file_metadata, media_body=media, fields="id")
-        .execute()
+    if existing is not None:
+        request = services.drive.files().update(
+            fileId=existing.id,
+            media_body=media,
+            fields=FILE_FIELDS,
+        )
+    else:
+        file_metadata = {"name": name, "mimeType": mime_type, "parents": [folder_id]}
+        request = services.drive.files().create(
+            body=file_metadata,
+            media_body=media,
+            fields=FILE_FIELDS,
+        )
+
+    result = execute_resumable(
+        request,
+        key=upload_key(path, folder_id, name),
+        fingerprint=file_fingerprint(path),
     )
 
     file_id = result.get("id")
+    remote_file = RemoteFile.from_api(result)
+    if existing is not None:
+        folder_index.put(folder_id, remote_file)
+    else:
+        folder_index.add(folder_id, remote_file)
+    if dedup and remote_file.md5_checksum and remote_file.size is not None:
+        remote_hashes.record(remote_file.md5_checksum, file_id, remote_file.size)
 
     # Construct the URL to access the file on Google Drive
     file_url = f"https://drive.google.com/file/d/{file_id}/view"
 
     # Log the file name, ID, and URL
     logger.info(f"File '{name}' uploaded; URL: {file_url}")
+
+
+def _is_unchanged(remote: RemoteFile, path: str) -> bool:
+    # Sizes are compared first so that files that obviously changed are not hashed
+    if remote.size != os.path.getsize(path):
+        return False
+    return remote.md5_checksum == local_hashes.md5(path)
+
+
+def _copy_source(
+    services: Services, file: FileDetails, checksum: str
+) -> Optional[RemoteFile]:
+    """Find a Drive file with the checksum among earlier uploads or the listed files."""
+    entry = remote_hashes.get(checksum)
+    if entry is not None:
+        # The index is only as fresh as the last push; check the file still matches
+        try:
+            source = get_file(services.drive, entry["id"])
+        except GoogleApiAccessError as e:
+            logger.debug(f"Could not look up copy source {entry['id']}: {e}")
+            source = None
+        else:
+            if source is not None and source.md5_checksum == checksum:
+                return source
+            logger.debug(
+                f"Forgetting stale copy source {entry['id']} of '{file.name}'."
+            )
+            remote_hashes.forget(checksum, entry["id"])
+
+    # Listings are fresh, so their files need not be looked up again
+    listed = folder_index.with_checksum(checksum)
+    if listed is not None and listed.size is not None:
+        remote_hashes.record(checksum, listed.id, listed.size)
+    return listed
+
+
+def _copy_duplicate(
+    services: Services, folder_id: str, file: FileDetails
+) -> Optional[RemoteFile]:
+    """Copy a Drive file with the same content as `file` into the folder, if one is known."""
+    checksum = local_hashes.md5(file.path)
+    source = _copy_source(services, file, checksum)
+    if source is None:
+        return None
+
+    try:
+        return copy_file(services.drive, source.id, folder_id, file.name)
+    except GoogleApiAccessError as e:
+        logger.warning(f"Could not copy {source.id} as '{file.name}', uploading: {e}")
+        if _status(e) in (403, 404):
+            # E.g. the source was shared with us read-only, or deleted meanwhile
+            remote_hashes.forget(checksum, source.id)
+            return None
+
+    # The copy is not idempotent, so it may have been made even though it failed
+    folder_index.invalidate(folder_id)
+    copy = list_folder(services.drive, folder_id).get(file.name)
+    if copy is not None and copy.md5_checksum == checksum:
+        return copy
+    return None
+
+
+def _status(error: BaseException) -> Optional[int]:
+    """The HTTP status of the API error that caused `error`, if any."""
+    cause: Optional[BaseException] = error
+    while cause is not None:
+        if isinstance(cause, HttpError):
+            return cause.resp.status
+        cause = cause.__cause__ or cause.__context__
+    return None
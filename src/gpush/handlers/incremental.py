@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import csv
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from gpush import logger
+from gpush.auth.services import Services
+from gpush.checksums import local_hashes
+from gpush.requests.gdrive import (
+    SPREADSHEET_MIME_TYPE,
+    create_google_sheet,
+    find_file,
+    list_folder,
+    set_app_properties,
+)
+from gpush.requests.gsheets import (
+    append_rows,
+    create_missing_sheets,
+    list_sheets,
+    read_columns,
+    row_hash,
+    stream_data_to_spreadsheet,
+    update_rows,
+)
+
+from .spreadsheet import _sync_property
+
+if TYPE_CHECKING:
+    from gpush.handlers.upload import FileDetails
+
+# Sheet titles are limited to 100 characters
+HASH_SHEET_PREFIX = "_gpush_hashes_"
+
+
+def hash_sheet_name(sheet: str) -> str:
+    """Return the name of the hidden tab holding the row hashes of `sheet`."""
+    return f"{HASH_SHEET_PREFIX}{sheet}"[:100]
+
+
+class RowKeys:
+    """
+    Derives the key of every row of a CSV.
+
+    In upsert mode the key is the value of the key column, whose position is looked up
+    in the header. Otherwise rows are matched by position and the key is the row number.
+    """
+
+    def __init__(self, key_column: Optional[str] = None) -> None:
+        self.key_column = key_column
+        self.index: Optional[int] = None
+
+    def key(self, number: int, row: List[str]) -> str:
+        if self.key_column is None or number == 1:
+            return str(number)
+        if self.index is None:
+            raise ValueError("The header must be read before the data rows.")
+        return row[self.index] if self.index < len(row) else ""
+
+    def read_header(self, header: List[str]) -> None:
+        if self.key_column is None:
+            return
+        try:
+            self.index = header.index(self.key_column)
+        except ValueError:
+            raise ValueError(
+                f"Key column '{self.key_column}' is not in the header of the CSV."
+            ) from None
+
+
+def _read_rows(path: str, keys: RowKeys) -> Iterator[Tuple[int, str, List[str]]]:
+    with open(path, newline="") as f:
+        for number, row in enumerate(csv.reader(f), start=1):
+            if number == 1:
+                keys.read_header(row)
+            yield number, keys.key(number, row), row
+
+
+def _runs(rows: List[Tuple[int, List[str]]]) -> List[Tuple[int, List[List[str]]]]:
+    """Group (row number, values) pairs into runs of consecutive rows."""
+    runs: List[Tuple[int, List[List[str]]]] = []
+    for number, values in sorted(rows, key=lambda item: item[0]):
+        if runs and runs[-1][0] + len(runs[-1][1]) == number:
+            runs[-1][1].append(values)
+        else:
+            runs.append((number, [values]))
+    return runs
+
+
+def _full_push(
+    services: Services,
+    spreadsheet_id: str,
+    file: FileDetails,
+    keys: RowKeys,
+) -> None:
+    hashes: List[List[str]] = []
+
+    def rows() -> Iterator[List[str]]:
+        for _, key, row in _read_rows(file.path, keys):
+            hashes.append([key, row_hash(row)])
+            yield row
+
+    stream_data_to_spreadsheet(
+        services.sheets,
+        spreadsheet_id,
+        file.name,
+        rows(),
+        sheet=file.sheet,
+        block_size=file.block_size,
+        clear=True,
+    )
+
+    hash_sheet = hash_sheet_name(file.sheet)
+    create_missing_sheets(
+        services.sheets,
+        spreadsheet_id,
+        [hash_sheet],
+        rows=max(len(hashes), 1),
+        columns=2,
+        hidden=True,
+    )
+    stream_data_to_spreadsheet(
+        services.sheets,
+        spreadsheet_id,
+        f"{file.name} [{hash_sheet}]",
+        hashes,
+        sheet=hash_sheet,
+        block_size=file.block_size,
+        clear=True,
+    )
+
+
+def _push_changes(
+    services: Services,
+    spreadsheet_id: str,
+    file: FileDetails,
+    keys: RowKeys,
+    stored: List[List[str]],
+) -> None:
+    # Row n of the hash tab holds the key and hash of row n of the data sheet
+    positions: Dict[str, int] = {}
+    if keys.key_column is not None:
+        for number, entry in enumerate(stored[1:], start=2):
+            if entry:
+                positions[entry[0]] = number
+
+    changed: List[Tuple[int, List[str]]] = []
+    changed_hashes: List[Tuple[int, List[str]]] = []
+    appended: List[List[str]] = []
+    appended_hashes: List[List[str]] = []
+    width = 0
+    total = 0
+
+    for number, key, row in _read_rows(file.path, keys):
+        total += 1
+        width = width or len(row)
+        digest = row_hash(row)
+
+        if keys.key_column is None or number == 1:
+            target = number if number <= len(stored) else None
+        else:
+            target = positions.get(key)
+
+        if target is None:
+            appended.append(row)
+            appended_hashes.append([key, digest])
+            continue
+
+        entry = stored[target - 1]
+        if len(entry) < 2 or entry[1] != digest:
+            # Pad with empty strings so cells left over from a longer row are cleared
+            changed.append((target, row + [""] * (width - len(row))))
+            changed_hashes.append((target, [key, digest]))
+
+    if keys.key_column is None and total < len(stored):
+        logger.warning(
+            f"{file.path} has fewer rows than sheet '{file.sheet}'; "
+            f"rows removed locally are left in the sheet."
+        )
+
+    hash_sheet = hash_sheet_name(file.sheet)
+    if appended:
+        first_row = append_rows(
+            services.sheets,
+            spreadsheet_id,
+            file.sheet,
+            appended,
+            start_row=len(stored) + 1,
+            block_size=file.block_size,
+        )
+        changed_hashes.extend(
+            (first_row + offset, entry) for offset, entry in enumerate(appended_hashes)
+        )
+
+    ranges = [(file.sheet, start, rows) for start, rows in _runs(changed)]
+    ranges += [(hash_sheet, start, rows) for start, rows in _runs(changed_hashes)]
+    if ranges:
+        update_rows(services.sheets, spreadsheet_id, ranges, block_size=file.block_size)
+
+    logger.info(
+        f"{file.name}: {len(appended)} rows appended, {len(changed)} rows updated, "
+        f"{total - len(appended) - len(changed)} rows unchanged."
+    )
+
+
+def incremental_handler(
+    services: Services,
+    folder_id: str,
+    file: FileDetails,
+) -> None:
+    """
+    Uploads only the rows of a CSV that are new or changed since the last push.
+
+    A hidden tab next to the data sheet (see `hash_sheet_name`) stores the key and the
+    checksum of every row of the sheet. On each push the local CSV is compared against
+    those checksums: new rows are sent with `values().append` and changed rows are
+    overwritten with a single targeted `values().batchUpdate`, so the cost of a push
+    grows with the size of the change instead of the size of the table.
+
+    Rows are matched by their value in the `file.upsert` column, or by position with
+    `file.append`. The first push, or a push to a sheet without stored checksums, writes
+    the whole CSV. Rows that were removed from the CSV are left in the sheet.
+    """
+    checksum = None
+    if file.sync:
+        checksum = local_hashes.md5(file.path)
+        existing = list_folder(services.drive, folder_id).get(file.name)
+        if existing and existing.app_properties.get(_sync_property(file)) == checksum:
+            logger.debug(
+                f"Sheet '{file.sheet}' of '{file.name}' is unchanged; skipping."
+            )
+            return
+
+    file_id = find_file(services.drive, folder_id, file.name, SPREADSHEET_MIME_TYPE)
+    if not file_id:
+        file_id = create_google_sheet(services.drive, folder_id, file.name)
+
+    keys = RowKeys(file.upsert)
+    hash_sheet = hash_sheet_name(file.sheet)
+    sheets = list_sheets(services.sheets, file_id)
+    stored = None
+    if file.sheet in sheets and hash_sheet in sheets:
+        stored = read_columns(services.sheets, file_id, hash_sheet)
+
+    if stored:
+        _push_changes(services, file_id, file, keys, stored)
+    else:
+        logger.debug(f"No row hashes stored for '{file.sheet}'; writing all rows.")
+        _full_push(services, file_id, file, keys)
+
+    if checksum is not None:
+        set_app_properties(
+            services.drive, folder_id, file_id, {_sync_property(file): checksum}
+        )
@@ -0,0 +1,551 @@
+from __future__ import annotations
+
+import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field, replace
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from gpush import logger
+from gpush.auth.services import Services, ThreadLocalServices
+from gpush.checksums import local_hashes
+from gpush.journal import Journal
+from gpush.requests.gdrive import (
+    SPREADSHEET_MIME_TYPE,
+    RemoteFile,
+    create_drive_folders,
+    create_google_sheets,
+    find_file,
+    folder_index,
+    list_folder,
+    load_folders,
+)
+from gpush.requests.resumable import upload_key
+
+from .spreadsheet import _sync_property
+from .upload import SHEET_TYPES, FileDetails, UploadType, upload_file
+from .workbook import SYNC_PROPERTY as WORKBOOK_SYNC_PROPERTY
+
+PLAN_VERSION = 1
+# Options of a single run of the command line tool, which are not part of a plan
+RUN_OPTIONS = ("stats", "dry_run", "save_plan", "plan", "resume")
+
+
+class Action(Enum):
+    CREATE_FOLDER = "create folder"
+    CREATE = "create"
+    UPDATE = "update"
+    SKIP = "skip"
+
+
+@dataclass
+class Operation:
+    """
+    One step of a `Plan`: what to do with one local file or directory.
+
+    `parent` is the index of the operation of the directory the entry lives in, or None
+    for the top-level entry, which goes into the plan's folder. `file_id` is the ID of
+    the existing Drive file or folder of the same name, if there is one.
+    """
+
+    action: Action
+    path: str
+    name: str
+    type: UploadType
+    parent: Optional[int] = None
+    file_id: Optional[str] = None
+    size: Optional[int] = None
+    reason: str = ""
+
+    def to_json(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.update(action=self.action.value, type=self.type.value)
+        return data
+
+    @staticmethod
+    def from_json(data: Dict[str, Any]) -> Operation:
+        return Operation(
+            **{
+                **data,
+                "action": Action(data["action"]),
+                "type": UploadType(data["type"]),
+            }
+        )
+
+
+@dataclass
+class Plan:
+    """
+    Every operation needed to push `file` into the Drive folder `folder_id`.
+
+    Operations are ordered so that each directory comes before its contents. A plan
+    can be saved as JSON and executed later (see `execute_plan`); the upload handlers
+    check the state of Drive again when it is executed, so a plan that went stale does
+    not overwrite newer files with `file.sync` set.
+    """
+
+    folder_id: str
+    file: FileDetails
+    operations: List[Operation] = field(default_factory=list)
+
+    def add(self, operation: Operation) -> int:
+        self.operations.append(operation)
+        return len(self.operations) - 1
+
+    def counts(self) -> Counter:
+        return Counter(
+            (operation.action, operation.type is UploadType.DIR)
+            for operation in self.operations
+        )
+
+    def summary(self) -> str:
+        counts = self.counts()
+        return (
+            f"{counts[(Action.CREATE_FOLDER, True)]} folder(s) to create, "
+            f"{counts[(Action.CREATE, False)]} file(s) to create, "
+            f"{counts[(Action.UPDATE, False)]} to update and "
+            f"{counts[(Action.SKIP, False)]} unchanged"
+        )
+
+    def describe(self) -> Iterator[str]:
+        """Yield one line per operation that changes something, for `--dry-run`."""
+        for operation in self.operations:
+            if operation.action is Action.SKIP:
+                continue
+            line = f"{operation.action.value:<13} {operation.path}"
+            if operation.reason:
+                line += f" ({operation.reason})"
+            yield line
+
+    def to_json(self) -> Dict[str, Any]:
+        options = {
+            key: value
+            for key, value in asdict(self.file).items()
+            if key not in RUN_OPTIONS
+        }
+        options["type"] = self.file.type.value
+        return {
+            "version": PLAN_VERSION,
+            "folder_id": self.folder_id,
+            "file": options,
+            "operations": [operation.to_json() for operation in self.operations],
+        }
+
+    @staticmethod
+    def from_json(data: Dict[str, Any]) -> Plan:
+        if data.get("version") != PLAN_VERSION:
+            raise ValueError(f"Unsupported plan version: {data.get('version')}.")
+        options = data["file"]
+        return Plan(
+            folder_id=data["folder_id"],
+            file=FileDetails(**{**options, "type": UploadType(options["type"])}),
+            operations=[Operation.from_json(item) for item in data["operations"]],
+        )
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    @staticmethod
+    def load(path: str) -> Plan:
+        with open(path) as f:
+            return Plan.from_json(json.load(f))
+
+
+def _scan(path: str) -> List[os.DirEntry]:
+    with os.scandir(path) as it:
+        return sorted(it, key=lambda entry: entry.name)
+
+
+def _entry_type(entry: os.DirEntry) -> UploadType:
+    # Like `UploadType.from_path`, but with the file type scandir already read
+    if entry.is_dir():
+        return UploadType.DIR
+    _, ext = os.path.splitext(entry.name)
+    try:
+        return UploadType(ext) if ext else UploadType.OTHER
+    except ValueError:
+        return UploadType.OTHER
+
+
+def _plan_folder(
+    path: str, name: str, remote: Optional[RemoteFile], parent: Optional[int]
+) -> Operation:
+    if remote is not None and remote.is_folder:
+        return Operation(
+            Action.SKIP, path, name, UploadType.DIR, parent, remote.id, reason="exists"
+        )
+    return Operation(Action.CREATE_FOLDER, path, name, UploadType.DIR, parent)
+
+
+def _plan_file(
+    file: FileDetails, remote: Optional[RemoteFile], parent: Optional[int], size: int
+) -> Operation:
+    """Decide what to do with a file, the way its upload handler would."""
+
+    def operation(action: Action, reason: str = "") -> Operation:
+        file_id = remote.id if remote is not None else None
+        return Operation(
+            action, file.path, file.name, file.type, parent, file_id, size, reason
+        )
+
+    if remote is None or remote.is_folder:
+        return operation(Action.CREATE)
+
+    if file.type in SHEET_TYPES:
+        # Sheets are always written into the existing Google Sheet
+        if not file.sync:
+            return operation(Action.UPDATE, "exists")
+        if file.type in (UploadType.XLSX, UploadType.XLS):
+            key = WORKBOOK_SYNC_PROPERTY
+        else:
+            key = _sync_property(file)
+        if remote.app_properties.get(key) == local_hashes.md5(file.path):
+            return operation(Action.SKIP, "unchanged")
+        return operation(Action.UPDATE, "changed")
+
+    # Native Google files have no checksum and cannot be replaced
+    if not file.sync or remote.md5_checksum is None:
+        return operation(Action.CREATE, "a file of that name exists")
+    if remote.size == size and remote.md5_checksum == local_hashes.md5(file.path):
+        return operation(Action.SKIP, "unchanged")
+    return operation(Action.UPDATE, "changed")
+
+
+# The arguments of `_plan_file` for one file
+FileArgs = Tuple[FileDetails, Optional[RemoteFile], Optional[int], int]
+
+
+def _plan_files(files: List[FileArgs], jobs: int) -> Iterator[Operation]:
+    """
+    Plan files with `_plan_file`, in order. With --sync, planning reads every file that
+    may be unchanged, so the files are then planned, and hashed, by `jobs` threads.
+    """
+    if jobs <= 1 or len(files) <= 1 or not files[0][0].sync:
+        return (_plan_file(*args) for args in files)
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="gpush-hash") as pool:
+        return iter(list(pool.map(lambda args: _plan_file(*args), files)))
+
+
+def make_plan(services: Services, folder_id: str, file: FileDetails) -> Plan:
+    """
+    Plan the push of a file or directory tree into a Drive folder, without changing it.
+
+    The local tree is walked one depth at a time with `os.scandir`, whose entries carry
+    the file types and sizes, so every file is stat-ed at most once. The Drive folders
+    that already exist at each depth are listed together in batch requests (see
+    `load_folders`), so the snapshot of the remote tree takes a few requests per depth,
+    plus one per further page of large folders. Folders that have to be created are
+    known to be empty and are not listed at all.
+
+    With `file.sync` set, files are hashed to tell unchanged files from changed ones
+    (see `local_hashes`), by `file.jobs` threads; otherwise no file is read.
+
+    Args:
+        services (Services): The services needed to interact with Google APIs.
+        folder_id (str): The ID of the Drive folder the file is pushed into.
+        file (FileDetails): The details of the file or directory to push.
+
+    Returns:
+        Plan: The operations, in an order in which they can be executed.
+    """
+    file = replace(file, path=os.path.abspath(file.path))
+    plan = Plan(folder_id, file)
+    remote = list_folder(services.drive, folder_id).get(file.name)
+
+    if file.type is not UploadType.DIR:
+        plan.add(_plan_file(file, remote, None, os.path.getsize(file.path)))
+        return plan
+
+    level = [plan.add(_plan_folder(file.path, file.name, remote, None))]
+    while level:
+        folders = [plan.operations[index] for index in level]
+        load_folders(
+            services.drive, [folder.file_id for folder in folders if folder.file_id]
+        )
+
+        # The folders of this depth, and the files to plan together
+        entries: List[Operation | None] = []
+        files: List[FileArgs] = []
+        for index, folder in zip(level, folders):
+            listing = (
+                list_folder(services.drive, folder.file_id) if folder.file_id else {}
+            )
+            for entry in _scan(folder.path):
+                remote = listing.get(entry.name)
+                entry_type = _entry_type(entry)
+                if entry_type is UploadType.DIR:
+                    entries.append(_plan_folder(entry.path, entry.name, remote, index))
+                    continue
+                child = replace(file, path=entry.path, name=entry.name, type=entry_type)
+                files.append((child, remote, index, entry.stat().st_size))
+                entries.append(None)
+
+        next_level = []
+        planned = _plan_files(files, file.jobs)
+        for operation in entries:
+            if operation is None:
+                plan.add(next(planned))
+            else:
+                next_level.append(plan.add(operation))
+        level = next_level
+
+    if file.resume:
+        plan = resume_plan(plan)
+    logger.debug(f"Planned {len(plan.operations)} operations: {plan.summary()}.")
+    return plan
+
+
+def plan_paths(
+    services: Services, folder_id: str, file: FileDetails, paths: Iterable[str]
+) -> Plan:
+    """
+    Like `make_plan` for the directory `file`, but only plan some of the files in it.
+
+    The plan covers the given files and the folders on their way from `file.path`, and
+    nothing else of the tree is scanned. Folder listings are served from the shared
+    `folder_index`, so a warm index plans small changes without any requests.
+
+    Args:
+        services (Services): The services needed to interact with Google APIs.
+        folder_id (str): The ID of the Drive folder the directory is pushed into.
+        file (FileDetails): The details of the directory.
+        paths (Iterable[str]): Paths of files inside the directory.
+
+    Returns:
+        Plan: The operations for these files and their folders.
+    """
+    file = replace(file, path=os.path.abspath(file.path))
+    plan = Plan(folder_id, file)
+    remote = list_folder(services.drive, folder_id).get(file.name)
+    folders = {file.path: plan.add(_plan_folder(file.path, file.name, remote, None))}
+
+    def listing(index: int) -> Dict[str, RemoteFile]:
+        folder_id = plan.operations[index].file_id
+        return list_folder(services.drive, folder_id) if folder_id else {}
+
+    def folder(path: str) -> int:
+        if path not in folders:
+            parent = folder(os.path.dirname(path))
+            name = os.path.basename(path)
+            operation = _plan_folder(path, name, listing(parent).get(name), parent)
+            folders[path] = plan.add(operation)
+        return folders[path]
+
+    files: List[FileArgs] = []
+    for path in sorted(os.path.abspath(path) for path in paths):
+        if not path.startswith(file.path + os.sep):
+            raise ValueError(f"{path} is not inside {file.path}.")
+        parent = folder(os.path.dirname(path))
+        name = os.path.basename(path)
+        child = replace(file, path=path, name=name, type=UploadType.from_path(path))
+        files.append((child, listing(parent).get(name), parent, os.path.getsize(path)))
+
+    for operation in _plan_files(files, file.jobs):
+        plan.add(operation)
+    return plan
+
+
+def _journal(plan: Plan) -> Journal:
+    return Journal(upload_key(plan.file.path, plan.folder_id, plan.file.name))
+
+
+def resume_plan(plan: Plan) -> Plan:
+    """
+    Skip the operations of a directory plan that an interrupted push already carried out.
+
+    Files are skipped if the journal of the push (see `Journal`) recorded them as
+    pushed, they have not changed since, and a file of their name still exists on
+    Drive. Folders need no journal: those the interrupted push created are found on
+    Drive by `make_plan`. Uploads that were cut off halfway continue from their saved
+    resumable session when the plan is executed.
+    """
+    plan = replace(plan, file=replace(plan.file, resume=True))
+    if plan.file.type is not UploadType.DIR:
+        return plan
+
+    journal = _journal(plan)
+    try:
+        completed = journal.completed()
+    finally:
+        journal.close()
+
+    skipped = 0
+    for index, operation in enumerate(plan.operations):
+        done = completed.get(operation.path)
+        if (
+            done is None
+            or operation.type is UploadType.DIR
+            or operation.action is Action.SKIP
+            or operation.file_id is None
+        ):
+            continue
+        try:
+            stat = os.stat(operation.path)
+        except OSError:
+            continue
+        if (stat.st_size, stat.st_mtime_ns) != (done.size, done.mtime_ns):
+            continue
+        plan.operations[index] = replace(
+            operation, action=Action.SKIP, reason="pushed before the interruption"
+        )
+        skipped += 1
+
+    if skipped:
+        logger.info(f"Resuming: {skipped} file(s) were pushed by the interrupted run.")
+    return plan
+
+
+def execute_plan(services: Services, plan: Plan) -> None:
+    """
+    Carry out a `Plan`.
+
+    The folders to create are created one depth at a time, each depth in batch requests
+    (see `create_drive_folders`), followed by the Google Sheets that files in the tree
+    will be written into (see `create_google_sheets`). The files are then pushed by
+    their upload handlers, through a pool of `plan.file.jobs` workers. Unchanged files
+    are not touched.
+
+    Directory pushes are journaled (see `Journal`): the operations are recorded before
+    anything is changed, and every folder and file as it is done, so an interrupted push
+    can be continued with `resume_plan`. The journal is dropped once the push succeeded.
+
+    Args:
+        services (Services): The services needed to interact with Google APIs.
+        plan (Plan): The plan to execute, e.g. from `make_plan` or `Plan.load`.
+
+    Raises:
+        Exception: The first error raised by any of the uploads.
+    """
+    if plan.file.type is not UploadType.DIR:
+        _execute_plan(services, plan, None)
+        return
+
+    journal = _journal(plan)
+    try:
+        if not plan.file.resume and journal.interrupted():
+            logger.warning(
+                f"An earlier push of {plan.file.path} was interrupted; starting over. "
+                f"Use --resume to continue it instead."
+            )
+        journal.start(
+            (
+                (operation.path, operation.action.value, operation.size)
+                for operation in plan.operations
+                if operation.action is not Action.SKIP
+            ),
+            resume=plan.file.resume,
+        )
+        _execute_plan(services, plan, journal)
+        journal.finish()
+    finally:
+        journal.close()
+
+
+def _execute_plan(services: Services, plan: Plan, journal: Optional[Journal]) -> None:
+    operations = plan.operations
+    folder_ids: Dict[Optional[int], str] = {None: plan.folder_id}
+    pending = []
+    for index, operation in enumerate(operations):
+        if operation.type is not UploadType.DIR:
+            continue
+        if operation.action is Action.CREATE_FOLDER:
+            pending.append(index)
+        else:
+            folder_ids[index] = operation.file_id  # type: ignore
+
+    while pending:
+        ready = [i for i in pending if operations[i].parent in folder_ids]
+        if not ready:
+            raise ValueError("The folders of the plan do not form a tree.")
+        logger.debug(f"Create {len(ready)} folder(s)...")
+        new_folder_ids = create_drive_folders(
+            services.drive,
+            [(operations[i].name, folder_ids[operations[i].parent]) for i in ready],
+        )
+        folder_ids.update(zip(ready, new_folder_ids))
+        if journal is not None:
+            for index, folder_id in zip(ready, new_folder_ids):
+                journal.complete(operations[index].path, folder_id)
+        pending = [i for i in pending if i not in folder_ids]
+
+    uploads = [
+        (
+            folder_ids[operation.parent],
+            replace(
+                plan.file, path=operation.path, name=operation.name, type=operation.type
+            ),
+        )
+        for operation in operations
+        if operation.type is not UploadType.DIR
+        and operation.action in (Action.CREATE, Action.UPDATE)
+    ]
+    if plan.file.type is UploadType.DIR:
+        _create_sheets(services, uploads)
+    _run_uploads(services, uploads, plan.file.jobs, journal)
+
+
+def _create_sheets(services: Services, uploads: List[Tuple[str, FileDetails]]) -> None:
+    sheet_files = [(parent, f.name) for parent, f in uploads if f.type in SHEET_TYPES]
+    load_folders(services.drive, [parent for parent, _ in sheet_files])
+
+    missing = [
+        (parent, name)
+        for parent, name in sheet_files
+        if find_file(services.drive, parent, name, SPREADSHEET_MIME_TYPE) is None
+    ]
+    if missing:
+        create_google_sheets(services.drive, missing)
+
+
+def _upload(
+    services: Services,
+    parent_id: str,
+    item: FileDetails,
+    journal: Optional[Journal],
+) -> None:
+    logger.debug(f"Uploading {item.name}...")
+    stat = os.stat(item.path)
+    upload_file(services, parent_id, item)
+    if journal is not None:
+        # The handlers keep the cached listing up to date, so this costs no request
+        remote = (folder_index.get(parent_id) or {}).get(item.name)
+        journal.complete(item.path, remote.id if remote else None, stat)
+
+
+def _run_uploads(
+    services: Services,
+    uploads: List[Tuple[str, FileDetails]],
+    jobs: int,
+    journal: Optional[Journal] = None,
+) -> None:
+    """
+    Upload files into their folders, through a bounded pool of worker threads.
+
+    The workers get their services from `ThreadLocalServices`, which shares `services`
+    when its transport is thread-safe, like the pooled default, and gives every thread
+    its own clients otherwise. If an upload fails, uploads that have not started yet
+    are cancelled; running ones are allowed to finish. Uploads that finished are
+    recorded in `journal`.
+    """
+    if jobs <= 1:
+        for parent_id, item in uploads:
+            _upload(services, parent_id, item, journal)
+        return
+
+    thread_services = ThreadLocalServices(services)
+
+    def run(parent_id: str, item: FileDetails) -> None:
+        _upload(thread_services.get(), parent_id, replace(item, jobs=1), journal)
+
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="gpush") as pool:
+        futures = [pool.submit(run, parent_id, item) for parent_id, item in uploads]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import csv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Set
+
+from gpush import logger
+from gpush.auth.services import Services, ThreadLocalServices
+from gpush.checksums import local_hashes
+from gpush.requests.gdrive import (
+    SPREADSHEET_MIME_TYPE,
+    create_google_sheets,
+    find_file,
+    list_folder,
+    set_app_properties,
+)
+from gpush.requests.gsheets import (
+    create_missing_sheets,
+    delete_sheets,
+    list_sheets,
+    read_rows,
+    spreadsheet_session,
+    stream_data_to_spreadsheet,
+    upload_data_to_spreadsheet,
+)
+
+from .spreadsheet import _sync_property
+
+if TYPE_CHECKING:
+    from gpush.handlers.upload import FileDetails
+
+# Google Sheets allows at most 10 million cells per spreadsheet. Shards are planned
+# against a lower budget to leave room for the default tab and the index tab.
+SPREADSHEET_CELL_LIMIT = 10_000_000
+SPREADSHEET_CELL_BUDGET = 9_000_000
+DEFAULT_TAB_CELLS = 1_000_000
+INDEX_SHEET = "Index"
+
+
+@dataclass
+class Shard:
+    """A range of data rows of a CSV and the tab it is written to."""
+
+    number: int
+    spreadsheet: int
+    sheet: str
+    first_row: int
+    last_row: int
+    offset: int
+
+    @property
+    def rows(self) -> int:
+        return self.last_row - self.first_row + 1
+
+
+@dataclass
+class ShardPlan:
+    """
+    The layout of a CSV split across numbered tabs and spreadsheets.
+
+    Every tab holds the header followed by at most `rows_per_tab` data rows, and every
+    spreadsheet holds at most `tabs_per_spreadsheet` tabs.
+    """
+
+    header: List[str]
+    width: int
+    rows: int
+    rows_per_tab: int
+    tabs_per_spreadsheet: int
+    offsets: List[int]
+
+    @property
+    def tabs(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def spreadsheets(self) -> int:
+        return -(-self.tabs // self.tabs_per_spreadsheet)
+
+    def shards(self, sheet: str) -> Iterator[Shard]:
+        """Yield the shards of the plan, naming the tabs after `sheet`."""
+        for index, offset in enumerate(self.offsets):
+            first_row = index * self.rows_per_tab + 1
+            yield Shard(
+                number=index + 1,
+                spreadsheet=index // self.tabs_per_spreadsheet,
+                sheet=f"{sheet} {index + 1}",
+                first_row=first_row,
+                last_row=min(first_row + self.rows_per_tab - 1, self.rows),
+                offset=offset,
+            )
+
+
+def plan_shards(
+    path: str,
+    rows_per_tab: Optional[int] = None,
+    tab_cells: int = DEFAULT_TAB_CELLS,
+    spreadsheet_cells: int = SPREADSHEET_CELL_BUDGET,
+) -> ShardPlan:
+    """
+    Work out how a CSV is split into shards.
+
+    The CSV is streamed once to count its rows, find its widest row and record the
+    position in the file where each shard starts, so that the shards can later be read
+    independently of each other. Only the header is kept in memory.
+
+    Args:
+        path (str): The path of the CSV.
+        rows_per_tab (int, optional): The number of data rows per tab. Defaults to as
+                                      many as fit into `tab_cells` cells.
+        tab_cells (int, optional): The cell budget of a single tab.
+        spreadsheet_cells (int, optional): The cell budget of a single spreadsheet.
+
+    Returns:
+        ShardPlan: The plan; it has no shards if the CSV has no data rows.
+
+    Raises:
+        ValueError: If a single tab does not fit into a spreadsheet.
+    """
+    with open(path, newline="") as f:
+        # Reading line by line keeps f.tell() usable between the records
+        reader = csv.reader(iter(f.readline, ""))
+        header = next(reader, [])
+        width = max(len(header), 1)
+        rows_per_tab = rows_per_tab or max(tab_cells // width - 1, 1)
+
+        offsets = []
+        rows = 0
+        offset = f.tell()
+        for row in reader:
+            if rows % rows_per_tab == 0:
+                offsets.append(offset)
+            rows += 1
+            width = max(width, len(row))
+            if rows % rows_per_tab == 0:
+                offset = f.tell()
+
+    tab_size = (rows_per_tab + 1) * width
+    if tab_size > spreadsheet_cells:
+        raise ValueError(
+            f"A tab of {rows_per_tab} rows x {width} columns does not fit into a "
+            f"spreadsheet; use fewer rows per tab."
+        )
+
+    return ShardPlan(
+        header=header,
+        width=width,
+        rows=rows,
+        rows_per_tab=rows_per_tab,
+        tabs_per_spreadsheet=spreadsheet_cells // tab_size,
+        offsets=offsets,
+    )
+
+
+def _spreadsheet_name(file: FileDetails, index: int) -> str:
+    return file.name if index == 0 else f"{file.name} ({index + 1})"
+
+
+def _write_shard(
+    services: Services,
+    spreadsheet_id: str,
+    file: FileDetails,
+    plan: ShardPlan,
+    shard: Shard,
+) -> None:
+    with open(file.path, newline="") as f:
+        f.seek(shard.offset)
+        rows = islice(csv.reader(f), shard.rows)
+        stream_data_to_spreadsheet(
+            services.sheets,
+            spreadsheet_id,
+            f"{file.name} [{shard.sheet}]",
+            chain([plan.header], rows),
+            sheet=shard.sheet,
+            block_size=file.block_size,
+            clear=True,
+        )
+
+
+def _previous_shards(services: Services, spreadsheet_id: str) -> Dict[str, Set[str]]:
+    """
+    Return the tabs listed by the index tab of an earlier upload, by spreadsheet name.
+
+    Only tabs listed there were created by gpush, so only those are ever deleted.
+    """
+    session = spreadsheet_session(services.sheets, spreadsheet_id)
+    index_sheet = session.sheets.get(INDEX_SHEET)
+    if index_sheet is None:
+        return {}
+    previous: Dict[str, Set[str]] = {}
+    rows = read_rows(services.sheets, spreadsheet_id, index_sheet)
+    for row in islice(rows, 1, None):
+        if len(row) > 2:
+            previous.setdefault(str(row[1]), set()).add(str(row[2]))
+    return previous
+
+
+def _remove_stale_shards(
+    services: Services,
+    folder_id: str,
+    names: List[str],
+    spreadsheet_ids: List[str],
+    shards: List[Shard],
+) -> None:
+    """
+    Delete the shard tabs left over from an upload that was split into more tabs, and
+    warn about left over spreadsheets, which may hold data of the user's.
+
+    The shards of the earlier upload are read from its index tab, so tabs that gpush did
+    not create are never touched.
+    """
+    previous = _previous_shards(services, spreadsheet_ids[0])
+    current = {shard.sheet for shard in shards}
+    for name, spreadsheet_id in zip(names, spreadsheet_ids):
+        stale = [
+            title
+            for title in list_sheets(services.sheets, spreadsheet_id)
+            if title in previous.get(name, set()) and title not in current
+        ]
+        if stale:
+            logger.info(f"Deleting {len(stale)} shard tab(s) of an earlier upload.")
+            delete_sheets(services.sheets, spreadsheet_id, stale)
+
+    listing = list_folder(services.drive, folder_id)
+    for name in sorted(set(previous) - set(names)):
+        if name in listing:
+            logger.warning(
+                f"'{name}' holds shards of an earlier upload and is no longer used; "
+                f"delete it if it is not needed."
+            )
+
+
+def sharded_handler(
+    services: Services,
+    folder_id: str,
+    file: FileDetails,
+) -> None:
+    """
+    Uploads a CSV that is too large for one Google Sheet, split across tabs and sheets.
+
+    The CSV is planned first (see `plan_shards`): the cell budget of a tab follows from
+    the width of the CSV, and as many tabs as fit within the cell limit are placed in
+    each spreadsheet. The first spreadsheet is named after the upload and the others
+    get a numbered suffix. Every tab repeats the header of the CSV.
+
+    The missing spreadsheets are created in one batch and the tabs of every spreadsheet
+    in one `batchUpdate`. The shards are then streamed by up to `file.jobs` concurrent
+    workers, each reading its own range of the file. Finally an index tab listing the
+    spreadsheet, tab and CSV row range of every shard is written to the first
+    spreadsheet.
+
+    With `file.sync` set, the checksum of the CSV is stored on the first spreadsheet and
+    a CSV whose checksum matches the stored one is not uploaded again.
+    """
+    checksum = None
+    if file.sync:
+        checksum = local_hashes.md5(file.path)
+        existing = list_folder(services.drive, folder_id).get(file.name)
+        if existing and existing.app_properties.get(_sync_property(file)) == checksum:
+            logger.debug(f"'{file.name}' is unchanged; skipping.")
+            return
+
+    plan = plan_shards(file.path, rows_per_tab=file.shard_rows)
+    if not plan.tabs:
+        logger.warning(f"{file.path} has no data rows; nothing to upload.")
+        return
+    logger.info(
+        f"Splitting {plan.rows} rows of {file.name} into {plan.tabs} tab(s) of "
+        f"{plan.rows_per_tab} rows across {plan.spreadsheets} spreadsheet(s)."
+    )
+
+    names = [_spreadsheet_name(file, index) for index in range(plan.spreadsheets)]
+    spreadsheet_ids = [
+        find_file(services.drive, folder_id, name, SPREADSHEET_MIME_TYPE)
+        for name in names
+    ]
+    missing = [index for index, id_ in enumerate(spreadsheet_ids) if id_ is None]
+    if missing:
+        new_ids = create_google_sheets(
+            services.drive, [(folder_id, names[index]) for index in missing]
+        )
+        for index, new_id in zip(missing, new_ids):
+            spreadsheet_ids[index] = new_id
+
+    shards = list(plan.shards(file.sheet))
+    for index, spreadsheet_id in enumerate(spreadsheet_ids):
+        create_missing_sheets(
+            services.sheets,
+            spreadsheet_id,
+            [shard.sheet for shard in shards if shard.spreadsheet == index],
+            rows=plan.rows_per_tab + 1,
+            columns=plan.width,
+        )
+
+    thread_services = ThreadLocalServices(services)
+
+    def run(shard: Shard) -> None:
+        _write_shard(
+            thread_services.get(),
+            spreadsheet_ids[shard.spreadsheet],
+            file,
+            plan,
+            shard,
+        )
+
+    with ThreadPoolExecutor(
+        max_workers=max(file.jobs, 1), thread_name_prefix="gpush-shard"
+    ) as pool:
+        futures = [pool.submit(run, shard) for shard in shards]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+    _remove_stale_shards(services, folder_id, names, spreadsheet_ids, shards)
+
+    index_rows: List[List[Any]] = [
+        ["Shard", "Spreadsheet", "Tab", "First row", "Last row", "URL"]
+    ]
+    for shard in shards:
+        spreadsheet_id = spreadsheet_ids[shard.spreadsheet]
+        index_rows.append(
+            [
+                shard.number,
+                names[shard.spreadsheet],
+                shard.sheet,
+                shard.first_row,
+                shard.last_row,
+                f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/",
+            ]
+        )
+    upload_data_to_spreadsheet(
+        services.sheets,
+        spreadsheet_ids[0],
+        f"{file.name} [{INDEX_SHEET}]",
+        index_rows,
+        sheet=INDEX_SHEET,
+        clear=True,
+    )
+
+    if checksum is not None:
+        set_app_properties(
+            services.drive,
+            folder_id,
+            spreadsheet_ids[0],
+            {_sync_property(file): checksum},
+        )
+
+    logger.info(
+        f"Uploaded {file.name} as {plan.tabs} tab(s) in {plan.spreadsheets} "
+        f"spreadsheet(s); see the '{INDEX_SHEET}' tab of "
+        f"https://docs.google.com/spreadsheets/d/{spreadsheet_ids[0]}/."
+    )
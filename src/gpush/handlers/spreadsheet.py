@@ -1,29 +1,144 @@
 from __future__ import annotations
 
 import csv
-from typing import TYPE_CHECKING
+import os
+from typing import TYPE_CHECKING, Optional
 
+from gpush import logger
 from gpush.auth.services import Services
-from gpush.requests.gdrive import create_google_sheet, find_file
-from gpush.requests.gsheets import upload_data_to_spreadsheet
+from gpush.checksums import local_hashes
+from gpush.requests.gdrive import (
+    SPREADSHEET_MIME_TYPE,
+    create_google_sheet,
+    find_file,
+    import_csv_as_sheet,
+    list_folder,
+    set_app_properties,
+)
+from gpush.requests.gsheets import (
+    list_sheets,
+    rename_sheet,
+    spreadsheet_session,
+    stream_data_to_spreadsheet,
+    upload_data_to_spreadsheet,
+)
 
 if TYPE_CHECKING:
     from gpush.handlers.upload import FileDetails
 
+# CSVs above this size are converted by Drive instead of being written cell by cell
+DEFAULT_IMPORT_THRESHOLD = 20 * 1024 * 1024
+# Drive does not convert larger files into Google Sheets
+MAX_IMPORT_SIZE = 100 * 1024 * 1024
+IMPORT_MODES = ("auto", "always", "never")
+
 
 def spreadsheet_handler(
     services: Services,
     folder_id: str,
     file: FileDetails,
 ) -> None:
-    """Uploads a file to a Google Sheet."""
+    """
+    Uploads a file to a Google Sheet.
+
+    By default the whole CSV is read into memory and sent in a single request. With
+    `file.stream` set, the CSV is read lazily and written in blocks of `file.block_size`
+    rows, which keeps memory use flat regardless of the size of the file.
+
+    Large CSVs are instead uploaded as a file and converted into a Google Sheet by Drive
+    (see `import_csv_as_sheet`), which skips parsing on the client and the values API
+    altogether. This happens when `file.import_mode` is "always", or when it is "auto"
+    and the CSV is at least `file.import_threshold` bytes (see `_should_import`). Drive
+    parses the values like the Sheets UI does when opening a CSV, so numbers and dates
+    are converted rather than stored as text.
+
+    With `file.sync` set, the checksum of the uploaded CSV is stored as an application
+    property on the Google Sheet, and a CSV whose checksum matches the stored one is not
+    uploaded again.
+    """
+    checksum = None
+    if file.sync:
+        checksum = local_hashes.md5(file.path)
+        existing = list_folder(services.drive, folder_id).get(file.name)
+        if existing and existing.app_properties.get(_sync_property(file)) == checksum:
+            logger.debug(
+                f"Sheet '{file.sheet}' of '{file.name}' is unchanged; skipping."
+            )
+            return
+
     # Check if the file exists
     file_id = find_file(
         services.drive,
         folder_id,
         file.name,
+        SPREADSHEET_MIME_TYPE,
     )
 
+    if _should_import(services, file, file_id):
+        file_id = _import(services, folder_id, file, file_id)
+    else:
+        file_id = _write_values(services, folder_id, file, file_id)
+
+    if checksum is not None:
+        set_app_properties(
+            services.drive, folder_id, file_id, {_sync_property(file): checksum}
+        )
+
+
+def _should_import(
+    services: Services, file: FileDetails, file_id: Optional[str]
+) -> bool:
+    if file.import_mode == "never":
+        return False
+    if file.import_mode == "auto":
+        size = os.path.getsize(file.path)
+        if size < file.import_threshold or size > MAX_IMPORT_SIZE:
+            return False
+
+    if file_id is None:
+        return True
+
+    # Importing into an existing Google Sheet replaces all of its sheets
+    others = [
+        title for title in list_sheets(services.sheets, file_id) if title != file.sheet
+    ]
+    if not others:
+        return True
+    if file.import_mode == "always":
+        logger.warning(
+            f"Importing {file.name} replaces its other sheets: {', '.join(others)}."
+        )
+        return True
+    logger.debug(f"{file.name} has other sheets; writing values instead of importing.")
+    return False
+
+
+def _import(
+    services: Services, folder_id: str, file: FileDetails, file_id: Optional[str]
+) -> str:
+    file_id = import_csv_as_sheet(
+        services.drive,
+        folder_id,
+        file.name,
+        file.path,
+        file_id=file_id,
+        chunk_size=file.chunk_size,
+    )
+
+    # The converted spreadsheet has a single sheet named by Drive
+    spreadsheet_session(services.sheets, file_id).reset()
+    titles = list_sheets(services.sheets, file_id)
+    if titles and file.sheet not in titles:
+        rename_sheet(services.sheets, file_id, titles[0], file.sheet)
+
+    sheet_url = f"https://docs.google.com/spreadsheets/d/{file_id}/"
+    logger.info(f"Imported {file.name} to {sheet_url}.")
+    return file_id
+
+
+def _write_values(
+    services: Services, folder_id: str, file: FileDetails, file_id: Optional[str]
+) -> str:
     if not file_id:
         file_id = create_google_sheet(
             services.drive,
@@ -31,14 +146,32 @@ def spreadsheet_handler(
             file.name,
         )
 
-    with open(file.path) as f:
-        data = list(csv.reader(f))
+    if file.stream:
+        with open(file.path, newline="") as f:
+            stream_data_to_spreadsheet(
+                services.sheets,
+                file_id,
+                file.name,
+                csv.reader(f),
+                sheet=file.sheet,
+                block_size=file.block_size,
+            )
+    else:
+        with open(file.path) as f:
+            data = list(csv.reader(f))
 
-    # Upload data to the sheet
-    upload_data_to_spreadsheet(
-        services.sheets,
-        file_id,
-        file.name,
-        data,
-        sheet=file.sheet,
-    )
+        # Upload data to the sheet
+        upload_data_to_spreadsheet(
+            services.sheets,
+            file_id,
+            file.name,
+            data,
+            sheet=file.sheet,
+        )
+
+    return file_id
+
+
+def _sync_property(file: FileDetails) -> str:
+    # Keys and values of application properties share a limit of 124 bytes
+    return f"md5:{file.sheet}"[:80]
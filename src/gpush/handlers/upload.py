@@ -2,15 +2,20 @@ from __future__ import annotations
 
 import os
 from argparse import Namespace
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
+from typing import List, Optional
 
-from gpush import logger
 from gpush.auth.services import Services
-from gpush.requests.gdrive import create_drive_folder
+from gpush.requests.gsheets import DEFAULT_BLOCK_SIZE
+from gpush.requests.resumable import CHUNK_SIZE_UNIT, DEFAULT_CHUNK_SIZE
 
+from .archive import archive_handler
 from .generic import generic_handler
-from .spreadsheet import spreadsheet_handler
+from .incremental import incremental_handler
+from .sharded import sharded_handler
+from .spreadsheet import DEFAULT_IMPORT_THRESHOLD, spreadsheet_handler
+from .workbook import workbook_handler
 
 
 class UploadType(Enum):
@@ -44,41 +49,109 @@ class UploadType(Enum):
                     return UploadType.OTHER
 
 
+# The upload types that are pushed into a Google Sheet
+SHEET_TYPES = (UploadType.CSV, UploadType.XLSX, UploadType.XLS)
+
+
 @dataclass
 class FileDetails:
     path: str
     name: str
     sheet: str
     type: UploadType
+    jobs: int = 1
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    stream: bool = False
+    block_size: int = DEFAULT_BLOCK_SIZE
+    sync: bool = False
+    dedup: bool = False
+    shard: bool = False
+    shard_rows: Optional[int] = None
+    append: bool = False
+    upsert: Optional[str] = None
+    import_mode: str = "auto"
+    import_threshold: int = DEFAULT_IMPORT_THRESHOLD
+    stats: Optional[str] = None
+    archive: Optional[str] = None
+    archive_volume_size: Optional[int] = None
+    dry_run: bool = False
+    save_plan: Optional[str] = None
+    plan: Optional[str] = None
+    resume: bool = False
 
     @staticmethod
     def from_args(args: Namespace) -> FileDetails:
+        chunk_size = int(args.chunk_size * 1024 * 1024)
+        if chunk_size <= 0 or chunk_size % CHUNK_SIZE_UNIT:
+            raise ValueError("--chunk-size must be a positive multiple of 0.25 MiB.")
+        if args.block_size < 1:
+            raise ValueError("--block-size must be positive.")
+        if args.shard_rows is not None and args.shard_rows <= 0:
+            raise ValueError("--shard-rows must be positive.")
+        if args.shard and (args.append or args.upsert):
+            raise ValueError("--shard cannot be combined with --append or --upsert.")
+        if args.archive and not os.path.isdir(args.path):
+            raise ValueError("--archive only applies to directories.")
+        if args.volume_size is not None and not args.archive:
+            raise ValueError("--volume-size requires --archive.")
+        if args.archive and (args.dry_run or args.save_plan):
+            raise ValueError("--archive uploads cannot be planned ahead.")
+        volume_size = None
+        if args.volume_size is not None:
+            volume_size = int(args.volume_size * 1024 * 1024)
+            if volume_size <= 0:
+                raise ValueError("--volume-size must be positive.")
+
         return FileDetails(
             path=args.path,
             name=args.name if args.name else os.path.basename(args.path),
             sheet=args.sheet,
             type=UploadType.from_path(args.path),
+            jobs=args.jobs,
+            chunk_size=chunk_size,
+            stream=args.stream,
+            block_size=args.block_size,
+            sync=args.sync,
+            dedup=args.dedup,
+            shard=args.shard,
+            shard_rows=args.shard_rows,
+            append=args.append,
+            upsert=args.upsert,
+            import_mode=args.import_mode,
+            import_threshold=int(args.import_threshold * 1024 * 1024),
+            stats=args.stats,
+            archive=args.archive,
+            archive_volume_size=volume_size,
+            dry_run=args.dry_run,
+            save_plan=args.save_plan,
+            resume=args.resume,
         )
 
 
-def dir_handler(services: Services, folder_id: str, file: FileDetails) -> None:
-    logger.debug(f"Create directory {file.name}...")
-
-    new_folder_id = create_drive_folder(services.drive, file.name, folder_id)
-
+def dir_children(file: FileDetails) -> List[FileDetails]:
+    """
+    List the entries of a directory as `FileDetails`, inheriting the options of the parent.
+    """
+    children = []
     for f in os.listdir(file.path):
-        logger.debug(f"Uploading {f}...")
         new_path = os.path.join(file.path, f)
-
-        new_file = FileDetails(
-            path=new_path,
-            name=f,
-            type=UploadType.from_path(new_path),
-            sheet=file.sheet,
+        children.append(
+            replace(file, path=new_path, name=f, type=UploadType.from_path(new_path))
         )
+    return children
+
+
+def dir_handler(services: Services, folder_id: str, file: FileDetails) -> None:
+    """
+    Upload a directory tree: plan every operation up front, then execute the plan.
+
+    See `make_plan` for how the local and remote trees are compared, and `execute_plan`
+    for how folders are created in batches and files uploaded by `file.jobs` workers.
+    """
+    # The plan module builds on the upload types defined here
+    from .plan import execute_plan, make_plan
 
-        # Recursively upload files in the directory
-        upload_file(services, new_folder_id, new_file)
+    execute_plan(services, make_plan(services, folder_id, file))
 
 
 def upload_file(services: Services, folder_id: str, file: FileDetails) -> None:
@@ -87,8 +160,12 @@ def upload_file(services: Services, folder_id: str, file: FileDetails) -> None:
 
     This function uploads a file to Google Drive, given its details and the ID of the folder where it should be uploaded.
     The type of the file is determined by the `type` attribute of the `file` parameter, and different handlers are used
-    to upload the file based on its type. If the file is a CSV, XLSX, or XLS file, the `spreadsheet_handler` is used.
-    If the file is a directory, the `dir_handler` is used. For all other file types, the `generic_handler` is used.
+    to upload the file based on its type. If the file is a CSV file, the `spreadsheet_handler` is used (or the
+    `sharded_handler` if it should be split across several tabs and spreadsheets, or the `incremental_handler`
+    if only new and changed rows should be sent), and XLSX or XLS workbooks are uploaded one worksheet per tab
+    by the `workbook_handler`.
+    If the file is a directory, the `dir_handler` is used, or the `archive_handler` if it
+    should be uploaded as an archive. For all other file types, the `generic_handler` is used.
 
     Args:
         services (Services): The services needed to interact with Google APIs.
@@ -100,8 +177,16 @@ def upload_file(services: Services, folder_id: str, file: FileDetails) -> None:
         Exception: If the file type is not recognized or if there is an error during the upload process.
     """
     match file.type:
+        case UploadType.CSV if file.shard:
+            sharded_handler(services, folder_id, file)
+        case UploadType.CSV if file.append or file.upsert:
+            incremental_handler(services, folder_id, file)
         case UploadType.CSV:
             spreadsheet_handler(services, folder_id, file)
+        case UploadType.XLSX | UploadType.XLS:
+            workbook_handler(services, folder_id, file)
+        case UploadType.DIR if file.archive:
+            archive_handler(services, folder_id, file)
         case UploadType.DIR:
             dir_handler(services, folder_id, file)
         case _:
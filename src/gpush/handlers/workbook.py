@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import datetime
+import decimal
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, ContextManager, Iterator, List, Optional, Tuple
+
+from gpush import logger
+from gpush.auth.services import Services
+from gpush.checksums import local_hashes
+from gpush.requests.gdrive import (
+    SPREADSHEET_MIME_TYPE,
+    create_google_sheet,
+    find_file,
+    list_folder,
+    set_app_properties,
+)
+from gpush.requests.gsheets import create_missing_sheets, stream_data_to_spreadsheet
+
+if TYPE_CHECKING:
+    from gpush.handlers.upload import FileDetails
+
+Worksheet = Tuple[str, Iterator[List[Any]]]
+
+SYNC_PROPERTY = "md5:workbook"
+
+
+class MissingExcelDependency(Exception):
+    pass
+
+
+def _cell_value(value: Any) -> Any:
+    # Sheets only accepts JSON values, so dates, times and decimals are sent as text
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+def _row_values(row: Any) -> List[Any]:
+    values = [_cell_value(value) for value in row]
+    # Read-only worksheets pad rows to the widest row of the sheet
+    while values and values[-1] == "":
+        values.pop()
+    return values
+
+
+def _import_error(package: str) -> MissingExcelDependency:
+    return MissingExcelDependency(
+        f"Uploading Excel workbooks requires the '{package}' package. "
+        "Install it with `pip install gpush[excel]`."
+    )
+
+
+@contextmanager
+def _open_xlsx(path: str) -> Iterator[Tuple[List[str], Iterator[Worksheet]]]:
+    try:
+        from openpyxl import load_workbook  # type: ignore
+    except ImportError as e:
+        raise _import_error("openpyxl") from e
+
+    # Read-only mode streams rows from the file instead of loading the whole workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheets = (
+            (
+                title,
+                (
+                    _row_values(row)
+                    for row in workbook[title].iter_rows(values_only=True)
+                ),
+            )
+            for title in workbook.sheetnames
+        )
+        yield workbook.sheetnames, worksheets
+    finally:
+        workbook.close()
+
+
+@contextmanager
+def _open_xls(path: str) -> Iterator[Tuple[List[str], Iterator[Worksheet]]]:
+    try:
+        import xlrd  # type: ignore
+    except ImportError as e:
+        raise _import_error("xlrd") from e
+
+    # With on_demand, worksheets are only parsed when they are accessed
+    workbook = xlrd.open_workbook(path, on_demand=True)
+
+    def rows(index: int) -> Iterator[List[Any]]:
+        sheet = workbook.sheet_by_index(index)
+        for i in range(sheet.nrows):
+            yield _row_values(
+                _xls_cell(cell, workbook.datemode) for cell in sheet.row(i)
+            )
+        workbook.unload_sheet(index)
+
+    try:
+        titles = workbook.sheet_names()
+        yield titles, ((title, rows(i)) for i, title in enumerate(titles))
+    finally:
+        workbook.release_resources()
+
+
+def _xls_cell(cell: Any, datemode: int) -> Any:
+    import xlrd  # type: ignore
+
+    if cell.ctype == xlrd.XL_CELL_DATE:
+        return xlrd.xldate.xldate_as_datetime(cell.value, datemode)
+    if cell.ctype == xlrd.XL_CELL_BOOLEAN:
+        return bool(cell.value)
+    if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+        return None
+    return cell.value
+
+
+def open_workbook(path: str) -> ContextManager[Tuple[List[str], Iterator[Worksheet]]]:
+    """
+    Open an Excel workbook for streaming.
+
+    Returns a context manager that yields the titles of the worksheets and an iterator
+    of (title, rows) pairs. The rows of each worksheet are read lazily, so only a small
+    part of the workbook is held in memory at any time.
+    """
+    if path.lower().endswith(".xls"):
+        return _open_xls(path)
+    return _open_xlsx(path)
+
+
+def workbook_handler(
+    services: Services,
+    folder_id: str,
+    file: FileDetails,
+) -> None:
+    """
+    Uploads an Excel workbook to a Google Sheet, one tab per worksheet.
+
+    All missing tabs are created with a single `batchUpdate`, after which each worksheet
+    is streamed into its tab in blocks of `file.block_size` rows. The tabs of an existing
+    Google Sheet are cleared first, so no rows of a longer version are left behind. The
+    tab titles are fetched once and shared by all the writes (see `SpreadsheetSession`). With
+    `file.sync` set, a workbook whose checksum matches the one stored on the Google Sheet is skipped.
+    """
+    checksum: Optional[str] = None
+    if file.sync:
+        checksum = local_hashes.md5(file.path)
+        existing = list_folder(services.drive, folder_id).get(file.name)
+        if existing and existing.app_properties.get(SYNC_PROPERTY) == checksum:
+            logger.debug(f"Workbook '{file.name}' is unchanged; skipping.")
+            return
+
+    file_id = find_file(services.drive, folder_id, file.name, SPREADSHEET_MIME_TYPE)
+    existed = file_id is not None
+    if not file_id:
+        file_id = create_google_sheet(services.drive, folder_id, file.name)
+
+    with open_workbook(file.path) as (titles, worksheets):
+        create_missing_sheets(services.sheets, file_id, titles)
+
+        for title, rows in worksheets:
+            stream_data_to_spreadsheet(
+                services.sheets,
+                file_id,
+                f"{file.name} [{title}]",
+                rows,
+                sheet=title,
+                block_size=file.block_size,
+                clear=existed,
+            )
+
+    if checksum is not None:
+        set_app_properties(
+            services.drive, folder_id, file_id, {SYNC_PROPERTY: checksum}
+        )
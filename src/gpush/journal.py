@@ -0,0 +1,152 @@
+"""
+A durable journal of directory pushes, kept in SQLite in the gpush state directory.
+
+The journal records the operations of every directory push and, as they complete, the
+Drive file each of them produced. When a push is interrupted, its journal is left
+behind, and `gpush --resume` skips what it already did (see `resume_plan`).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from gpush.state import state_dir
+
+JOURNAL_FILE = "journal.sqlite3"
+# Completed operations are committed in batches of this many, or this many seconds apart,
+# so an interrupted push repeats at most the operations of one batch
+COMMIT_EVERY = 500
+COMMIT_INTERVAL = 1.0
+# How long to wait for another gpush process that is writing to the journal
+BUSY_TIMEOUT = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS operations (
+    job TEXT NOT NULL,
+    path TEXT NOT NULL,
+    action TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    file_id TEXT,
+    completed REAL,
+    PRIMARY KEY (job, path)
+);
+"""
+
+
+@dataclass
+class CompletedOperation:
+    """A journaled operation that completed, and the local file as it was pushed."""
+
+    file_id: Optional[str]
+    size: Optional[int]
+    mtime_ns: Optional[int]
+
+
+class Journal:
+    """
+    The journal of one push, identified by `key` (see `upload_key`).
+
+    `start` records the planned operations, `complete` marks one of them as done, and
+    `finish` drops the journal once the push succeeded. Completions are written in one
+    transaction per `COMMIT_EVERY` operations or `COMMIT_INTERVAL` seconds, and when
+    the journal is closed, so journaling costs no more than a few disk syncs per second
+    however fast files are pushed. The database runs in WAL mode, so a crash loses at
+    most the last uncommitted batch, never the journal. All methods are thread-safe.
+    """
+
+    def __init__(self, key: str, path: Optional[str] = None) -> None:
+        self.key = key
+        self.path = path or os.path.join(state_dir(), JOURNAL_FILE)
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+        self._db = sqlite3.connect(
+            self.path, timeout=BUSY_TIMEOUT, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def interrupted(self) -> bool:
+        """Whether an earlier push with the same key did not finish."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM jobs WHERE key = ?", (self.key,)
+            ).fetchone()
+        return row is not None
+
+    def completed(self) -> Dict[str, CompletedOperation]:
+        """The operations that completed, by local path."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, file_id, size, mtime_ns FROM operations "
+                "WHERE job = ? AND completed IS NOT NULL",
+                (self.key,),
+            ).fetchall()
+        return {path: CompletedOperation(*rest) for path, *rest in rows}
+
+    def start(
+        self, operations: Iterable[Tuple[str, str, Optional[int]]], resume: bool
+    ) -> None:
+        """
+        Record the (path, action, size) of the planned operations. Unless `resume` is
+        set, the operations of an earlier, interrupted push are forgotten first.
+        """
+        with self._lock, self._db:
+            if not resume:
+                self._db.execute("DELETE FROM operations WHERE job = ?", (self.key,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (key, started) VALUES (?, ?)",
+                (self.key, time.time()),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO operations (job, path, action, size) "
+                "VALUES (?, ?, ?, ?)",
+                ((self.key, *operation) for operation in operations),
+            )
+
+    def complete(
+        self,
+        path: str,
+        file_id: Optional[str],
+        stat: Optional[os.stat_result] = None,
+    ) -> None:
+        """Mark the operation of `path` as done, with the `os.stat` of what was pushed."""
+        size = stat.st_size if stat is not None else None
+        mtime_ns = stat.st_mtime_ns if stat is not None else None
+        with self._lock:
+            self._db.execute(
+                "UPDATE operations SET file_id = ?, size = ?, mtime_ns = ?, "
+                "completed = ? WHERE job = ? AND path = ?",
+                (file_id, size, mtime_ns, time.time(), self.key, path),
+            )
+            self._uncommitted += 1
+            if (
+                self._uncommitted >= COMMIT_EVERY
+                or time.monotonic() - self._last_commit >= COMMIT_INTERVAL
+            ):
+                self._commit()
+
+    def _commit(self) -> None:
+        self._db.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def finish(self) -> None:
+        """Drop the journal of a push that completed."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM operations WHERE job = ?", (self.key,))
+            self._db.execute("DELETE FROM jobs WHERE key = ?", (self.key,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._commit()
+            self._db.close()
@@ -0,0 +1,224 @@
+"""
+Bulk pushes from a manifest: `gpush --manifest jobs.json`.
+
+A manifest lists many uploads, each with its own source, destination folder, name, sheet
+and mode. Running them in one process means authentication, discovery documents,
+connections and the folder and spreadsheet caches are paid for once, instead of once
+per `gpush` call.
+"""
+
+import csv
+import json
+import os
+import time
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from gpush import logger
+from gpush.auth.services import Services, ThreadLocalServices
+from gpush.handlers.upload import FileDetails, upload_file
+
+# The columns of a CSV manifest, and the keys of the entries of a JSON manifest
+FIELDS = ("source", "folder", "name", "sheet", "mode", "key")
+# How an entry updates its target: as the command line options say, or as with
+# --sync, --append or --upsert KEY
+MODES = ("default", "sync", "append", "upsert")
+
+
+class ManifestError(Exception):
+    pass
+
+
+@dataclass
+class ManifestEntry:
+    """One upload of a manifest, and where in the manifest it was defined."""
+
+    source: str
+    folder_id: str
+    file: FileDetails
+    location: str
+
+    @property
+    def target(self) -> Tuple[str, str]:
+        """The folder and name the entry uploads to."""
+        return self.folder_id, self.file.name
+
+
+@dataclass
+class EntryResult:
+    entry: ManifestEntry
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _read_entries(path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Read the raw entries of a manifest, with their location for error messages."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            unknown = set(reader.fieldnames or ()) - set(FIELDS)
+            if unknown:
+                raise ManifestError(
+                    f"{path}: unknown column(s) {', '.join(sorted(unknown))}."
+                )
+            return [
+                (f"{path}:{reader.line_num}", row)
+                for row in reader
+                if any(value.strip() for value in row.values() if value)
+            ]
+
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except ValueError as e:
+            raise ManifestError(f"{path} is not valid JSON: {e}") from None
+    if isinstance(data, dict):
+        data = data.get("entries")
+    if not isinstance(data, list) or not all(isinstance(e, dict) for e in data):
+        raise ManifestError(
+            f"{path} must hold a list of entries, or an object with an 'entries' list."
+        )
+    return [(f"{path}[{index}]", entry) for index, entry in enumerate(data)]
+
+
+def _entry(
+    location: str,
+    raw: Dict[str, Any],
+    base: Dict[str, Any],
+    root: str,
+    folder_id: Optional[str],
+) -> ManifestEntry:
+    fields = {key: value for key, value in raw.items() if value not in (None, "")}
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+        raise ManifestError(f"{location}: unknown key(s) {', '.join(sorted(unknown))}.")
+    if "source" not in fields:
+        raise ManifestError(f"{location}: the source is missing.")
+
+    # Relative sources are relative to the manifest, wherever gpush is run from
+    source = os.path.join(root, os.path.expanduser(str(fields["source"])))
+    folder = fields.get("folder", folder_id)
+    if folder is None:
+        raise ManifestError(f"{location}: no folder given, and FOLDER_ID is unset.")
+
+    options = dict(base, path=source)
+    if "name" in fields:
+        options["name"] = str(fields["name"])
+    if "sheet" in fields:
+        options["sheet"] = str(fields["sheet"])
+    mode = fields.get("mode", "default")
+    if mode not in MODES:
+        raise ManifestError(
+            f"{location}: unknown mode '{mode}'; expected one of {', '.join(MODES)}."
+        )
+    if mode == "upsert" and "key" not in fields:
+        raise ManifestError(f"{location}: mode 'upsert' needs a key column.")
+    if "key" in fields and mode != "upsert":
+        raise ManifestError(f"{location}: a key only applies to mode 'upsert'.")
+    if mode != "default":
+        options["sync"] = mode == "sync"
+        options["append"] = mode == "append"
+        options["upsert"] = str(fields["key"]) if mode == "upsert" else None
+
+    try:
+        file = FileDetails.from_args(Namespace(**options))
+    except ValueError as e:
+        raise ManifestError(f"{location}: {e}") from None
+    return ManifestEntry(source, str(folder), file, location)
+
+
+def load_manifest(
+    path: str, args: Namespace, folder_id: Optional[str] = None
+) -> List[ManifestEntry]:
+    """
+    Load and validate the entries of a manifest.
+
+    A manifest is a CSV file with a header row, or a JSON list of objects (or an object
+    with an ``entries`` list), with the `FIELDS`:
+
+    * ``source``: The file or directory to upload, relative to the manifest. Required.
+    * ``folder``: The ID of the Drive folder to upload into. Defaults to `folder_id`.
+    * ``name``, ``sheet``: Like --name and --sheet.
+    * ``mode``: One of the `MODES`. ``upsert`` needs the key column in ``key``.
+
+    All other options, e.g. --chunk-size or --dedup, are taken from the command line.
+    Every entry is validated before anything is uploaded; sources that are missing
+    only fail their own entry when it runs.
+
+    Args:
+        path (str): The path of the manifest.
+        args (Namespace): The parsed command line options the entries start from.
+        folder_id (str, optional): The folder of entries that name none.
+
+    Returns:
+        List[ManifestEntry]: The entries, in manifest order.
+
+    Raises:
+        ManifestError: If the manifest or one of its entries is invalid.
+    """
+    base = {k: v for k, v in vars(args).items() if k != "manifest"}
+    root = os.path.dirname(os.path.abspath(path))
+    entries = [
+        _entry(location, raw, base, root, folder_id)
+        for location, raw in _read_entries(path)
+    ]
+    if not entries:
+        raise ManifestError(f"{path} has no entries.")
+    return entries
+
+
+def run_manifest(
+    services: Services, entries: List[ManifestEntry], jobs: int = 1
+) -> List[EntryResult]:
+    """
+    Push the entries of a manifest, `jobs` at a time, and report how each one went.
+
+    All entries share `services` (one per worker thread, see `ThreadLocalServices`)
+    and the folder and spreadsheet caches, so a folder that many entries upload into is
+    listed once. Entries with the same target, e.g. several sheets of one spreadsheet,
+    run one after another in manifest order, so they never race to create it. A failed
+    entry does not stop the others. Directories are pushed one file at a time, unless
+    all entries share one target and get all `jobs` workers.
+
+    Args:
+        services (Services): The Google API services.
+        entries (List[ManifestEntry]): The entries, e.g. from `load_manifest`.
+        jobs (int, optional): The number of entries pushed concurrently.
+
+    Returns:
+        List[EntryResult]: The result of every entry, in manifest order.
+    """
+    groups: Dict[Tuple[str, str], List[ManifestEntry]] = {}
+    for entry in entries:
+        groups.setdefault(entry.target, []).append(entry)
+
+    thread_services = ThreadLocalServices(services)
+    results: Dict[int, EntryResult] = {}
+    entry_jobs = jobs if len(groups) == 1 else 1
+
+    def push(group: List[ManifestEntry]) -> None:
+        for entry in group:
+            file = replace(entry.file, jobs=entry_jobs)
+            start = time.monotonic()
+            try:
+                upload_file(thread_services.get(), entry.folder_id, file)
+            except Exception as e:
+                logger.error(f"{entry.location}: could not push {entry.source}: {e}")
+                result = EntryResult(entry, error=str(e) or type(e).__name__)
+            else:
+                logger.info(f"Pushed {entry.source} as {entry.file.name}.")
+                result = EntryResult(entry)
+            result.seconds = time.monotonic() - start
+            results[id(entry)] = result
+
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="gpush") as pool:
+        for future in as_completed([pool.submit(push, g) for g in groups.values()]):
+            future.result()
+
+    return [results[id(entry)] for entry in entries]
@@ -0,0 +1,460 @@
+"""
+Mirroring Drive to disk: `gpush pull <folder-or-file-id> <dest>`.
+
+A `Pull` lists the remote tree one depth at a time in batch requests (see
+`list_folders`), then downloads every file in chunks of
+`chunk_size` bytes through one pool of workers. Each chunk is a ranged request whose
+bytes are written straight to their offset in a preallocated part file, so large files
+are downloaded in parallel and small files alongside each other, and nothing is held in
+memory beyond the chunks in flight. Google Sheets are exported to CSV one block of rows
+at a time.
+"""
+
+import csv
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+
+from gpush import logger
+from gpush.auth.services import Services, ThreadLocalServices
+from gpush.checksums import local_hashes, md5_file
+from gpush.requests.gdrive import (
+    SPREADSHEET_MIME_TYPE,
+    RemoteFile,
+    download_range,
+    get_file,
+    list_folders,
+)
+from gpush.requests.gsheets import DEFAULT_BLOCK_SIZE, SpreadsheetSession, read_rows
+
+DEFAULT_JOBS = 8
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# Downloads are written to "<path>.gpush-part" and renamed once they are complete
+PART_SUFFIX = ".gpush-part"
+# Exported sheets whose rows differ in length are padded into "<part>.pad"
+PAD_SUFFIX = ".pad"
+GOOGLE_APPS_MIME_PREFIX = "application/vnd.google-apps."
+# The ID in a Drive or Sheets URL, e.g. ".../drive/folders/<id>" or ".../d/<id>/edit"
+URL_ID = re.compile(r"(?:/folders/|/d/|[?&]id=)([\w-]+)")
+
+
+class PullError(Exception):
+    pass
+
+
+def parse_file_id(value: str) -> str:
+    """Return the file ID in a Drive or Sheets URL, or `value` if it is not a URL."""
+    match = URL_ID.search(value)
+    return match.group(1) if match else value
+
+
+def safe_name(name: str) -> str:
+    """Make a Drive name, which may contain slashes or be "..", a safe file name."""
+    name = name.replace("/", "_")
+    if os.altsep:
+        name = name.replace(os.altsep, "_")
+    if name in ("", ".", ".."):
+        name = name.replace(".", "_") or "_"
+    return name
+
+
+def local_name(remote_file: RemoteFile) -> str:
+    """
+    Return the local file name of a Drive file. Google Sheets get a ".csv" extension,
+    as they are exported to CSV.
+    """
+    name = safe_name(remote_file.name)
+    if remote_file.mime_type == SPREADSHEET_MIME_TYPE and not name.endswith(".csv"):
+        name += ".csv"
+    return name
+
+
+def unique_name(name: str, remote_file: RemoteFile) -> str:
+    """
+    Return the local name of a Drive file whose `name` is taken by another entry of its
+    folder: the file ID is added before the extension, e.g. "report (1AbC).csv".
+    """
+    stem, extension = os.path.splitext(name)
+    if remote_file.is_folder or not stem:
+        stem, extension = name, ""
+    return f"{stem} ({remote_file.id}){extension}"
+
+
+def local_names(entries: List[RemoteFile]) -> Dict[str, RemoteFile]:
+    """
+    Return the entries of a Drive folder by their local name.
+
+    Drive allows several entries with the same name, and a sheet "x" and a file "x.csv"
+    both map to "x.csv". Of the entries that map to one name, regular files come first,
+    then folders, then sheets, each ordered by name and ID, and the first one keeps the
+    name; the others are made unique with `unique_name`.
+    """
+
+    def order(remote_file: RemoteFile) -> Tuple[str, int, str, str]:
+        if remote_file.mime_type == SPREADSHEET_MIME_TYPE:
+            kind = 2
+        else:
+            kind = 1 if remote_file.is_folder else 0
+        return (local_name(remote_file), kind, remote_file.name, remote_file.id)
+
+    names: Dict[str, RemoteFile] = {}
+    for remote_file in sorted(entries, key=order):
+        name = local_name(remote_file)
+        if name in names:
+            unique = unique_name(name, remote_file)
+            logger.warning(
+                f"{remote_file.name} ({remote_file.id}) has the same local name as "
+                f"{names[name].name} ({names[name].id}); saving it as {unique}."
+            )
+            name = unique
+        names[name] = remote_file
+    return names
+
+
+def _pad_rows(source: str, dest: str, width: int) -> None:
+    """Copy the CSV file `source` to `dest`, padding every row to `width` cells."""
+    with open(source, newline="", encoding="utf-8") as f, open(
+        dest, "w", newline="", encoding="utf-8"
+    ) as out:
+        writer = csv.writer(out)
+        for row in csv.reader(f):
+            writer.writerow(row + [""] * (width - len(row)))
+
+
+@dataclass
+class PullStats:
+    """What a pull downloaded, exported and skipped."""
+
+    downloaded: int = 0
+    bytes: int = 0
+    exported: int = 0
+    rows: int = 0
+    skipped: int = 0
+    unsupported: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.downloaded} file(s) / {self.bytes} bytes downloaded, "
+            f"{self.exported} sheet(s) / {self.rows} rows exported, "
+            f"{self.skipped} unchanged and {self.unsupported} unsupported file(s) "
+            f"skipped"
+        )
+
+
+@dataclass
+class Download:
+    """A Drive file and the local path it is written to."""
+
+    remote: RemoteFile
+    path: str
+
+
+def _preallocate(fd: int, size: int) -> None:
+    if size and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            # Not supported by the file system
+            pass
+    os.ftruncate(fd, size)
+
+
+class _PartFile:
+    """
+    The part file of a download, preallocated to the size of the file and filled by
+    its chunks in any order. The last chunk to arrive verifies the checksum and moves
+    the part file into place.
+    """
+
+    def __init__(self, download: Download, chunks: int) -> None:
+        self.download = download
+        self.part = download.path + PART_SUFFIX
+        self.finished = False
+        self._remaining = chunks
+        self._lock = threading.Lock()
+        self._fd = os.open(self.part, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            _preallocate(self._fd, download.remote.size or 0)
+        except BaseException:
+            self.abort()
+            raise
+
+    def write(self, offset: int, data: bytes) -> bool:
+        """Write a chunk at its offset; return whether it was the last one."""
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self._fd, view, offset)
+            view, offset = view[written:], offset + written
+        with self._lock:
+            self._remaining -= 1
+            return self._remaining == 0
+
+    def finish(self) -> None:
+        os.close(self._fd)
+        self._fd = -1
+        remote = self.download.remote
+        checksum = md5_file(self.part)
+        if remote.md5_checksum is not None and checksum != remote.md5_checksum:
+            self.abort()
+            raise PullError(
+                f"The checksum of {remote.name} does not match; it may have changed "
+                f"during the download."
+            )
+        os.replace(self.part, self.download.path)
+        local_hashes.remember(self.download.path, checksum)
+        self.finished = True
+
+    def abort(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        try:
+            os.unlink(self.part)
+        except FileNotFoundError:
+            pass
+
+
+class Pull:
+    """
+    Mirrors a Drive folder, or downloads a single file, to a local directory.
+
+    Files whose local copy has the size and MD5 checksum of the remote file are
+    skipped, using the cached local checksums (see `local_hashes`), so pulling a tree
+    again only downloads what changed. Files are downloaded in ranged chunks by `jobs`
+    workers (each with its own `Services`, see `ThreadLocalServices`) into part files
+    that are verified against Drive's `md5Checksum` before they replace the local
+    files, so an interrupted pull never leaves a truncated file behind.
+
+    Google Sheets are exported to CSV with their formatted values, `block_size` rows
+    per request: a spreadsheet with one sheet to `<name>.csv`, and one with several
+    sheets to one CSV per sheet in a `<name>` directory. They have no checksum, so they
+    are exported on every pull. Other Google Docs types cannot be downloaded and are
+    skipped with a warning. Entries of a folder that would get the same local name are
+    told apart by their file ID (see `local_names`).
+
+    If a download fails, downloads that have not started yet are cancelled and the
+    part files of unfinished downloads are removed.
+    """
+
+    def __init__(
+        self,
+        services: Services,
+        jobs: int = DEFAULT_JOBS,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+    ) -> None:
+        self.services = services
+        self.jobs = jobs
+        self.chunk_size = chunk_size
+        self.block_size = block_size
+        self.stats = PullStats()
+        self._thread_services = ThreadLocalServices(services)
+        self._lock = threading.Lock()
+
+    def run(self, file_id: str, dest: str) -> PullStats:
+        """Pull the Drive folder or file `file_id` into `dest`, and return the stats."""
+        root = get_file(self.services.drive, file_id)
+        if root is None:
+            raise PullError(f"No file or folder with ID {file_id} was found.")
+
+        if root.is_folder:
+            downloads = self._list_tree(root, dest)
+        else:
+            if os.path.isdir(dest):
+                dest = os.path.join(dest, local_name(root))
+            else:
+                os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+            downloads = [Download(root, dest)]
+        self._execute(downloads)
+        return self.stats
+
+    def _list_tree(self, root: RemoteFile, dest: str) -> List[Download]:
+        """List the files below a folder, creating their local directories."""
+        downloads = []
+        level = [(root.id, dest)]
+        while level:
+            # The folders of one depth are listed in batch requests
+            listings = list_folders(
+                self.services.drive, [folder_id for folder_id, _ in level]
+            )
+            next_level = []
+            for folder_id, directory in level:
+                os.makedirs(directory, exist_ok=True)
+                for name, remote in sorted(local_names(listings[folder_id]).items()):
+                    path = os.path.join(directory, name)
+                    if remote.is_folder:
+                        next_level.append((remote.id, path))
+                    else:
+                        downloads.append(Download(remote, path))
+            level = next_level
+        return downloads
+
+    def _is_current(self, download: Download) -> bool:
+        remote = download.remote
+        try:
+            return (
+                remote.md5_checksum is not None
+                and os.path.getsize(download.path) == remote.size
+                and local_hashes.md5(download.path) == remote.md5_checksum
+            )
+        except OSError:
+            return False
+
+    def _tasks(
+        self, downloads: List[Download], parts: List[_PartFile]
+    ) -> Iterator[Callable[[], None]]:
+        """Yield the chunk downloads and sheet exports of `downloads`, in order."""
+        for download in downloads:
+            remote = download.remote
+            if remote.mime_type == SPREADSHEET_MIME_TYPE:
+                yield partial(self._export, download)
+                continue
+            if remote.mime_type.startswith(GOOGLE_APPS_MIME_PREFIX):
+                logger.warning(
+                    f"Skipping {remote.name}: files of type {remote.mime_type} cannot "
+                    f"be downloaded."
+                )
+                self.stats.unsupported += 1
+                continue
+            if self._is_current(download):
+                logger.debug(f"{download.path} is unchanged; skipping.")
+                self.stats.skipped += 1
+                continue
+
+            size = remote.size or 0
+            offsets = range(0, size, self.chunk_size)
+            part = _PartFile(download, len(offsets))
+            parts.append(part)
+            if not offsets:
+                self._finish(part)
+                continue
+            for offset in offsets:
+                end = min(offset + self.chunk_size, size) - 1
+                yield partial(self._download_chunk, part, offset, end)
+
+    def _execute(self, downloads: List[Download]) -> None:
+        parts: List[_PartFile] = []
+        pending: Set[Future] = set()
+        with ThreadPoolExecutor(self.jobs, thread_name_prefix="gpush-pull") as pool:
+            try:
+                for task in self._tasks(downloads, parts):
+                    # Part files are opened as their chunks are queued, so only a few
+                    # chunks are queued ahead of the workers
+                    if len(pending) >= 2 * self.jobs:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    pending.add(pool.submit(task))
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                wait(pending)
+                for part in parts:
+                    if not part.finished:
+                        part.abort()
+                raise
+
+    def _download_chunk(self, part: _PartFile, start: int, end: int) -> None:
+        remote = part.download.remote
+        data = download_range(self._thread_services.get().drive, remote.id, start, end)
+        if len(data) != end - start + 1:
+            raise PullError(
+                f"Got {len(data)} bytes instead of {end - start + 1} for {remote.name}; "
+                f"it may have changed during the download."
+            )
+        if part.write(start, data):
+            self._finish(part)
+
+    def _finish(self, part: _PartFile) -> None:
+        part.finish()
+        logger.debug(f"Downloaded {part.download.path}.")
+        with self._lock:
+            self.stats.downloaded += 1
+            self.stats.bytes += part.download.remote.size or 0
+
+    def _export(self, download: Download) -> None:
+        remote = download.remote
+        session = SpreadsheetSession(self._thread_services.get().sheets, remote.id)
+        sheets = list(session.sheets.values())
+        if len(sheets) == 1:
+            targets = [(sheets[0], download.path)]
+        else:
+            directory = os.path.splitext(download.path)[0]
+            os.makedirs(directory, exist_ok=True)
+            targets = [
+                (sheet, os.path.join(directory, f"{safe_name(sheet.title)}.csv"))
+                for sheet in sheets
+            ]
+
+        for sheet, path in targets:
+            part = path + PART_SUFFIX
+            padded = part + PAD_SUFFIX
+            rows = 0
+            lengths: Set[int] = set()
+            try:
+                with open(part, "w", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    for row in read_rows(
+                        session.sheets_service, remote.id, sheet, self.block_size
+                    ):
+                        writer.writerow(row)
+                        rows += 1
+                        lengths.add(len(row))
+                # The API leaves out trailing empty cells, so rows are as long as their
+                # last value; pad them to the widest row to make the CSV rectangular
+                if len(lengths) > 1:
+                    _pad_rows(part, padded, max(lengths))
+                    os.replace(padded, part)
+                os.replace(part, path)
+            except BaseException:
+                for leftover in (part, padded):
+                    try:
+                        os.unlink(leftover)
+                    except FileNotFoundError:
+                        pass
+                raise
+            logger.debug(f"Exported {rows} rows of {remote.name} to {path}.")
+            with self._lock:
+                self.stats.exported += 1
+                self.stats.rows += rows
+
+
+def pull(
+    services: Services,
+    file_id: str,
+    dest: str,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> PullStats:
+    """
+    Mirror a Drive folder, or download a single file, to `dest` (see `Pull`).
+
+    Args:
+        services (Services): The Google API services.
+        file_id (str): The ID or URL of the Drive folder or file.
+        dest (str): The local directory to mirror a folder into. A single file is
+                    written into `dest` if it is a directory, and to `dest` otherwise.
+        jobs (int, optional): The number of concurrent requests.
+        chunk_size (int, optional): The size of each ranged download request, in bytes.
+        block_size (int, optional): The number of rows per request of sheet exports.
+
+    Returns:
+        PullStats: What was downloaded, exported and skipped.
+
+    Raises:
+        PullError: If the file does not exist, or a download is inconsistent.
+        GoogleApiAccessError: If an API request fails.
+    """
+    return Pull(services, jobs, chunk_size, block_size).run(
+        parse_file_id(file_id), dest
+    )
@@ -0,0 +1,164 @@
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from googleapiclient.discovery import Resource  # type: ignore
+from googleapiclient.http import HttpRequest  # type: ignore
+
+from .instrumentation import instrumentation, operation_name, request_size
+from .retry import (
+    RetryPolicy,
+    backoff,
+    default_policy,
+    execute,
+    is_idempotent,
+    is_retryable,
+    rate_limits,
+    retry_stats,
+)
+from .utilities import GoogleApiAccessError
+
+logger = logging.getLogger(__name__)
+
+# The Drive batch endpoint accepts at most 100 calls per batch request
+MAX_BATCH_SIZE = 100
+
+
+class DriveBatch:
+    """
+    Collects independent Drive API requests and sends them as HTTP batch requests.
+
+    Every request added to the batch gets a `Future` that resolves to that request's
+    response, or raises a `GoogleApiAccessError` if that particular call failed. Requests
+    are only sent when `execute` is called (or the `with` block exits), in batches of at
+    most `max_size` calls. The requests in a batch must not depend on each other, as the
+    server may process them in any order. Calls that fail with a retryable error (see
+    `is_retryable`) are collected and sent again in a follow-up batch after a backoff.
+
+    Example:
+        with DriveBatch(drive_service) as batch:
+            futures = [batch.add(drive_service.files().get(fileId=i)) for i in ids]
+        files = [future.result() for future in futures]
+    """
+
+    def __init__(
+        self,
+        drive_service: Resource,
+        max_size: int = MAX_BATCH_SIZE,
+        policy: RetryPolicy = default_policy,
+    ) -> None:
+        self.drive_service = drive_service
+        self.max_size = max_size
+        self.policy = policy
+        self._pending: List[Tuple[HttpRequest, Future]] = []
+
+    def __enter__(self) -> "DriveBatch":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc_type is None:
+            self.execute()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, request: HttpRequest) -> Future:
+        future: Future = Future()
+        self._pending.append((request, future))
+        return future
+
+    def execute(self) -> None:
+        pending, self._pending = self._pending, []
+
+        for start in range(0, len(pending), self.max_size):
+            self._execute_chunk(pending[start : start + self.max_size])
+
+    def _execute_chunk(self, chunk: List[Tuple[HttpRequest, Future]]) -> None:
+        bucket = rate_limits["drive"]
+        attempt = 0
+
+        while chunk:
+            if len(chunk) == 1:
+                # A batch of one only adds overhead
+                request, future = chunk[0]
+                try:
+                    future.set_result(execute(request, policy=self.policy))
+                except Exception as e:
+                    future.set_exception(_item_error(request, e))
+                return
+
+            responses: Dict[str, Any] = {}
+            errors: Dict[str, Exception] = {}
+            batch = self.drive_service.new_batch_http_request(
+                callback=_collect(responses, errors)
+            )
+            for i, (request, _) in enumerate(chunk):
+                batch.add(request, request_id=str(i))
+
+            logger.debug(f"Sending a batch of {len(chunk)} Drive requests.")
+            # Every call in a batch counts against the quota
+            retry_stats.record(requests=len(chunk), throttle=bucket.acquire(len(chunk)))
+            measurement = instrumentation.measure(_batch_operation(chunk))
+            if measurement.active:
+                measurement.bytes_sent = sum(
+                    request_size(request) for request, _ in chunk
+                )
+            try:
+                batch.execute()
+                measurement.status = 200
+            except Exception as e:
+                measurement.error(e)
+                # The batch as a whole failed, so every call without a response failed
+                for i in range(len(chunk)):
+                    if str(i) not in responses:
+                        errors.setdefault(str(i), e)
+            measurement.finish(retries=attempt)
+
+            retries = []
+            last_error: Optional[Exception] = None
+            for i, (request, future) in enumerate(chunk):
+                if str(i) in responses:
+                    future.set_result(responses[str(i)])
+                    continue
+
+                error = errors[str(i)]
+                if attempt < self.policy.max_retries and is_retryable(
+                    error, is_idempotent(request)
+                ):
+                    retries.append((request, future))
+                    last_error = error
+                else:
+                    future.set_exception(_item_error(request, error))
+
+            if last_error is not None:
+                backoff(last_error, attempt, bucket, self.policy, retries=len(retries))
+                attempt += 1
+            chunk = retries
+
+
+def _collect(
+    responses: Dict[str, Any], errors: Dict[str, Exception]
+) -> Callable[[str, Any, Any], None]:
+    """Return a batch callback that records each call's response or error by ID."""
+
+    def callback(request_id: str, response: Any, exception: Any) -> None:
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            responses[request_id] = response
+
+    return callback
+
+
+def _batch_operation(chunk: List[Tuple[HttpRequest, Future]]) -> str:
+    # E.g. "batch(drive.files.create)", so batched calls are told apart by method
+    methods = dict.fromkeys(operation_name(request) for request, _ in chunk)
+    return f"batch({','.join(methods)})"
+
+
+def _item_error(request: HttpRequest, exception: Exception) -> GoogleApiAccessError:
+    error = GoogleApiAccessError(
+        f"An error occurred in {request.methodId or 'a batched request'}: {exception}"
+    )
+    error.__cause__ = exception
+    return error
@@ -1,30 +1,423 @@
+from __future__ import annotations
+
 import logging
-from typing import Optional
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from googleapiclient.discovery import Resource  # type: ignore
+from googleapiclient.errors import HttpError  # type: ignore
+from googleapiclient.http import HttpRequest, MediaFileUpload  # type: ignore
 
+from .batch import DriveBatch
+from .resumable import (
+    DEFAULT_CHUNK_SIZE,
+    execute_resumable,
+    file_fingerprint,
+    upload_key,
+)
+from .retry import execute
 from .utilities import error_handler
 
 logger = logging.getLogger(__name__)
 
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+SPREADSHEET_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+
+FILE_FIELDS = "id, name, mimeType, md5Checksum, size, appProperties"
+LIST_FIELDS = f"nextPageToken, files({FILE_FIELDS})"
+LIST_PAGE_SIZE = 1000
+# How long long-running processes (`gpush watch`, `gpush serve`) trust a folder listing
+# before listing the folder again, see `FolderIndex.expire`
+LISTING_MAX_AGE = 300.0
+
+
+@dataclass
+class RemoteFile:
+    """A file or folder that lives in a Google Drive folder."""
+
+    id: str
+    name: str
+    mime_type: str
+    md5_checksum: Optional[str] = None
+    size: Optional[int] = None
+    app_properties: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def is_folder(self) -> bool:
+        return self.mime_type == FOLDER_MIME_TYPE
+
+    @staticmethod
+    def from_api(item: Dict[str, Any]) -> RemoteFile:
+        size = item.get("size")
+        return RemoteFile(
+            id=item["id"],
+            name=item["name"],
+            mime_type=item.get("mimeType", ""),
+            md5_checksum=item.get("md5Checksum"),
+            size=int(size) if size is not None else None,
+            app_properties=item.get("appProperties", {}),
+        )
+
+
+def _keep_existing(existing: Optional[RemoteFile], new: RemoteFile) -> bool:
+    # Drive allows duplicate names, but the index only keeps one entry per name. The first
+    # entry wins, except that folders take precedence over files so that looking up a
+    # folder never returns a file with the same name.
+    return existing is not None and (existing.is_folder or not new.is_folder)
+
+
+class FolderIndex:
+    """
+    A cache of Drive folder listings.
+
+    Each folder is listed at most once (following every `nextPageToken`) and kept as a
+    name -> `RemoteFile` map. Files created through gpush are added to the map locally,
+    so a push performs one listing per folder rather than one per file. The index is
+    safe to share between threads; concurrent loads of the same folder wait for a
+    single listing. Listings are kept until they are invalidated, or until `expire`
+    drops them for being old.
+    """
+
+    def __init__(self) -> None:
+        self._folders: Dict[str, Dict[str, RemoteFile]] = {}
+        self._listed: Dict[str, float] = {}
+        # A listed file for every MD5 checksum, to find copies of content (see --dedup)
+        self._checksums: Dict[str, RemoteFile] = {}
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def load(self, drive_service: Resource, folder_id: str) -> Dict[str, RemoteFile]:
+        """Return the name -> `RemoteFile` map of a folder, listing it if needed."""
+        with self._lock:
+            if folder_id in self._folders:
+                return self._folders[folder_id]
+            folder_lock = self._loading.setdefault(folder_id, threading.Lock())
+
+        with folder_lock:
+            with self._lock:
+                if folder_id in self._folders:
+                    return self._folders[folder_id]
+
+            entries = _list_folder_pages(drive_service, folder_id)
+
+            with self._lock:
+                self._folders[folder_id] = entries
+                self._listed[folder_id] = time.monotonic()
+                self._loading.pop(folder_id, None)
+                self._add_checksums(entries.values())
+            return entries
+
+    def get(self, folder_id: str) -> Optional[Dict[str, RemoteFile]]:
+        """Return the cached listing of a folder, or None if it was never listed."""
+        with self._lock:
+            return self._folders.get(folder_id)
+
+    def is_loaded(self, folder_id: str) -> bool:
+        with self._lock:
+            return folder_id in self._folders
+
+    def with_checksum(self, md5: str) -> Optional[RemoteFile]:
+        """Return a file with this MD5 checksum from the cached listings, if any."""
+        with self._lock:
+            return self._checksums.get(md5)
+
+    def store(self, folder_id: str, entries: Dict[str, RemoteFile]) -> None:
+        """Record the complete listing of a folder fetched elsewhere, e.g. in a batch."""
+        with self._lock:
+            if folder_id not in self._folders:
+                self._folders[folder_id] = entries
+                self._listed[folder_id] = time.monotonic()
+                self._add_checksums(entries.values())
+
+    def add(self, folder_id: str, remote_file: RemoteFile) -> None:
+        """Record a file created in a folder. Folders that were never listed are ignored."""
+        with self._lock:
+            entries = self._folders.get(folder_id)
+            if entries is None:
+                return
+            if not _keep_existing(entries.get(remote_file.name), remote_file):
+                entries[remote_file.name] = remote_file
+                self._add_checksums([remote_file])
+
+    def put(self, folder_id: str, remote_file: RemoteFile) -> None:
+        """Record a file that was updated, replacing any entry with the same name."""
+        with self._lock:
+            entries = self._folders.get(folder_id)
+            if entries is not None:
+                self._drop_checksums(entries.get(remote_file.name))
+                entries[remote_file.name] = remote_file
+                self._add_checksums([remote_file])
+
+    def remove(self, folder_id: str, name: str) -> None:
+        """Forget a file that was deleted or moved to the trash."""
+        with self._lock:
+            entries = self._folders.get(folder_id)
+            if entries is not None:
+                self._drop_checksums(entries.pop(name, None))
+
+    def add_empty(self, folder_id: str) -> None:
+        """Mark a folder that was just created, and is therefore empty, as listed."""
+        with self._lock:
+            if folder_id not in self._folders:
+                self._folders[folder_id] = {}
+                self._listed[folder_id] = time.monotonic()
+
+    def invalidate(self, folder_id: Optional[str] = None) -> List[str]:
+        """
+        Forget the listing of a folder, or of every folder if no ID is given.
+
+        Returns the IDs of the files that were listed, so that callers can drop what
+        they cached about them (see `gpush.handlers.caches`).
+        """
+        with self._lock:
+            if folder_id is not None:
+                return self._forget(folder_id)
+            ids = [
+                entry.id
+                for entries in self._folders.values()
+                for entry in entries.values()
+            ]
+            self._folders.clear()
+            self._listed.clear()
+            self._checksums.clear()
+            return ids
+
+    def expire(self, max_age: float = LISTING_MAX_AGE) -> List[str]:
+        """
+        Forget the listings that were fetched more than `max_age` seconds ago, and return
+        the IDs of the files in them. Long-running processes call this before each push,
+        so changes made on Drive by others are seen within `max_age`.
+        """
+        deadline = time.monotonic() - max_age
+        ids: List[str] = []
+        with self._lock:
+            for folder_id, listed in list(self._listed.items()):
+                if listed < deadline:
+                    ids.extend(self._forget(folder_id))
+        return ids
+
+    def _forget(self, folder_id: str) -> List[str]:
+        self._listed.pop(folder_id, None)
+        entries = self._folders.pop(folder_id, None) or {}
+        for entry in entries.values():
+            self._drop_checksums(entry)
+        return [entry.id for entry in entries.values()]
+
+    def _add_checksums(self, entries: Iterable[RemoteFile]) -> None:
+        for entry in entries:
+            if entry.md5_checksum is not None:
+                self._checksums.setdefault(entry.md5_checksum, entry)
+
+    def _drop_checksums(self, entry: Optional[RemoteFile]) -> None:
+        if entry is not None and entry.md5_checksum is not None:
+            if self._checksums.get(entry.md5_checksum) is entry:
+                del self._checksums[entry.md5_checksum]
+
+
+folder_index = FolderIndex()
+
+
+def folder_query(folder_id: str) -> str:
+    """Return the Drive search query for the entries of a folder."""
+    return f"'{folder_id}' in parents and trashed = false"
+
+
+def _list_request(
+    drive_service: Resource,
+    folder_id: str,
+    page_token: Optional[str] = None,
+) -> HttpRequest:
+    return drive_service.files().list(
+        q=folder_query(folder_id),
+        spaces="drive",
+        fields=LIST_FIELDS,
+        pageSize=LIST_PAGE_SIZE,
+        pageToken=page_token,
+    )
+
+
+def _list_folder_items(
+    drive_service: Resource,
+    folder_id: str,
+    first_page: Optional[Dict[str, Any]] = None,
+) -> List[RemoteFile]:
+    items: List[RemoteFile] = []
+    response = first_page
+    page_token = None
+    pages = 0
+
+    while True:
+        if response is None:
+            response = execute(_list_request(drive_service, folder_id, page_token))
+        pages += 1
+        items.extend(RemoteFile.from_api(item) for item in response.get("files", []))
+
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            break
+        response = None
+
+    logger.debug(
+        f"Listed {len(items)} entries of folder {folder_id} in {pages} page(s)."
+    )
+    return items
+
+
+def _list_folder_pages(
+    drive_service: Resource,
+    folder_id: str,
+    first_page: Optional[Dict[str, Any]] = None,
+) -> Dict[str, RemoteFile]:
+    entries: Dict[str, RemoteFile] = {}
+    for remote_file in _list_folder_items(drive_service, folder_id, first_page):
+        if not _keep_existing(entries.get(remote_file.name), remote_file):
+            entries[remote_file.name] = remote_file
+    return entries
+
+
+@error_handler
+def list_folder(
+    drive_service: Resource,
+    folder_id: str,
+) -> Dict[str, RemoteFile]:
+    """
+    List the contents of a Google Drive folder.
+
+    The folder is listed once, across all result pages, and the listing is cached in the
+    shared `folder_index`. Subsequent calls for the same folder are served from the cache.
+
+    Args:
+        drive_service (Resource): The Google Drive API service instance.
+        folder_id (str): The ID of the Google Drive folder to list.
+
+    Returns:
+        Dict[str, RemoteFile]: A map from file name to the file's metadata.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the API request.
+    """
+    return folder_index.load(drive_service, folder_id)
+
+
+@error_handler
+def load_folders(
+    drive_service: Resource,
+    folder_ids: List[str],
+) -> None:
+    """
+    List several Google Drive folders into the shared `folder_index` at once.
+
+    The first page of every folder that is not cached yet is fetched in batch requests;
+    only folders with more than one page of entries need further requests.
+
+    Args:
+        drive_service (Resource): The Google Drive API service instance.
+        folder_ids (List[str]): The IDs of the folders to list.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the API requests.
+    """
+    missing = [i for i in dict.fromkeys(folder_ids) if not folder_index.is_loaded(i)]
+    if not missing:
+        return
+
+    with DriveBatch(drive_service) as batch:
+        first_pages = [batch.add(_list_request(drive_service, i)) for i in missing]
+
+    for folder_id, first_page in zip(missing, first_pages):
+        entries = _list_folder_pages(drive_service, folder_id, first_page.result())
+        folder_index.store(folder_id, entries)
+
+
+@error_handler
+def list_folders(
+    drive_service: Resource,
+    folder_ids: List[str],
+) -> Dict[str, List[RemoteFile]]:
+    """
+    List every entry of several Google Drive folders, bypassing the `folder_index`.
+
+    Unlike `list_folder`, which keeps one entry per name, this returns all entries,
+    including files that share a name. The first pages are fetched in batch requests, as
+    in `load_folders`.
+
+    Args:
+        drive_service (Resource): The Google Drive API service instance.
+        folder_ids (List[str]): The IDs of the folders to list.
+
+    Returns:
+        Dict[str, List[RemoteFile]]: A map from folder ID to the folder's entries.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the API requests.
+    """
+    folder_ids = list(dict.fromkeys(folder_ids))
+    if not folder_ids:
+        return {}
+
+    with DriveBatch(drive_service) as batch:
+        first_pages = [batch.add(_list_request(drive_service, i)) for i in folder_ids]
+
+    return {
+        folder_id: _list_folder_items(drive_service, folder_id, first_page.result())
+        for folder_id, first_page in zip(folder_ids, first_pages)
+    }
+
+
+def _quote_query(value: str) -> str:
+    """Quote a string for a Drive search query."""
+    escaped = value.replace("\\", "\\\\").replace("'", "\\'")
+    return f"'{escaped}'"
+
+
+def typed_query(folder_id: str, file_name: str, mime_type: str) -> str:
+    """Return the Drive search query for the entries of a folder with a name and type."""
+    return (
+        f"{folder_query(folder_id)} and name = {_quote_query(file_name)} "
+        f"and mimeType = {_quote_query(mime_type)}"
+    )
+
+
+def _find_typed(
+    drive_service: Resource, folder_id: str, file_name: str, mime_type: str
+) -> Optional[RemoteFile]:
+    response = execute(
+        drive_service.files().list(
+            q=typed_query(folder_id, file_name, mime_type),
+            spaces="drive",
+            fields=LIST_FIELDS,
+            pageSize=1,
+        )
+    )
+    files = response.get("files", [])
+    return RemoteFile.from_api(files[0]) if files else None
+
 
 @error_handler
 def find_file(
     drive_service: Resource,
     folder_id: str,
     file_name: str,
+    mime_type: Optional[str] = None,
 ) -> Optional[str]:
     """
     Search for a file with a specific name in a given Google Drive folder.
 
-    This function uses the Google Drive API to search for a file with the specified name
-    within the folder identified by `folder_id`. If the file is found, its ID is returned.
-    If no file is found, the function returns None.
+    The lookup is served from the folder's cached listing (see `list_folder`), so only the
+    first lookup in a folder makes an API request. If the file is found, its ID is
+    returned. If no file is found, the function returns None.
+
+    The listing keeps one entry per name, so if `mime_type` is given and the cached
+    entry has another type, e.g. a folder with the name of the Sheet looked for, the
+    folder is searched for an entry of that type with one more request.
 
     Args:
         drive_service (Resource): A Resource object representing the Google Drive API service.
         folder_id (str): The ID of the Google Drive folder to search in.
         file_name (str): The name of the file to search for.
+        mime_type (str, optional): The MIME type the file must have.
 
     Returns:
         Optional[str]: The ID of the found file, or None if no file was found.
@@ -33,19 +426,110 @@ def find_file(
         GoogleApiAccessError: If any error occurs during the API request.
     """
 
-    query = f"'{folder_id}' in parents and trashed = false"
-    response = (
-        drive_service.files()
-        .list(q=query, spaces="drive", fields="files(id, name)")
-        .execute()
+    remote_file = folder_index.load(drive_service, folder_id).get(file_name)
+
+    if (
+        remote_file is not None
+        and mime_type is not None
+        and remote_file.mime_type != mime_type
+    ):
+        remote_file = _find_typed(drive_service, folder_id, file_name, mime_type)
+
+    if remote_file is None:
+        return None
+
+    logger.debug(f"File found with ID: {remote_file.id}")
+    return remote_file.id
+
+
+@error_handler
+def get_file(drive_service: Resource, file_id: str) -> Optional[RemoteFile]:
+    """
+    Fetch the metadata of a Google Drive file by its ID.
+
+    Args:
+        drive_service (Resource): The Google Drive API service instance.
+        file_id (str): The ID of the file.
+
+    Returns:
+        Optional[RemoteFile]: The file, or None if it does not exist or is in the trash.
+
+    Raises:
+        GoogleApiAccessError: If any other error occurs during the API request.
+    """
+    try:
+        result = execute(
+            drive_service.files().get(fileId=file_id, fields=f"{FILE_FIELDS}, trashed")
+        )
+    except HttpError as e:
+        if e.resp.status == 404:
+            return None
+        raise
+    if result.get("trashed"):
+        return None
+    return RemoteFile.from_api(result)
+
+
+@error_handler
+def copy_file(
+    drive_service: Resource,
+    file_id: str,
+    folder_id: str,
+    file_name: str,
+) -> RemoteFile:
+    """
+    Copy a Google Drive file into a folder on the server, without transferring its content.
+
+    Args:
+        drive_service (Resource): The Google Drive API service instance.
+        file_id (str): The ID of the file to copy.
+        folder_id (str): The ID of the folder the copy is created in.
+        file_name (str): The name of the copy.
+
+    Returns:
+        RemoteFile: The new copy.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the API request.
+    """
+    result = execute(
+        drive_service.files().copy(
+            fileId=file_id,
+            body={"name": file_name, "parents": [folder_id]},
+            fields=FILE_FIELDS,
+        )
     )
-    files = response.get("files", [])
+    remote_file = RemoteFile.from_api(result)
+    folder_index.add(folder_id, remote_file)
+    logger.debug(f"Copied file {file_id} into folder {folder_id} as {remote_file.id}")
+    return remote_file
+
 
-    for file in files:
-        if file.get("name") == file_name:
-            logger.debug(f"File found with ID: {file.get('id')}")
-            return file.get("id")
-    return None
+@error_handler
+def download_range(
+    drive_service: Resource,
+    file_id: str,
+    start: int,
+    end: int,
+) -> bytes:
+    """
+    Download a range of the content of a Google Drive file.
+
+    Args:
+        drive_service (Resource): The Google Drive API service instance.
+        file_id (str): The ID of the file, which must not be a Google Docs type.
+        start (int): The offset of the first byte.
+        end (int): The offset of the last byte, inclusive like the HTTP Range header.
+
+    Returns:
+        bytes: The bytes from `start` to `end`, or fewer at the end of the file.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the API request.
+    """
+    request = drive_service.files().get_media(fileId=file_id)
+    request.headers["range"] = f"bytes={start}-{end}"
+    return execute(request)
 
 
 @error_handler
@@ -74,22 +558,85 @@ def create_google_sheet(
     """
     file_metadata = {
         "name": file_name,
-        "mimeType": "application/vnd.google-apps.spreadsheet",
+        "mimeType": SPREADSHEET_MIME_TYPE,
         "parents": [folder_id],
     }
-    file = (
-        drive_service.files()
-        .create(
+    file = execute(
+        drive_service.files().create(
             body=file_metadata,
-            fields="id",
+            fields="id, name, mimeType",
         )
-        .execute()
     )
+    folder_index.add(folder_id, RemoteFile.from_api(file))
     logger.info(f"Created new Google Sheets File ID: {file.get('id')}")
 
     return file.get("id")
 
 
+@error_handler
+def import_csv_as_sheet(
+    drive_service: Resource,
+    folder_id: str,
+    file_name: str,
+    path: str,
+    file_id: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> str:
+    """
+    Upload a CSV file and let Drive convert it into a Google Sheet.
+
+    The CSV is streamed from disk as a resumable upload (see `execute_resumable`) with
+    the Google Sheets MIME type as its target, so it is parsed on the server and never
+    on the client. If `file_id` is given, the media of that existing Google Sheet is
+    replaced instead; note that this replaces all of its sheets.
+
+    Args:
+        drive_service (Resource): The Google Drive API service instance.
+        folder_id (str): The ID of the folder containing the Google Sheet.
+        file_name (str): The name of the Google Sheet.
+        path (str): The path of the CSV file.
+        file_id (str, optional): The ID of an existing Google Sheet to overwrite.
+        chunk_size (int, optional): The size of each chunk of the upload, in bytes.
+
+    Returns:
+        str: The ID of the Google Sheet.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the upload.
+    """
+    media = MediaFileUpload(
+        path, mimetype="text/csv", resumable=True, chunksize=chunk_size
+    )
+    if file_id is not None:
+        request = drive_service.files().update(
+            fileId=file_id, media_body=media, fields=FILE_FIELDS
+        )
+    else:
+        request = drive_service.files().create(
+            body={
+                "name": file_name,
+                "mimeType": SPREADSHEET_MIME_TYPE,
+                "parents": [folder_id],
+            },
+            media_body=media,
+            fields=FILE_FIELDS,
+        )
+
+    result = execute_resumable(
+        request,
+        key=upload_key(path, folder_id, file_name),
+        fingerprint=file_fingerprint(path),
+    )
+    remote_file = RemoteFile.from_api(result)
+    if file_id is not None:
+        folder_index.put(folder_id, remote_file)
+    else:
+        folder_index.add(folder_id, remote_file)
+    logger.debug(f"Imported {path} into Google Sheet ID: {remote_file.id}")
+
+    return remote_file.id
+
+
 @error_handler
 def create_drive_folder(
     drive_service: Resource,
@@ -117,29 +664,200 @@ def create_drive_folder(
     """
 
     # Check if the folder already exists
-    query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and '{parent_folder_id}' in parents and trashed = false"
-    response = (
-        drive_service.files()
-        .list(q=query, spaces="drive", fields="files(id, name)")
-        .execute()
-    )
-    files = response.get("files", [])
+    existing = folder_index.load(drive_service, parent_folder_id).get(folder_name)
 
-    if files:
-        folder_id = files[0].get("id")
+    if existing is not None and existing.is_folder:
         logger.warning(
             f"Folder '{folder_name}' already exists. Continuing with upload but some files may be overwritten."
         )
-        return folder_id
+        return existing.id
 
     # Folder does not exist, create a new one
     file_metadata = {
         "name": folder_name,
-        "mimeType": "application/vnd.google-apps.folder",
+        "mimeType": FOLDER_MIME_TYPE,
         "parents": [parent_folder_id],
     }
-    folder = drive_service.files().create(body=file_metadata, fields="id").execute()
+    folder = execute(
+        drive_service.files().create(body=file_metadata, fields="id, name, mimeType")
+    )
     folder_id = folder.get("id")
+    folder_index.add(parent_folder_id, RemoteFile.from_api(folder))
+    # A new folder has no children, so there is no need to list it later
+    folder_index.add_empty(folder_id)
     logger.debug(f"Created new folder '{folder_name}' with ID: {folder_id}")
 
     return folder_id
+
+
+@error_handler
+def set_app_properties(
+    drive_service: Resource,
+    folder_id: str,
+    file_id: str,
+    app_properties: Dict[str, str],
+) -> RemoteFile:
+    """
+    Set private application properties on a Google Drive file.
+
+    gpush uses application properties to remember what was uploaded to files that have
+    no checksum of their own, such as Google Sheets.
+
+    Args:
+        drive_service (Resource): The Google Drive API service instance.
+        folder_id (str): The ID of the folder containing the file.
+        file_id (str): The ID of the file to update.
+        app_properties (Dict[str, str]): The properties to set.
+
+    Returns:
+        RemoteFile: The updated file.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the API request.
+    """
+    result = execute(
+        drive_service.files().update(
+            fileId=file_id,
+            body={"appProperties": app_properties},
+            fields=FILE_FIELDS,
+        ),
+        idempotent=True,
+    )
+    remote_file = RemoteFile.from_api(result)
+    folder_index.put(folder_id, remote_file)
+    return remote_file
+
+
+@error_handler
+def trash_file(
+    drive_service: Resource, folder_id: str, remote_file: RemoteFile
+) -> None:
+    """
+    Move a Google Drive file to the trash.
+
+    Args:
+        drive_service (Resource): The Google Drive API service instance.
+        folder_id (str): The ID of the folder containing the file.
+        remote_file (RemoteFile): The file to move to the trash.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the API request.
+    """
+    execute(
+        drive_service.files().update(
+            fileId=remote_file.id, body={"trashed": True}, fields="id"
+        ),
+        idempotent=True,
+    )
+    folder_index.remove(folder_id, remote_file.name)
+    logger.debug(f"Moved {remote_file.name} ({remote_file.id}) to the trash.")
+
+
+@error_handler
+def create_drive_folders(
+    drive_service: Resource,
+    folders: List[Tuple[str, str]],
+) -> List[str]:
+    """
+    Create or find several folders, each within its own parent folder.
+
+    This is the batched counterpart of `create_drive_folder`. The parent folders are
+    listed with `load_folders`, and all folders that do not exist yet are created
+    together in batch requests. The folders must be independent of each other, i.e. no
+    folder in the list may be the parent of another one. Creating a tree one depth at a
+    time satisfies this. A folder listed more than once is created once.
+
+    Args:
+        drive_service (Resource): The Google Drive API service instance.
+        folders (List[Tuple[str, str]]): Pairs of folder name and parent folder ID.
+
+    Returns:
+        List[str]: The IDs of the created or found folders, in the order of `folders`.
+
+    Raises:
+        GoogleApiAccessError: If any of the folders could not be listed or created.
+    """
+    unique = list(dict.fromkeys(folders))
+    load_folders(drive_service, [parent for _, parent in unique])
+
+    folder_ids: List[Optional[str]] = []
+    created = {}
+
+    with DriveBatch(drive_service) as batch:
+        for folder_name, parent_folder_id in unique:
+            existing = folder_index.load(drive_service, parent_folder_id).get(
+                folder_name
+            )
+            if existing is not None and existing.is_folder:
+                logger.warning(
+                    f"Folder '{folder_name}' already exists. Continuing with upload but some files may be overwritten."
+                )
+                folder_ids.append(existing.id)
+                continue
+
+            file_metadata = {
+                "name": folder_name,
+                "mimeType": FOLDER_MIME_TYPE,
+                "parents": [parent_folder_id],
+            }
+            request = drive_service.files().create(
+                body=file_metadata, fields="id, name, mimeType"
+            )
+            created[len(folder_ids)] = (parent_folder_id, batch.add(request))
+            folder_ids.append(None)
+
+    for position, (parent_folder_id, future) in created.items():
+        folder = future.result()
+        folder_index.add(parent_folder_id, RemoteFile.from_api(folder))
+        folder_index.add_empty(folder["id"])
+        folder_ids[position] = folder["id"]
+        logger.debug(f"Created new folder '{folder['name']}' with ID: {folder['id']}")
+
+    ids = dict(zip(unique, folder_ids))
+    return [ids[folder] for folder in folders]  # type: ignore
+
+
+@error_handler
+def create_google_sheets(
+    drive_service: Resource,
+    sheets: List[Tuple[str, str]],
+) -> List[str]:
+    """
+    Create several new Google Sheets in batch requests.
+
+    This is the batched counterpart of `create_google_sheet`. A sheet listed more than
+    once is created once.
+
+    Args:
+        drive_service (Resource): The Google Drive API service instance.
+        sheets (List[Tuple[str, str]]): Pairs of folder ID and name of the new sheet.
+
+    Returns:
+        List[str]: The IDs of the new Google Sheets, in the order of `sheets`.
+
+    Raises:
+        GoogleApiAccessError: If any of the sheets could not be created.
+    """
+    unique = list(dict.fromkeys(sheets))
+    with DriveBatch(drive_service) as batch:
+        futures = [
+            batch.add(
+                drive_service.files().create(
+                    body={
+                        "name": file_name,
+                        "mimeType": SPREADSHEET_MIME_TYPE,
+                        "parents": [folder_id],
+                    },
+                    fields="id, name, mimeType",
+                )
+            )
+            for folder_id, file_name in unique
+        ]
+
+    sheet_ids = {}
+    for (folder_id, file_name), future in zip(unique, futures):
+        file = future.result()
+        folder_index.add(folder_id, RemoteFile.from_api(file))
+        logger.info(f"Created new Google Sheets File ID: {file.get('id')}")
+        sheet_ids[folder_id, file_name] = file["id"]
+    return [sheet_ids[sheet] for sheet in sheets]
@@ -1,12 +1,397 @@
+import hashlib
 import logging
-from typing import Any, List, Optional
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from googleapiclient.discovery import Resource  # type: ignore
 
+from gpush.requests.retry import execute
 from gpush.requests.utilities import error_handler
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BLOCK_SIZE = 5000
+
+
+@dataclass
+class WriteStats:
+    """Throughput of a write to a Google Sheet."""
+
+    rows: int = 0
+    cells: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def cells_per_second(self) -> float:
+        return self.cells / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.rows} rows / {self.cells} cells in {self.seconds:.1f}s "
+            f"({self.rows_per_second:.0f} rows/s, {self.cells_per_second:.0f} cells/s)"
+        )
+
+
+def a1_range(sheet: str, row: int = 1) -> str:
+    """
+    Return the A1 notation of the cell in the first column of `row` of `sheet`.
+
+    Sheet names are quoted, so names containing spaces or apostrophes are supported.
+    """
+    return f"{_quote(sheet)}!A{row}"
+
+
+def _quote(sheet: str) -> str:
+    quoted = sheet.replace("'", "''")
+    return f"'{quoted}'"
+
+
+def _first_row(a1: str) -> int:
+    # The first row number of an A1 range such as "'Sheet1'!A5:C9"
+    match = re.search(r"!\$?[A-Z]*\$?(\d+)", a1)
+    if match is None:
+        raise ValueError(f"Unexpected A1 range: {a1}")
+    return int(match.group(1))
+
+
+def row_hash(row: List[Any]) -> str:
+    """
+    Return the MD5 checksum of the values of a row.
+
+    Trailing empty cells are ignored, because the Sheets API does not return them.
+    """
+    values = [str(value) for value in row]
+    while values and values[-1] == "":
+        values.pop()
+    return hashlib.md5("\x1f".join(values).encode("utf-8")).hexdigest()
+
+
+def row_blocks(rows: Iterable[List[Any]], block_size: int) -> Iterator[List[List[Any]]]:
+    """Lazily split an iterable of rows into lists of at most `block_size` rows."""
+    iterator = iter(rows)
+    while True:
+        block = list(islice(iterator, block_size))
+        if not block:
+            return
+        yield block
+
+
+SHEET_FIELDS = "sheets(properties(sheetId,title,gridProperties(rowCount,columnCount)))"
+
+
+@dataclass
+class SheetProperties:
+    """The ID, title and grid size of one sheet (tab) of a spreadsheet."""
+
+    sheet_id: int
+    title: str
+    row_count: int
+    column_count: int
+
+
+def _cell_data(value: Any) -> Dict[str, Any]:
+    # Mirrors valueInputOption=RAW: values are stored exactly as given, never parsed
+    if value is None or value == "":
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+class SpreadsheetSession:
+    """
+    Prepares and writes the sheets of one spreadsheet with as few requests as possible.
+
+    The titles, IDs and grid sizes of the sheets are fetched once, with a field mask so
+    that only those properties are downloaded, and kept up to date locally. Creating a
+    missing sheet, clearing it, growing its grid and writing the first block of values
+    are then merged into a single `batchUpdate`, so preparing and filling a tab costs
+    one round-trip instead of three. Use `spreadsheet_session` to share a session
+    between all writes to the same spreadsheet.
+    """
+
+    def __init__(self, sheets_service: Resource, spreadsheet_id: str) -> None:
+        self.sheets_service = sheets_service
+        self.spreadsheet_id = spreadsheet_id
+        self._sheets: Optional[Dict[str, SheetProperties]] = None
+        self._lock = threading.RLock()
+
+    @property
+    def sheets(self) -> Dict[str, SheetProperties]:
+        """The sheets of the spreadsheet by title, fetched on first access."""
+        with self._lock:
+            if self._sheets is None:
+                metadata = execute(
+                    self.sheets_service.spreadsheets().get(
+                        spreadsheetId=self.spreadsheet_id, fields=SHEET_FIELDS
+                    )
+                )
+                self._sheets = {}
+                for sheet in metadata.get("sheets", []):
+                    properties = sheet["properties"]
+                    grid = properties.get("gridProperties", {})
+                    self._sheets[properties["title"]] = SheetProperties(
+                        sheet_id=properties["sheetId"],
+                        title=properties["title"],
+                        row_count=grid.get("rowCount", 0),
+                        column_count=grid.get("columnCount", 0),
+                    )
+            return self._sheets
+
+    def _new_sheet(
+        self, title: str, rows: int, columns: int, hidden: bool = False
+    ) -> Dict[str, Any]:
+        # Choosing the ID locally lets later requests in the same batch refer to the sheet
+        used = {sheet.sheet_id for sheet in self.sheets.values()}
+        sheet_id = max(used, default=0) + 1
+        self.sheets[title] = SheetProperties(sheet_id, title, rows, columns)
+        return {
+            "addSheet": {
+                "properties": {
+                    "sheetId": sheet_id,
+                    "title": title,
+                    "gridProperties": {"rowCount": rows, "columnCount": columns},
+                    "hidden": hidden,
+                }
+            }
+        }
+
+    def _batch_update(
+        self, requests: List[Dict[str, Any]], idempotent: Optional[bool] = None
+    ) -> None:
+        if requests:
+            execute(
+                self.sheets_service.spreadsheets().batchUpdate(
+                    spreadsheetId=self.spreadsheet_id, body={"requests": requests}
+                ),
+                idempotent=idempotent,
+            )
+
+    def add_sheets(
+        self,
+        titles: List[str],
+        rows: int = 1000,
+        columns: int = 26,
+        hidden: bool = False,
+    ) -> None:
+        """
+        Create every sheet in `titles` that does not exist yet, in a single request.
+
+        New sheets get a grid of `rows` x `columns` cells; the defaults match the ones of
+        the Sheets UI. Hidden sheets are not shown in the tab bar of the Sheets UI.
+        """
+        with self._lock:
+            requests = [
+                self._new_sheet(title, rows, columns, hidden)
+                for title in dict.fromkeys(titles)
+                if title not in self.sheets
+            ]
+            try:
+                self._batch_update(requests)
+            except Exception:
+                self._sheets = None
+                raise
+            if requests:
+                logger.debug(f"Created {len(requests)} new sheet(s).")
+
+    def reset(self) -> None:
+        """Forget the cached sheets, e.g. after the spreadsheet was replaced."""
+        with self._lock:
+            self._sheets = None
+
+    def rename_sheet(self, title: str, new_title: str) -> None:
+        """Rename a sheet of the spreadsheet."""
+        with self._lock:
+            sheet = self.sheets[title]
+            try:
+                self._batch_update(
+                    [
+                        {
+                            "updateSheetProperties": {
+                                "properties": {
+                                    "sheetId": sheet.sheet_id,
+                                    "title": new_title,
+                                },
+                                "fields": "title",
+                            }
+                        }
+                    ]
+                )
+            except Exception:
+                self._sheets = None
+                raise
+            sheet.title = new_title
+            self.sheets[new_title] = self.sheets.pop(title)
+
+    def delete_sheets(self, titles: List[str]) -> None:
+        """Delete every sheet in `titles` that exists, in a single request."""
+        with self._lock:
+            existing = [self.sheets[title] for title in titles if title in self.sheets]
+            try:
+                self._batch_update(
+                    [{"deleteSheet": {"sheetId": sheet.sheet_id}} for sheet in existing]
+                )
+            except Exception:
+                self._sheets = None
+                raise
+            for sheet in existing:
+                del self.sheets[sheet.title]
+
+    def record_extent(self, title: str, rows: int, columns: int) -> None:
+        """
+        Record that a sheet holds at least `rows` x `columns` cells.
+
+        Writes through the values API grow the grid on the server; recording them keeps
+        the cached grid size from going stale, which would make a later resize shrink
+        the sheet.
+        """
+        with self._lock:
+            sheet = self.sheets.get(title)
+            if sheet is not None:
+                sheet.row_count = max(sheet.row_count, rows)
+                sheet.column_count = max(sheet.column_count, columns)
+
+    def write_sheet(
+        self,
+        title: str,
+        rows: List[List[Any]],
+        start_row: int = 1,
+        clear: bool = False,
+    ) -> None:
+        """
+        Write a block of rows to a sheet, creating and preparing the sheet as needed.
+
+        Everything happens in one `batchUpdate`: the sheet is added if it is missing,
+        optionally cleared, its grid is grown to fit the block, and the values are
+        written starting at `start_row`.
+
+        Args:
+            title (str): The name of the sheet.
+            rows (List[List[Any]]): The values to write.
+            start_row (int, optional): The 1-based row of the first value.
+            clear (bool, optional): Whether to clear all values from the sheet first.
+        """
+        with self._lock:
+            needed_rows = max(start_row - 1 + len(rows), 1)
+            needed_columns = max((len(row) for row in rows), default=0) or 1
+            requests = []
+
+            sheet = self.sheets.get(title)
+            if sheet is None:
+                requests.append(self._new_sheet(title, needed_rows, needed_columns))
+                sheet = self.sheets[title]
+                logger.debug(f"Created new sheet: {title}")
+            else:
+                logger.debug(f"Found existing sheet: {title}")
+                if clear:
+                    requests.append(
+                        {
+                            "updateCells": {
+                                "range": {"sheetId": sheet.sheet_id},
+                                "fields": "userEnteredValue",
+                            }
+                        }
+                    )
+                if sheet.row_count < needed_rows or sheet.column_count < needed_columns:
+                    sheet.row_count = max(sheet.row_count, needed_rows)
+                    sheet.column_count = max(sheet.column_count, needed_columns)
+                    requests.append(
+                        {
+                            "updateSheetProperties": {
+                                "properties": {
+                                    "sheetId": sheet.sheet_id,
+                                    "gridProperties": {
+                                        "rowCount": sheet.row_count,
+                                        "columnCount": sheet.column_count,
+                                    },
+                                },
+                                "fields": "gridProperties(rowCount,columnCount)",
+                            }
+                        }
+                    )
+
+            if rows:
+                requests.append(
+                    {
+                        "updateCells": {
+                            "start": {
+                                "sheetId": sheet.sheet_id,
+                                "rowIndex": start_row - 1,
+                                "columnIndex": 0,
+                            },
+                            "rows": [
+                                {"values": [_cell_data(value) for value in row]}
+                                for row in rows
+                            ],
+                            "fields": "userEnteredValue",
+                        }
+                    }
+                )
+
+            try:
+                # A batchUpdate is applied atomically, and writing the same cells twice
+                # leaves the same values, so the request is retried like a plain write.
+                # At worst a repeated addSheet fails because the sheet exists.
+                self._batch_update(requests, idempotent=True)
+            except Exception:
+                # The cached properties may no longer match the spreadsheet
+                self._sheets = None
+                raise
+
+
+# The number of sessions kept; the least recently used ones are dropped beyond that
+MAX_SESSIONS = 256
+
+_sessions: "OrderedDict[Tuple[int, str], SpreadsheetSession]" = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def spreadsheet_session(
+    sheets_service: Resource, spreadsheet_id: str
+) -> SpreadsheetSession:
+    """
+    Return the shared `SpreadsheetSession` of a spreadsheet.
+
+    Sessions are shared per service instance, so a session never sends its requests
+    through the client of another thread (see `ThreadLocalServices`). At most
+    `MAX_SESSIONS` are kept, and `forget_sessions` drops them when the spreadsheets may
+    have changed behind gpush's back.
+    """
+    # The session keeps the service alive, so its id() cannot be reused
+    key = (id(sheets_service), spreadsheet_id)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = SpreadsheetSession(sheets_service, spreadsheet_id)
+            _sessions[key] = session
+            if len(_sessions) > MAX_SESSIONS:
+                _sessions.popitem(last=False)
+        else:
+            _sessions.move_to_end(key)
+        return session
+
+
+def forget_sessions(spreadsheet_ids: Optional[Iterable[str]] = None) -> None:
+    """Drop the sessions of some spreadsheets, or of all of them if no IDs are given."""
+    with _sessions_lock:
+        if spreadsheet_ids is None:
+            _sessions.clear()
+            return
+        ids = set(spreadsheet_ids)
+        for key in [key for key in _sessions if key[1] in ids]:
+            del _sessions[key]
+
 
 @error_handler
 def check_or_create_sheet(
@@ -22,22 +407,265 @@ def check_or_create_sheet(
         spreadsheet_id (str): The ID of the Google Sheet.
         sheet_name (str): The name of the sheet to check or create.
     """
-    # Get the list of sheets in the spreadsheet
-    sheet_metadata = (
-        sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+    spreadsheet_session(sheets_service, spreadsheet_id).add_sheets([sheet_name])
+
+
+@error_handler
+def create_missing_sheets(
+    sheets_service: Resource,
+    spreadsheet_id: str,
+    sheet_names: List[str],
+    rows: int = 1000,
+    columns: int = 26,
+    hidden: bool = False,
+) -> None:
+    """
+    Create every sheet in `sheet_names` that does not exist yet, in a single request.
+
+    Args:
+        sheets_service (Resource): The Google Sheets API service instance.
+        spreadsheet_id (str): The ID of the Google Sheet.
+        sheet_names (List[str]): The names of the sheets that should exist.
+        rows (int, optional): The number of rows of the new sheets.
+        columns (int, optional): The number of columns of the new sheets.
+        hidden (bool, optional): Whether to hide the new sheets in the Sheets UI.
+    """
+    spreadsheet_session(sheets_service, spreadsheet_id).add_sheets(
+        sheet_names, rows=rows, columns=columns, hidden=hidden
     )
-    sheets = sheet_metadata.get("sheets", "")
 
-    # Check if the sheet exists
-    if not any(sheet["properties"]["title"] == sheet_name for sheet in sheets):
-        # If the sheet does not exist, create it
-        body = {"requests": [{"addSheet": {"properties": {"title": sheet_name}}}]}
-        sheets_service.spreadsheets().batchUpdate(
-            spreadsheetId=spreadsheet_id, body=body
-        ).execute()
-        logger.debug(f"Created new sheet: {sheet_name}")
-    else:
-        logger.debug(f"Found existing sheet: {sheet_name}")
+
+@error_handler
+def list_sheets(sheets_service: Resource, spreadsheet_id: str) -> List[str]:
+    """
+    Return the titles of the sheets of a spreadsheet.
+
+    The titles are served from the shared `SpreadsheetSession`, so they are only fetched
+    once per spreadsheet.
+    """
+    return list(spreadsheet_session(sheets_service, spreadsheet_id).sheets)
+
+
+@error_handler
+def rename_sheet(
+    sheets_service: Resource,
+    spreadsheet_id: str,
+    sheet_name: str,
+    new_name: str,
+) -> None:
+    """
+    Rename a sheet of a spreadsheet.
+
+    Args:
+        sheets_service (Resource): The Google Sheets API service instance.
+        spreadsheet_id (str): The ID of the Google Sheet.
+        sheet_name (str): The current name of the sheet.
+        new_name (str): The new name of the sheet.
+    """
+    spreadsheet_session(sheets_service, spreadsheet_id).rename_sheet(
+        sheet_name, new_name
+    )
+
+
+@error_handler
+def delete_sheets(
+    sheets_service: Resource,
+    spreadsheet_id: str,
+    sheet_names: List[str],
+) -> None:
+    """
+    Delete the sheets in `sheet_names` from a spreadsheet, in a single request.
+
+    Args:
+        sheets_service (Resource): The Google Sheets API service instance.
+        spreadsheet_id (str): The ID of the Google Sheet.
+        sheet_names (List[str]): The names of the sheets to delete. Missing ones are
+                                 ignored.
+    """
+    spreadsheet_session(sheets_service, spreadsheet_id).delete_sheets(sheet_names)
+
+
+@error_handler
+def read_columns(
+    sheets_service: Resource,
+    spreadsheet_id: str,
+    sheet: str,
+    columns: str = "A:B",
+) -> List[List[str]]:
+    """
+    Read whole columns of a sheet.
+
+    Args:
+        sheets_service (Resource): The Google Sheets API service instance.
+        spreadsheet_id (str): The ID of the Google Sheet.
+        sheet (str): The name of the sheet to read.
+        columns (str, optional): The A1 notation of the columns. Defaults to "A:B".
+
+    Returns:
+        List[List[str]]: The rows of the columns. Trailing empty rows and cells are
+                         omitted by the API.
+
+    Raises:
+        GoogleApiAccessError: If an error occurs while making the API request.
+    """
+    result = execute(
+        sheets_service.spreadsheets()
+        .values()
+        .get(spreadsheetId=spreadsheet_id, range=f"{_quote(sheet)}!{columns}")
+    )
+    return result.get("values", [])
+
+
+def read_rows(
+    sheets_service: Resource,
+    spreadsheet_id: str,
+    sheet: SheetProperties,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> Iterator[List[Any]]:
+    """
+    Lazily read the rows of a sheet, `block_size` rows per request.
+
+    Only one block is held in memory at a time, so sheets of any size can be streamed to
+    disk. Rows are read with their formatted values, as shown in the Sheets UI. Empty
+    rows between rows with values are yielded as empty lists, while trailing empty rows
+    are left out, like the API does.
+
+    Args:
+        sheets_service (Resource): The Google Sheets API service instance.
+        spreadsheet_id (str): The ID of the Google Sheet.
+        sheet (SheetProperties): The sheet to read, e.g. from `SpreadsheetSession`.
+        block_size (int, optional): The number of rows read per request.
+
+    Raises:
+        HttpError: If an error occurs while making the API request.
+    """
+    empty = 0
+    for first in range(1, sheet.row_count + 1, block_size):
+        last = min(first + block_size - 1, sheet.row_count)
+        result = execute(
+            sheets_service.spreadsheets()
+            .values()
+            .get(
+                spreadsheetId=spreadsheet_id,
+                range=f"{_quote(sheet.title)}!{first}:{last}",
+            )
+        )
+        rows = result.get("values", [])
+        if rows:
+            # The empty rows before this block's rows were not yielded yet
+            for _ in range(empty):
+                yield []
+            empty = 0
+            yield from rows
+        empty += last - first + 1 - len(rows)
+
+
+@error_handler
+def append_rows(
+    sheets_service: Resource,
+    spreadsheet_id: str,
+    sheet: str,
+    rows: List[List[Any]],
+    start_row: int,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> int:
+    """
+    Append rows to a sheet with `values().append`, in blocks of `block_size` rows.
+
+    The search for the end of the table starts at `start_row`, so the rows land right
+    after the last row known to be in use.
+
+    Args:
+        sheets_service (Resource): The Google Sheets API service instance.
+        spreadsheet_id (str): The ID of the Google Sheet.
+        sheet (str): The name of the sheet to append to.
+        rows (List[List[Any]]): The rows to append.
+        start_row (int): The row where the appended rows are expected to start.
+        block_size (int, optional): The number of rows sent per request.
+
+    Returns:
+        int: The row the first appended row was written to.
+
+    Raises:
+        GoogleApiAccessError: If an error occurs while making the API request.
+    """
+    session = spreadsheet_session(sheets_service, spreadsheet_id)
+    first_row = None
+    for block in row_blocks(rows, block_size):
+        result = execute(
+            sheets_service.spreadsheets()
+            .values()
+            .append(
+                spreadsheetId=spreadsheet_id,
+                range=a1_range(sheet, start_row),
+                valueInputOption="RAW",
+                insertDataOption="OVERWRITE",
+                body={"values": block},
+            )
+        )
+        landed = _first_row(result["updates"]["updatedRange"])
+        first_row = landed if first_row is None else first_row
+        start_row = landed + len(block)
+        session.record_extent(
+            sheet, start_row - 1, max((len(row) for row in block), default=0)
+        )
+
+    return start_row if first_row is None else first_row
+
+
+@error_handler
+def update_rows(
+    sheets_service: Resource,
+    spreadsheet_id: str,
+    ranges: List[Tuple[str, int, List[List[Any]]]],
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> None:
+    """
+    Overwrite scattered runs of rows with `values().batchUpdate`.
+
+    All the runs are sent in as few requests as possible, each carrying at most about
+    `block_size` rows.
+
+    Args:
+        sheets_service (Resource): The Google Sheets API service instance.
+        spreadsheet_id (str): The ID of the Google Sheet.
+        ranges (List[Tuple[str, int, List[List[Any]]]]): Triples of the sheet name, the
+            row of the first value and the rows to write there.
+        block_size (int, optional): The number of rows sent per request.
+
+    Raises:
+        GoogleApiAccessError: If an error occurs while making the API request.
+    """
+    session = spreadsheet_session(sheets_service, spreadsheet_id)
+
+    def send(data: List[Dict[str, Any]]) -> None:
+        execute(
+            sheets_service.spreadsheets()
+            .values()
+            .batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={"valueInputOption": "RAW", "data": data},
+            ),
+            # Writing the same values twice has no further effect
+            idempotent=True,
+        )
+
+    data: List[Dict[str, Any]] = []
+    pending = 0
+    for sheet, start_row, rows in ranges:
+        data.append({"range": a1_range(sheet, start_row), "values": rows})
+        session.record_extent(
+            sheet,
+            start_row - 1 + len(rows),
+            max((len(row) for row in rows), default=0),
+        )
+        pending += len(rows)
+        if pending >= block_size:
+            send(data)
+            data, pending = [], 0
+
+    if data:
+        send(data)
 
 
 @error_handler
@@ -47,6 +675,7 @@ def upload_data_to_spreadsheet(
     name: str,
     data: List[List[Any]],
     sheet: Optional[str] = "Sheet1",
+    clear: bool = False,
 ) -> None:
     """
     Upload data to the specified Google Sheet.
@@ -59,6 +688,7 @@ def upload_data_to_spreadsheet(
         sheet_id (str): The ID of the Google Sheet to update.
         data (List[List[Any]]): The data to upload. Each inner list represents a row of data.
         sheet (str, optional): The A1 notation of the values to update. Defaults to "Sheet1".
+        clear (bool, optional): Whether to clear all values from the sheet first.
 
     Example:
         upload_data_to_sheet(sheets_service, "123456", [["Name", "Age"], ["John Doe", 30], ["Jane Doe", 25]], "Sheet1")
@@ -69,21 +699,102 @@ def upload_data_to_spreadsheet(
     Raises:
         GoogleApiAccessError: If an error occurs while making the API request.
     """
-    # Check if the sheet exists or create it
-    check_or_create_sheet(sheets_service, spreadsheet_id, sheet)
+    title = sheet or "Sheet1"
 
-    body = {"values": data}
-    result = (
-        sheets_service.spreadsheets()
-        .values()
-        .update(
-            spreadsheetId=spreadsheet_id,
-            range=sheet,  # simplifying assumption: range is the same as sheet name
-            valueInputOption="RAW",
-            body=body,
+    # Create or prepare the sheet and write the first rows in a single request
+    session = spreadsheet_session(sheets_service, spreadsheet_id)
+    session.write_sheet(title, data[:DEFAULT_BLOCK_SIZE], clear=clear)
+
+    rest = data[DEFAULT_BLOCK_SIZE:]
+    if rest:
+        # Larger tables are cheaper to send through the values API
+        result = execute(
+            sheets_service.spreadsheets()
+            .values()
+            .update(
+                spreadsheetId=spreadsheet_id,
+                range=a1_range(title, DEFAULT_BLOCK_SIZE + 1),
+                valueInputOption="RAW",
+                body={"values": rest},
+            )
         )
-        .execute()
-    )
-    logger.debug(f"{result.get('updatedCells')} cells updated.")
+        session.record_extent(
+            title, len(data), max((len(row) for row in rest), default=0)
+        )
+        logger.debug(f"{result.get('updatedCells')} cells updated.")
+
     sheet_url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/"
     logger.info(f"Uploaded {name} to {sheet_url}.")
+
+
+@error_handler
+def stream_data_to_spreadsheet(
+    sheets_service: Resource,
+    spreadsheet_id: str,
+    name: str,
+    rows: Iterable[List[Any]],
+    sheet: str = "Sheet1",
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    start_row: int = 1,
+    clear: bool = False,
+) -> WriteStats:
+    """
+    Upload rows to the specified Google Sheet in fixed-size blocks.
+
+    Unlike `upload_data_to_spreadsheet`, the rows are consumed lazily and written in
+    blocks of `block_size` rows to consecutive A1 ranges, so only one block is held in
+    memory and every request stays well below the API's payload limits. The first block
+    is written together with the creation or resizing of the sheet, in one request (see
+    `SpreadsheetSession`).
+
+    Args:
+        sheets_service (Resource): The Google Sheets API service instance.
+        spreadsheet_id (str): The ID of the Google Sheet to update.
+        name (str): The name of the upload, used for logging.
+        rows (Iterable[List[Any]]): The rows to upload, e.g. a `csv.reader`.
+        sheet (str, optional): The name of the sheet to write to. Defaults to "Sheet1".
+        block_size (int, optional): The number of rows sent per request.
+        start_row (int, optional): The row the first block is written to. Defaults to 1.
+        clear (bool, optional): Whether to clear all values from the sheet first.
+
+    Returns:
+        WriteStats: The number of rows and cells written and the time it took.
+
+    Raises:
+        GoogleApiAccessError: If an error occurs while making the API request.
+    """
+    session = spreadsheet_session(sheets_service, spreadsheet_id)
+    stats = WriteStats()
+    start = time.perf_counter()
+    blocks = row_blocks(rows, block_size)
+
+    first = next(blocks, [])
+    session.write_sheet(sheet, first, start_row=start_row, clear=clear)
+    stats.rows += len(first)
+    stats.cells += sum(len(row) for row in first)
+
+    for block in blocks:
+        execute(
+            sheets_service.spreadsheets()
+            .values()
+            .update(
+                spreadsheetId=spreadsheet_id,
+                range=a1_range(sheet, start_row + stats.rows),
+                valueInputOption="RAW",
+                body={"values": block},
+            )
+        )
+        session.record_extent(
+            sheet,
+            start_row - 1 + stats.rows + len(block),
+            max((len(row) for row in block), default=0),
+        )
+        stats.rows += len(block)
+        stats.cells += sum(len(row) for row in block)
+        stats.seconds = time.perf_counter() - start
+        logger.debug(f"{name}: {stats}")
+
+    stats.seconds = time.perf_counter() - start
+    sheet_url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/"
+    logger.info(f"Uploaded {name} to {sheet_url}: {stats}.")
+    return stats
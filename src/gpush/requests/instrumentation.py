@@ -0,0 +1,308 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from gpush import logger
+
+
+@dataclass
+class RequestRecord:
+    """
+    One logical API call: the request and all of its retries.
+
+    `seconds` covers the whole call, including the time spent backing off between
+    attempts, and `bytes_sent` counts the payload of every attempt. `status` is the HTTP
+    status of the last attempt, or None if no response was received.
+    """
+
+    operation: str
+    seconds: float
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    status: Optional[int] = None
+    retries: int = 0
+
+
+Observer = Callable[[RequestRecord], None]
+T = TypeVar("T", bound=Observer)
+
+
+class Measurement:
+    """Collects the figures of one API call while it is in progress."""
+
+    # Whether the figures are reported; callers may skip computing them otherwise
+    active = True
+
+    def __init__(self, instrumentation: "Instrumentation", operation: str) -> None:
+        self.instrumentation = instrumentation
+        self.operation = operation
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.status: Optional[int] = None
+        self._start = time.perf_counter()
+
+    def response(self, status: int, content: Optional[bytes]) -> None:
+        self.status = status
+        self.bytes_received += len(content or b"")
+
+    def error(self, error: Exception) -> None:
+        # HTTP errors carry the response; anything else means no response was received
+        resp = getattr(error, "resp", None)
+        if resp is not None and getattr(resp, "status", None) is not None:
+            self.response(int(resp.status), getattr(error, "content", None))
+        else:
+            self.status = None
+
+    def finish(self, retries: int = 0) -> None:
+        self.instrumentation.record(
+            RequestRecord(
+                operation=self.operation,
+                seconds=time.perf_counter() - self._start,
+                bytes_sent=self.bytes_sent,
+                bytes_received=self.bytes_received,
+                status=self.status,
+                retries=retries,
+            )
+        )
+
+
+class _IdleMeasurement(Measurement):
+    """Stands in for measurements while no observer is registered, doing nothing."""
+
+    active = False
+
+    def __init__(self) -> None:
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.status = None
+
+    def response(self, status: int, content: Optional[bytes]) -> None:
+        pass
+
+    def error(self, error: Exception) -> None:
+        pass
+
+    def finish(self, retries: int = 0) -> None:
+        pass
+
+
+_IDLE = _IdleMeasurement()
+
+
+class Instrumentation:
+    """
+    Reports every Drive and Sheets API call to the registered observers.
+
+    The request functions of `gpush.requests` (through `retry.execute`, the resumable
+    uploads and `DriveBatch`) and `gpush.aio` measure each call and pass a
+    `RequestRecord` to every observer. Observers run on the thread that made the call,
+    so they should be quick and thread-safe; exceptions they raise are logged and
+    otherwise ignored. While no observer is registered, nothing is measured.
+
+    Example:
+        instrumentation.add_observer(lambda record: print(record.operation, record.seconds))
+    """
+
+    def __init__(self) -> None:
+        self._observers: List[Observer] = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._observers)
+
+    def add_observer(self, observer: T) -> T:
+        with self._lock:
+            self._observers = self._observers + [observer]
+        return observer
+
+    def remove_observer(self, observer: Observer) -> None:
+        with self._lock:
+            self._observers = [o for o in self._observers if o is not observer]
+
+    def measure(self, operation: str) -> Measurement:
+        if not self._observers:
+            return _IDLE
+        return Measurement(self, operation)
+
+    def record(self, record: RequestRecord) -> None:
+        for observer in self._observers:
+            try:
+                observer(record)
+            except Exception as e:
+                logger.warning(f"Instrumentation observer failed: {e}")
+
+
+instrumentation = Instrumentation()
+
+
+def operation_name(request: Any) -> str:
+    """Name an API request after its method, e.g. "drive.files.list"."""
+    return getattr(request, "methodId", None) or "unknown"
+
+
+def request_size(request: Any) -> int:
+    body = getattr(request, "body", None)
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    return len(body)
+
+
+def capture_response(request: Any, measurement: Measurement) -> None:
+    """Record the status and size of the response of a `HttpRequest` in `measurement`."""
+    postproc = getattr(request, "postproc", None)
+    if postproc is None or not measurement.active:
+        return
+
+    def measured_postproc(resp: Any, content: Any) -> Any:
+        measurement.response(int(resp.status), content)
+        return postproc(resp, content)
+
+    request.postproc = measured_postproc
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    # Nearest-rank percentile of sorted values
+    if not values:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+@dataclass
+class OperationStats:
+    count: int = 0
+    errors: int = 0
+    retries: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "seconds": sum(latencies),
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "max": latencies[-1] if latencies else 0.0,
+            "statuses": dict(sorted(self.statuses.items())),
+        }
+
+
+class StatsCollector:
+    """
+    An observer that aggregates the API calls of a run per operation.
+
+    `write` saves a summary with the call count, errors, retries, bytes and latency
+    percentiles of every operation, either as JSON or, for paths ending in ``.prom``, in
+    the Prometheus text format, ready for the node exporter's textfile collector.
+    """
+
+    def __init__(self) -> None:
+        self.operations: Dict[str, OperationStats] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def __call__(self, record: RequestRecord) -> None:
+        with self._lock:
+            stats = self.operations.setdefault(record.operation, OperationStats())
+            stats.count += 1
+            stats.retries += record.retries
+            stats.bytes_sent += record.bytes_sent
+            stats.bytes_received += record.bytes_received
+            stats.latencies.append(record.seconds)
+            stats.statuses[str(record.status)] += 1
+            if record.status is None or record.status >= 400:
+                stats.errors += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            operations = {
+                name: stats.summary() for name, stats in sorted(self.operations.items())
+            }
+        return {
+            "started": self.started,
+            "seconds": time.time() - self.started,
+            "requests": sum(o["count"] for o in operations.values()),
+            "operations": operations,
+        }
+
+    def prometheus(self) -> str:
+        summary = self.summary()
+        lines = []
+
+        def metric(name: str, kind: str, help: str) -> None:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        operations = summary["operations"]
+        metric("gpush_requests_total", "counter", "API calls by operation and status.")
+        for name, op in operations.items():
+            for status, n in op["statuses"].items():
+                lines.append(
+                    f'gpush_requests_total{{operation="{name}",status="{status}"}} {n}'
+                )
+        for key, help in (
+            ("retries", "Retries of API calls."),
+            ("bytes_sent", "Bytes sent in API calls."),
+            ("bytes_received", "Bytes received in API calls."),
+        ):
+            metric(f"gpush_request_{key}_total", "counter", help)
+            for name, op in operations.items():
+                lines.append(
+                    f'gpush_request_{key}_total{{operation="{name}"}} {op[key]}'
+                )
+
+        metric("gpush_request_duration_seconds", "summary", "Latency of API calls.")
+        for name, op in operations.items():
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                lines.append(
+                    f'gpush_request_duration_seconds{{operation="{name}",'
+                    f'quantile="{quantile}"}} {op[key]:.6f}'
+                )
+            lines.append(
+                f'gpush_request_duration_seconds_sum{{operation="{name}"}} '
+                f'{op["seconds"]:.6f}'
+            )
+            lines.append(
+                f'gpush_request_duration_seconds_count{{operation="{name}"}} '
+                f'{op["count"]}'
+            )
+
+        metric("gpush_run_seconds", "gauge", "Duration of the gpush run.")
+        lines.append(f'gpush_run_seconds {summary["seconds"]:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Write the summary to `path`, atomically, as JSON or in the Prometheus format."""
+        if path.endswith(".prom"):
+            content = self.prometheus()
+        else:
+            content = json.dumps(self.summary(), indent=2) + "\n"
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".gpush-stats.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            # mkstemp creates private files, but collectors may run as another user
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
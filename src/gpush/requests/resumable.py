@@ -0,0 +1,218 @@
+import logging
+import os
+from typing import Any, BinaryIO, Dict, Optional
+
+from googleapiclient.errors import HttpError  # type: ignore
+from googleapiclient.http import HttpRequest, MediaUpload  # type: ignore
+
+from gpush.state import JsonStateFile
+
+from .instrumentation import instrumentation, operation_name
+from .retry import backoff, bucket_for, default_policy, is_retryable, retry_stats
+from .utilities import error_handler
+
+logger = logging.getLogger(__name__)
+
+# Chunk sizes must be a multiple of 256 KiB for the Drive resumable upload protocol
+CHUNK_SIZE_UNIT = 256 * 1024
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+upload_sessions = JsonStateFile("uploads.json")
+
+
+def upload_key(path: str, folder_id: str, name: str) -> str:
+    """Identify an upload of a local file to a named file in a Drive folder."""
+    return f"{os.path.abspath(path)}|{folder_id}|{name}"
+
+
+def file_fingerprint(path: str) -> str:
+    """Describe the current version of a local file; a changed file must start over."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class StreamUpload(MediaUpload):
+    """
+    A resumable upload of a forward-only stream of unknown size, such as a pipe.
+
+    The media uploads of the client library seek in their source. This one only keeps
+    the chunk being sent, and the next one read ahead, in memory: a chunk that failed
+    can be resent from the last byte the server confirmed, and bytes before that are
+    dropped. Reading ahead lets the final chunk carry the total size, which the server
+    needs to complete the upload.
+
+    A stream cannot be rewound, so the upload fails if the server asks for bytes that
+    were dropped, e.g. after the upload session expired.
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        mimetype: str,
+        chunksize: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        self._stream = stream
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self._buffer = bytearray()
+        # The position in the stream of the first buffered byte and of the next chunk
+        self._offset = 0
+        self._next = 0
+        self._eof = False
+
+    def chunksize(self) -> int:
+        return self._chunksize
+
+    def mimetype(self) -> str:
+        return self._mimetype
+
+    def resumable(self) -> bool:
+        return True
+
+    def has_stream(self) -> bool:
+        return False
+
+    def size(self) -> Optional[int]:
+        # Called before every chunk; the size is known once the end has been read
+        self._fill(self._next + self._chunksize + 1)
+        return self._offset + len(self._buffer) if self._eof else None
+
+    def getbytes(self, begin: int, length: int) -> bytes:
+        if begin < self._offset:
+            raise ValueError(
+                f"Cannot rewind the stream to byte {begin}; it is at {self._offset}."
+            )
+        del self._buffer[: begin - self._offset]
+        self._offset = begin
+        self._fill(begin + length)
+        data = bytes(self._buffer[:length])
+        self._next = begin + len(data)
+        return data
+
+    def to_json(self) -> str:
+        raise NotImplementedError("A stream upload cannot be serialized.")
+
+    def _fill(self, end: int) -> None:
+        while not self._eof and self._offset + len(self._buffer) < end:
+            data = self._stream.read(end - self._offset - len(self._buffer))
+            if data:
+                self._buffer += data
+            else:
+                self._eof = True
+
+
+def _query_offset(request: HttpRequest, query: bool = True) -> None:
+    """
+    Make the next `next_chunk` of a resumable upload first ask the server which bytes
+    it has confirmed (a `Content-Range: bytes */*` request), and resend from there.
+
+    The client library has no public API for this: it sets the private
+    `HttpRequest._in_error_state` after a failed chunk, which is what this helper does.
+    Written against google-api-python-client 2.x (checked with 2.201).
+    """
+    request._in_error_state = query
+
+
+def _restart(request: HttpRequest) -> None:
+    request.resumable_uri = None
+    request.resumable_progress = 0
+    _query_offset(request, False)
+
+
+@error_handler
+def execute_resumable(
+    request: HttpRequest,
+    key: Optional[str] = None,
+    fingerprint: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Run a resumable media upload chunk by chunk, saving the session after every chunk.
+
+    The upload session URI and the number of bytes confirmed by the server are written
+    to the local state file (see `gpush.state`) under `key`. If a previous run left a
+    session for the same key and fingerprint, the upload continues from the last byte
+    the server confirmed instead of starting over. Sessions that the server no longer
+    knows about (they expire after about a week) are discarded and the upload restarts.
+
+    Chunks that fail with a retryable error are resent from the last confirmed byte
+    after a backoff (see `gpush.requests.retry`). Every chunk is reported to
+    `instrumentation` as a call of its own.
+
+    Args:
+        request (HttpRequest): An API request built with a resumable `MediaUpload` body.
+        key (str, optional): The key the session is saved under (see `upload_key`).
+                             If omitted the session is not persisted.
+        fingerprint (str, optional): The version of the local content being uploaded
+                                     (see `file_fingerprint`).
+
+    Returns:
+        Dict[str, Any]: The API response returned once the upload is complete.
+
+    Raises:
+        GoogleApiAccessError: If any error occurs during the upload.
+    """
+    saved = upload_sessions.get(key) if key else None
+    if saved is not None and saved.get("fingerprint") == fingerprint:
+        logger.info(f"Resuming upload from byte {saved['progress']}...")
+        request.resumable_uri = saved["uri"]
+        _query_offset(request)
+
+    bucket = bucket_for(request)
+    attempt = 0
+    response = None
+    while response is None:
+        retry_stats.record(requests=1, throttle=bucket.acquire())
+        # Every chunk is reported as a call of its own
+        measurement = instrumentation.measure(f"{operation_name(request)}[chunk]")
+        progress = request.resumable_progress
+        try:
+            status, response = request.next_chunk()
+        except Exception as e:
+            measurement.error(e)
+            measurement.finish(retries=attempt)
+            if attempt >= default_policy.max_retries:
+                raise
+            if (
+                isinstance(e, HttpError)
+                and e.resp.status in (404, 410)
+                and request.resumable_uri is not None
+            ):
+                logger.warning("Upload session has expired; starting over.")
+                _restart(request)
+            elif is_retryable(e, idempotent=True):
+                # Every step of the protocol can be repeated: after a failed chunk, the
+                # next call asks the server for the confirmed offset and resends from it
+                if request.resumable_uri is not None:
+                    _query_offset(request)
+                backoff(e, attempt, bucket)
+            else:
+                raise
+            attempt += 1
+            continue
+
+        if response is not None:
+            measurement.status = 200
+            measurement.bytes_sent = request.resumable.size() - progress
+        else:
+            # 308 is "Resume Incomplete" in the resumable upload protocol
+            measurement.status = 308
+            measurement.bytes_sent = status.resumable_progress - progress
+        measurement.finish(retries=attempt)
+        attempt = 0
+
+        if status is not None:
+            if key:
+                upload_sessions.set(
+                    key,
+                    {
+                        "uri": request.resumable_uri,
+                        "progress": status.resumable_progress,
+                        "fingerprint": fingerprint,
+                    },
+                )
+            if status.total_size:
+                logger.debug(f"Uploaded {int(status.progress() * 100)}%...")
+
+    if key:
+        upload_sessions.delete(key)
+    return response
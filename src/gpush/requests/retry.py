@@ -0,0 +1,300 @@
+import email.utils
+import json
+import logging
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from googleapiclient.errors import HttpError  # type: ignore
+from googleapiclient.http import HttpRequest  # type: ignore
+
+from .instrumentation import (
+    capture_response,
+    instrumentation,
+    operation_name,
+    request_size,
+)
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Drive and Sheets also report exceeded quotas as 403 errors with one of these reasons
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+# These methods can be sent twice without changing the outcome
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How often and how long to retry failed requests.
+
+    Delays grow exponentially from `base_delay` up to `max_delay`, with "full jitter":
+    the actual delay is drawn uniformly from zero to the exponential bound, which keeps
+    concurrent workers from retrying in lockstep.
+    """
+
+    max_retries: int = 6
+    base_delay: float = 1.0
+    max_delay: float = 64.0
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that spaces out requests to an API.
+
+    Tokens are refilled at `rate` per second up to `capacity`. When the bucket is empty,
+    `acquire` sleeps until the caller's token is available. When the server signals that
+    the quota is exhausted, `pause` holds back every caller sharing the bucket, so that
+    concurrent workers slow down together instead of each hitting the limit in turn.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Take `tokens` from the bucket, waiting if needed. Returns the time waited."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Take `tokens` from the bucket without waiting and return how long the caller must
+        wait before using them. Lets callers that cannot block, such as coroutines, wait
+        in their own way.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Tokens are reserved immediately, so waiting callers queue up in order
+            self._tokens -= tokens
+            return max(-self._tokens / self.rate, self._paused_until - now, 0.0)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class RetryStats:
+    """Counts the retries made and the time spent waiting during a run."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.throttle_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        requests: int = 0,
+        retries: int = 0,
+        backoff: float = 0.0,
+        throttle: float = 0.0,
+    ) -> None:
+        with self._lock:
+            self.requests += requests
+            self.retries += retries
+            self.backoff_seconds += backoff
+            self.throttle_seconds += throttle
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = self.retries = 0
+            self.backoff_seconds = self.throttle_seconds = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.requests} API requests, {self.retries} retries, "
+            f"{self.backoff_seconds:.1f}s backing off, "
+            f"{self.throttle_seconds:.1f}s throttled by rate limits"
+        )
+
+
+# Default per-user quotas: Drive allows 12,000 queries per minute, Sheets allows 60 read
+# and 60 write requests per minute.
+rate_limits: Dict[str, TokenBucket] = {
+    "drive": TokenBucket(rate=200, capacity=200),
+    "sheets.read": TokenBucket(rate=1, capacity=60),
+    "sheets.write": TokenBucket(rate=1, capacity=60),
+}
+
+default_policy = RetryPolicy()
+retry_stats = RetryStats()
+
+
+def configure_rate_limit(api: str, per_minute: float) -> None:
+    """Change the rate limit of an API (`drive`, `sheets.read` or `sheets.write`)."""
+    rate_limits[api] = TokenBucket(rate=per_minute / 60, capacity=per_minute)
+
+
+def bucket_for(request: HttpRequest) -> TokenBucket:
+    """Return the rate limit bucket a request counts against."""
+    method_id = getattr(request, "methodId", None) or "drive"
+    if method_id.startswith("sheets"):
+        method = getattr(request, "method", "GET")
+        return rate_limits["sheets.read" if method == "GET" else "sheets.write"]
+    return rate_limits["drive"]
+
+
+def is_idempotent(request: HttpRequest) -> bool:
+    return getattr(request, "method", "GET") in IDEMPOTENT_METHODS
+
+
+def _error_reason(error: HttpError) -> Optional[str]:
+    try:
+        details = json.loads(error.content)["error"]
+        return details.get("errors", [{}])[0].get("reason") or details.get("status")
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether an error means the request was rejected by a quota, unprocessed."""
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    return status == 429 or (
+        status == 403 and _error_reason(error) in RATE_LIMIT_REASONS
+    )
+
+
+def is_retryable(error: Exception, idempotent: bool) -> bool:
+    """
+    Whether a failed request may be sent again.
+
+    Requests rejected by a quota were never processed, so they are always safe to retry.
+    Server errors and dropped connections leave the outcome unknown, so those are only
+    retried for idempotent requests; retrying a failed `create` could otherwise produce
+    duplicate files.
+    """
+    if is_rate_limited(error):
+        return True
+    if not idempotent:
+        return False
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES
+    return isinstance(error, (ConnectionError, socket.timeout, TimeoutError)) or (
+        type(error).__module__.startswith("httplib2")
+    )
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Read the delay requested by the server's `Retry-After` header, if any."""
+    if not isinstance(error, HttpError):
+        return None
+    value = error.resp.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0.0)
+
+
+def backoff(
+    error: Exception,
+    attempt: int,
+    bucket: TokenBucket,
+    policy: RetryPolicy = default_policy,
+    retries: int = 1,
+) -> None:
+    """
+    Wait before retry number `attempt + 1` of `retries` requests that failed with `error`.
+    """
+    time.sleep(backoff_delay(error, attempt, bucket, policy, retries))
+
+
+def backoff_delay(
+    error: Exception,
+    attempt: int,
+    bucket: TokenBucket,
+    policy: RetryPolicy = default_policy,
+    retries: int = 1,
+) -> float:
+    """
+    Like `backoff`, but return the delay instead of sleeping, so the caller can wait in
+    its own way.
+    """
+    delay = retry_after(error)
+    if delay is None:
+        delay = policy.delay(attempt)
+    if is_rate_limited(error):
+        bucket.pause(delay)
+
+    logger.debug(f"Retrying in {delay:.1f}s after error: {error}")
+    retry_stats.record(retries=retries, backoff=delay)
+    return delay
+
+
+def execute(
+    request: HttpRequest,
+    idempotent: Optional[bool] = None,
+    policy: RetryPolicy = default_policy,
+) -> Any:
+    """
+    Execute an API request, retrying it with exponential backoff when that is safe.
+
+    The request first takes a token from the rate limit bucket of its API (see
+    `rate_limits`), and the call is reported to the observers of `instrumentation`.
+    Failed requests are retried as described in `is_retryable`, waiting as long as the
+    server's `Retry-After` header asks, or an exponentially growing, jittered delay
+    otherwise.
+
+    Args:
+        request (HttpRequest): The API request to execute.
+        idempotent (bool, optional): Whether the request may safely be sent twice.
+                                     Defaults to a guess based on the HTTP method.
+        policy (RetryPolicy, optional): The retry policy to apply.
+
+    Returns:
+        Any: The deserialized response of the request.
+    """
+    if idempotent is None:
+        idempotent = is_idempotent(request)
+    bucket = bucket_for(request)
+
+    measurement = instrumentation.measure(operation_name(request))
+    capture_response(request, measurement)
+
+    attempt = 0
+    while True:
+        retry_stats.record(requests=1, throttle=bucket.acquire())
+        if measurement.active:
+            measurement.bytes_sent += request_size(request)
+        measurement.status = None
+        try:
+            result = request.execute()
+        except Exception as e:
+            measurement.error(e)
+            if attempt >= policy.max_retries or not is_retryable(e, idempotent):
+                measurement.finish(retries=attempt)
+                raise
+            backoff(e, attempt, bucket, policy)
+            attempt += 1
+        else:
+            # Requests without a postproc hook report no status; they succeeded
+            measurement.status = measurement.status or 200
+            measurement.finish(retries=attempt)
+            return result
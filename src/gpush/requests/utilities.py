@@ -1,3 +1,4 @@
+import inspect
 from functools import wraps
 from typing import Any, Callable
 
@@ -9,6 +10,17 @@ class GoogleApiAccessError(Exception):
 
 
 def error_handler(func: Callable[..., Any]) -> Callable[..., Any]:
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                raise GoogleApiAccessError(f"An error occurred in {func.__name__}: {e}")
+
+        return async_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         try:
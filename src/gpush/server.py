@@ -0,0 +1,168 @@
+"""
+A local push server: `gpush serve`.
+
+Short-lived `gpush` calls each pay for starting Python, authenticating, building the API
+clients and listing the folders they upload into. A `PushServer` pays for all of that
+once: it listens on a Unix socket, and runs the uploads handed to it by `gpush --server`
+(see `gpush.client`) on one set of warm API clients, connection pool and folder and
+spreadsheet caches.
+"""
+
+import datetime
+import os
+import socket
+import socketserver
+import threading
+import time
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from google.auth.transport.requests import Request  # type: ignore
+
+from gpush import logger
+from gpush.auth.services import Services, ThreadLocalServices
+from gpush.checksums import local_hashes, remote_hashes
+from gpush.client import PROTOCOL_VERSION, ServerError, encode_message, read_message
+from gpush.handlers.caches import expire_listings, forget_listings
+from gpush.handlers.upload import FileDetails, upload_file
+
+DEFAULT_JOBS = 4
+# Access tokens are refreshed this long before they expire, so no upload waits for one
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+TOKEN_CHECK_INTERVAL = 60.0
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "PushServer"
+
+    def handle(self) -> None:
+        try:
+            request = read_message(self.rfile)
+        except ServerError as e:
+            response: Dict[str, Any] = {"ok": False, "error": str(e)}
+        else:
+            response = self.server.run(request)
+        try:
+            self.wfile.write(encode_message(response))
+        except OSError:
+            # The client gave up waiting
+            pass
+
+
+class PushServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Runs uploads submitted over a Unix socket, at most `jobs` at a time.
+
+    Every connection carries one upload: a JSON request with the command line options
+    of the upload and the target folder, answered with a JSON response once it is done.
+    Uploads run on a pool of `jobs` workers sharing `services`, so their connections,
+    discovery documents and folder listings (see `folder_index`) are reused. As Drive
+    may change behind the server's back, listings older than `LISTING_MAX_AGE` are
+    fetched again before an upload, and the listing of an upload's folder is dropped if
+    the upload fails.
+
+    The socket is only accessible by the user running the server, since whoever can
+    connect uploads with the server's credentials.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path: str,
+        services: Services,
+        folder_id: Optional[str] = None,
+        jobs: int = DEFAULT_JOBS,
+    ) -> None:
+        _remove_stale_socket(socket_path)
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _Handler)
+        finally:
+            os.umask(umask)
+        self.socket_path = socket_path
+        self.services = services
+        self.folder_id = folder_id
+        self.pool = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="gpush-job")
+        self._thread_services = ThreadLocalServices(services)
+        self._stopped = threading.Event()
+
+    def run(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one upload request on the worker pool and return the response."""
+        if request.get("version") != PROTOCOL_VERSION:
+            return {"ok": False, "error": "Unsupported protocol version."}
+        folder_id = request.get("folder_id") or self.folder_id
+        if folder_id is None:
+            return {"ok": False, "error": "No folder ID given, and FOLDER_ID is unset."}
+        try:
+            file = FileDetails.from_args(Namespace(**request.get("args", {})))
+        except (TypeError, ValueError, AttributeError) as e:
+            return {"ok": False, "error": f"Invalid upload options: {e}"}
+
+        return self.pool.submit(self._upload, folder_id, file).result()
+
+    def _upload(self, folder_id: str, file: FileDetails) -> Dict[str, Any]:
+        logger.info(f"Uploading {file.path} as {file.name}...")
+        start = time.monotonic()
+        expire_listings()
+        try:
+            upload_file(self._thread_services.get(), folder_id, file)
+        except Exception as e:
+            logger.error(f"Could not upload {file.path}: {e}")
+            # Drive may have changed under us; list the target folder again next time
+            forget_listings(folder_id)
+            return {"ok": False, "error": str(e)}
+        finally:
+            local_hashes.save()
+            remote_hashes.save()
+        seconds = time.monotonic() - start
+        logger.info(f"Uploaded {file.path} in {seconds:.2f}s.")
+        return {"ok": True, "seconds": seconds}
+
+    def _refresh_credentials(self) -> None:
+        credentials = self.services.credentials
+        while not self._stopped.wait(TOKEN_CHECK_INTERVAL):
+            expiry = getattr(credentials, "expiry", None)
+            # google-auth keeps expiry times as naive UTC datetimes
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            if expiry is not None and expiry - now > TOKEN_REFRESH_MARGIN:
+                continue
+            try:
+                credentials.refresh(Request())
+                logger.debug("Refreshed the access token.")
+            except Exception as e:
+                # Requests refresh the token themselves if they have to
+                logger.warning(f"Could not refresh the access token: {e}")
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        self.services.warm()
+        threading.Thread(
+            target=self._refresh_credentials, name="gpush-token", daemon=True
+        ).start()
+        logger.info(f"Listening on {self.socket_path}.")
+        super().serve_forever(poll_interval)
+
+    def server_close(self) -> None:
+        self._stopped.set()
+        super().server_close()
+        self.pool.shutdown(wait=True)
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_socket(path: str) -> None:
+    """Remove the socket of a server that is gone; refuse to replace a live one."""
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+        except OSError as e:
+            raise ServerError(f"{path} exists and is not a push server: {e}") from None
+    raise ServerError(f"A push server is already listening on {path}.")
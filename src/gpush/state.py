@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set
+
+from gpush import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+
+
+def state_dir() -> str:
+    """
+    Return the directory where gpush keeps its local state, creating it if needed.
+
+    The location can be overridden with the GPUSH_STATE_DIR environment variable and
+    otherwise follows the XDG cache directory convention (``~/.cache/gpush``).
+    """
+    path = os.getenv("GPUSH_STATE_DIR")
+    if not path:
+        cache_home = os.getenv("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache"
+        )
+        path = os.path.join(cache_home, "gpush")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class JsonStateFile:
+    """
+    A small JSON object persisted in the gpush state directory.
+
+    The file is loaded lazily on first access and rewritten atomically on every change,
+    so a crash never leaves a half-written file behind. Several gpush processes can
+    share a state file: a save re-reads the file under an exclusive lock and only
+    applies the keys this process changed, so no process drops the entries of another.
+    All methods are thread-safe.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self._data: Optional[Dict[str, Any]] = None
+        # The keys set or deleted since the last save
+        self._changed: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(state_dir(), self.filename)
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable state file {self.path}: {e}")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = self._read()
+        return self._data
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold an exclusive lock on the state file across processes, where possible."""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _save(self) -> None:
+        if self._data is None or not self._changed:
+            return
+        directory = os.path.dirname(self.path)
+        with self._file_lock():
+            # Merge the changes of this process into what other processes saved
+            data = self._read()
+            for key in self._changed:
+                if key in self._data:
+                    data[key] = self._data[key]
+                else:
+                    data.pop(key, None)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{self.filename}.")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        self._data = data
+        self._changed.clear()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            return self._load().get(key)
+
+    def set(self, key: str, value: Any, save: bool = True) -> None:
+        """Store a value. With `save=False` the change is only written by `save()`."""
+        with self._lock:
+            self._load()[key] = value
+            self._changed.add(key)
+            if save:
+                self._save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                self._changed.add(key)
+                self._save()
@@ -0,0 +1,311 @@
+"""
+Continuous push of a directory: `gpush watch <dir>`.
+
+A `DirectoryWatch` keeps one authenticated `Services` instance and the shared folder
+listings (see `folder_index`) while it runs, so that pushing a few changed files costs
+only the requests that actually upload them. Listings older than `LISTING_MAX_AGE` are
+fetched again before a push, so changes made on Drive by others are picked up. Changes
+are detected with inotify on Linux (see `InotifyWatcher`), or by comparing `os.stat`
+snapshots of the tree otherwise (see `PollingWatcher`).
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+from dataclasses import replace
+from typing import Dict, Iterator, Optional, Set, Tuple, Union
+
+from gpush import logger
+from gpush.auth.services import Services
+from gpush.checksums import local_hashes
+from gpush.handlers.caches import expire_listings, forget_listings
+from gpush.handlers.plan import execute_plan, make_plan, plan_paths
+from gpush.handlers.upload import FileDetails
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+# Changes are pushed at the latest this long after the first one, even if writes go on
+MAX_BATCH_DELAY = 30.0
+# How long to wait before pushing files again whose push failed, and how often to try
+RETRY_DELAY = 30.0
+MAX_ATTEMPTS = 5
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")
+EVENT_BUFFER_SIZE = 64 * 1024
+
+
+def walk_files(root: str) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield the path and `os.stat` result of every regular file below `root`."""
+    try:
+        entries = list(os.scandir(root))
+    except (FileNotFoundError, NotADirectoryError):
+        # Removed while we were looking
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                yield from walk_files(entry.path)
+            elif entry.is_file():
+                yield entry.path, entry.stat()
+        except FileNotFoundError:
+            continue
+
+
+class PollingWatcher:
+    """
+    Detects changed files by comparing snapshots of the size and modification time of
+    every file in the tree, taken every `interval` seconds.
+    """
+
+    def __init__(self, root: str, interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        self.root = root
+        self.interval = interval
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        return {
+            path: (stat.st_size, stat.st_mtime_ns)
+            for path, stat in walk_files(self.root)
+        }
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Wait up to `timeout` seconds (or one interval), then return changed files."""
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        snapshot = self._take_snapshot()
+        changed = {
+            path
+            for path, state in snapshot.items()
+            if self._snapshot.get(path) != state
+        }
+        self._snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Detects changed files with the Linux inotify API, through `ctypes`.
+
+    Every directory of the tree is watched for files that were closed after writing or
+    moved in, and for new directories, which are watched in turn. Files that appear in a
+    new directory before its watch is added are found by scanning it. If the kernel's
+    event queue overflows, the whole tree is reported as changed.
+
+    Raises:
+        OSError: If inotify is unavailable, or the tree has more directories than
+                 `fs.inotify.max_user_watches` allows.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        library = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available on this system")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            self._raise_errno("inotify_init1")
+        self._directories: Dict[int, str] = {}
+        try:
+            self._watch_tree(root)
+        except BaseException:
+            self.close()
+            raise
+
+    def _raise_errno(self, function: str, path: str = "") -> None:
+        code = ctypes.get_errno()
+        raise OSError(code, f"{function} failed: {os.strerror(code)}", path)
+
+    def _watch(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR):
+                # Removed in the meantime
+                return
+            self._raise_errno("inotify_add_watch", path)
+        self._directories[wd] = path
+
+    def _watch_tree(self, root: str) -> None:
+        self._watch(root)
+        for dirpath, dirnames, _ in os.walk(root):
+            for dirname in dirnames:
+                self._watch(os.path.join(dirpath, dirname))
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Wait up to `timeout` seconds (forever if None) and return changed files."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed: Set[str] = set()
+        while True:
+            try:
+                data = os.read(self._fd, EVENT_BUFFER_SIZE)
+            except BlockingIOError:
+                return changed
+            changed |= self._parse(data)
+
+    def _parse(self, data: bytes) -> Set[str]:
+        changed: Set[str] = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("Missed file system events; checking the whole tree.")
+                changed.update(path for path, _ in walk_files(self.root))
+                continue
+            if mask & IN_IGNORED:
+                self._directories.pop(wd, None)
+                continue
+            directory = self._directories.get(wd)
+            if directory is None:
+                continue
+
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._watch_tree(path)
+                    except OSError as e:
+                        logger.warning(f"Cannot watch {path}: {e}")
+                    changed.update(new for new, _ in walk_files(path))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+Watcher = Union[InotifyWatcher, PollingWatcher]
+
+
+class DirectoryWatch:
+    """
+    Pushes the changes of a directory tree to Drive, as they happen.
+
+    The tree is first pushed in full with `file.sync` set, which uploads whatever
+    changed while nobody was watching and warms the folder listings. From then on,
+    changed files are collected until no file has changed for `debounce` seconds (or
+    for at most `MAX_BATCH_DELAY` seconds after the first change), and the whole batch
+    is planned (see `plan_paths`) and executed through the upload handlers. Bursts of
+    writes to a file are thus pushed once, and unchanged files are skipped.
+
+    Files whose push failed are tried again with the next batch, at the earliest
+    `RETRY_DELAY` seconds later, and dropped after `MAX_ATTEMPTS` failed pushes until
+    they change again.
+    """
+
+    def __init__(
+        self,
+        services: Services,
+        folder_id: str,
+        file: FileDetails,
+        debounce: float = DEFAULT_DEBOUNCE,
+        poll_interval: Optional[float] = None,
+    ) -> None:
+        self.services = services
+        self.folder_id = folder_id
+        self.file = replace(file, path=os.path.abspath(file.path), sync=True)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+
+    def _watcher(self) -> Watcher:
+        if self.poll_interval is None:
+            try:
+                return InotifyWatcher(self.file.path)
+            except OSError as e:
+                logger.warning(f"Cannot use inotify ({e}); polling for changes.")
+        return PollingWatcher(
+            self.file.path, self.poll_interval or DEFAULT_POLL_INTERVAL
+        )
+
+    def push(self, paths: Set[str]) -> bool:
+        """Push changed files; return whether all of them were pushed."""
+        # Files may be gone again, e.g. temporary files that were renamed
+        files = {path for path in paths if os.path.isfile(path)}
+        if not files:
+            return True
+        try:
+            expire_listings()
+            plan = plan_paths(self.services, self.folder_id, self.file, files)
+            logger.info(f"Pushing {len(files)} changed file(s): {plan.summary()}.")
+            execute_plan(self.services, plan)
+        except Exception as e:
+            logger.error(f"Could not push {len(files)} file(s): {e}")
+            # Drive may have changed under us; list the folders again next time
+            forget_listings()
+            return False
+        finally:
+            local_hashes.save()
+        return True
+
+    def run(self) -> None:
+        """Push the tree, then push its changes until interrupted."""
+        watcher = self._watcher()
+        try:
+            logger.info(f"Pushing {self.file.path} before watching it...")
+            execute_plan(
+                self.services, make_plan(self.services, self.folder_id, self.file)
+            )
+            local_hashes.save()
+            logger.info(f"Watching {self.file.path} for changes.")
+            self._loop(watcher)
+        finally:
+            watcher.close()
+
+    def _loop(self, watcher: Watcher) -> None:
+        pending: Set[str] = set()
+        first_change = last_change = not_before = 0.0
+        failures = 0
+
+        while True:
+            timeout = None
+            if pending:
+                due = min(last_change + self.debounce, first_change + MAX_BATCH_DELAY)
+                timeout = max(max(due, not_before) - time.monotonic(), 0.0)
+
+            changed = watcher.wait(timeout)
+            now = time.monotonic()
+            if changed:
+                if not pending:
+                    first_change = now
+                pending |= changed
+                last_change = now
+
+            if not pending:
+                continue
+            due = min(last_change + self.debounce, first_change + MAX_BATCH_DELAY)
+            if now < max(due, not_before):
+                continue
+
+            if self.push(pending):
+                pending, failures = set(), 0
+                continue
+            failures += 1
+            if failures >= MAX_ATTEMPTS:
+                logger.error(f"Giving up on {len(pending)} file(s) until they change.")
+                pending, failures = set(), 0
+                continue
+            not_before = now + RETRY_DELAY
@@ -0,0 +1,50 @@
+"""
+Fixtures of the test suite.
+
+Tests that talk to the Google APIs run against the local stand-in in
+``benchmarks/fake_google.py``, started once per session in a child process.
+"""
+
+import os
+import sys
+from typing import Any, Iterator
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks"))
+
+from fake_google import FakeGoogleProcess, local_services  # noqa: E402
+
+from gpush.auth.services import Services  # noqa: E402
+from gpush.requests.gdrive import create_drive_folder, folder_index  # noqa: E402
+from gpush.requests.gsheets import forget_sessions  # noqa: E402
+from gpush.requests.retry import configure_rate_limit  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path: Any, monkeypatch: Any) -> str:
+    """Keep the state files of every test (sessions, checksums, journal) apart."""
+    path = str(tmp_path / "state")
+    monkeypatch.setenv("GPUSH_STATE_DIR", path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def google() -> Iterator[FakeGoogleProcess]:
+    with FakeGoogleProcess(latency=0.0) as google:
+        yield google
+
+
+@pytest.fixture
+def services(google: FakeGoogleProcess) -> Iterator[Services]:
+    for api in ("drive", "sheets.read", "sheets.write"):
+        configure_rate_limit(api, 1_000_000_000)
+    yield local_services(google.url)
+    folder_index.invalidate()
+    forget_sessions()
+
+
+@pytest.fixture
+def folder(services: Services, request: Any) -> str:
+    """A new, empty Drive folder for the test to push into."""
+    return create_drive_folder(services.drive, request.node.name, "root")
@@ -0,0 +1,87 @@
+import io
+import os
+import tarfile
+from typing import Any, Dict
+
+from fake_google import FakeGoogleProcess
+
+from gpush.auth.services import Services
+from gpush.cli import build_parser
+from gpush.handlers.archive import ARCHIVE_PROPERTY, VOLUMES_PROPERTY
+from gpush.handlers.upload import FileDetails, upload_file
+from gpush.requests.gdrive import download_range, folder_index, list_folder
+
+# About 12 KiB, so that every volume holds one or two of the files below
+VOLUME_SIZE = "0.012"
+
+
+def make_tree(root: Any, count: int) -> Dict[str, bytes]:
+    root.mkdir(exist_ok=True)
+    for path in root.iterdir():
+        path.unlink()
+    contents = {}
+    for number in range(count):
+        data = os.urandom(8 * 1024)
+        (root / f"{number}.bin").write_bytes(data)
+        contents[f"tree/{number}.bin"] = data
+    return contents
+
+
+def push(services: Services, folder_id: str, root: Any) -> None:
+    args = build_parser().parse_args(
+        [str(root), "--archive", "tar", "--volume-size", VOLUME_SIZE, "--sync"]
+    )
+    upload_file(services, folder_id, FileDetails.from_args(args))
+    folder_index.invalidate(folder_id)
+
+
+def unpack(services: Services, folder_id: str) -> Dict[str, bytes]:
+    """Unpack the volumes in the folder, in order, into a name -> content map."""
+    contents = {}
+    listing = list_folder(services.drive, folder_id)
+    for name in sorted(listing):
+        remote_file = listing[name]
+        data = download_range(services.drive, remote_file.id, 0, remote_file.size - 1)
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            for member in tar.getmembers():
+                if member.isfile():
+                    extracted = tar.extractfile(member)
+                    assert extracted is not None
+                    contents[member.name] = extracted.read()
+    return contents
+
+
+def test_a_tree_is_split_into_complete_volumes(
+    services: Services, folder: str, tmp_path: Any
+) -> None:
+    contents = make_tree(tmp_path / "tree", 4)
+    push(services, folder, tmp_path / "tree")
+
+    listing = list_folder(services.drive, folder)
+    assert len(listing) > 1
+    assert all(name.startswith("tree.part") for name in listing)
+    first = listing["tree.part001.tar"]
+    assert first.app_properties[VOLUMES_PROPERTY] == str(len(listing))
+    assert ARCHIVE_PROPERTY in first.app_properties
+    assert unpack(services, folder) == contents
+
+
+def test_sync_skips_unchanged_trees_and_trashes_leftover_volumes(
+    google: FakeGoogleProcess, services: Services, folder: str, tmp_path: Any
+) -> None:
+    make_tree(tmp_path / "tree", 4)
+    push(services, folder, tmp_path / "tree")
+    volumes = len(list_folder(services.drive, folder))
+
+    before = google.stats()["calls"].get("drive.files[chunk]", 0)
+    push(services, folder, tmp_path / "tree")
+    assert google.stats()["calls"].get("drive.files[chunk]", 0) == before
+
+    contents = make_tree(tmp_path / "tree", 1)
+    push(services, folder, tmp_path / "tree")
+    listing = list_folder(services.drive, folder)
+    assert len(listing) < volumes
+    assert listing["tree.part001.tar"].app_properties[VOLUMES_PROPERTY] == str(
+        len(listing)
+    )
+    assert unpack(services, folder) == contents
@@ -0,0 +1,60 @@
+import pytest
+from fake_google import FakeGoogleProcess
+
+from gpush.auth.services import Services
+from gpush.requests.batch import DriveBatch
+from gpush.requests.gdrive import (
+    create_drive_folders,
+    create_google_sheets,
+    folder_index,
+    list_folders,
+)
+from gpush.requests.utilities import GoogleApiAccessError
+
+
+def test_calls_are_sent_in_one_request_and_answered_in_order(
+    google: FakeGoogleProcess, services: Services, folder: str
+) -> None:
+    files = services.drive.files()
+    before = google.stats()["requests"]
+    with DriveBatch(services.drive) as batch:
+        futures = [
+            batch.add(files.create(body={"name": f"f{i}", "parents": [folder]}))
+            for i in range(5)
+        ]
+
+    assert google.stats()["requests"] - before == 1
+    assert [future.result()["name"] for future in futures] == [
+        f"f{i}" for i in range(5)
+    ]
+
+
+def test_a_failed_call_fails_only_its_own_future(
+    services: Services, folder: str
+) -> None:
+    files = services.drive.files()
+    with DriveBatch(services.drive) as batch:
+        found = batch.add(files.get(fileId=folder))
+        missing = batch.add(files.get(fileId="missing"))
+
+    assert found.result()["id"] == folder
+    with pytest.raises(GoogleApiAccessError, match="drive.files.get"):
+        missing.result()
+
+
+def test_folders_listed_twice_are_created_once(services: Services, folder: str) -> None:
+    ids = create_drive_folders(
+        services.drive, [("a", folder), ("b", folder), ("a", folder)]
+    )
+
+    assert ids[0] == ids[2] != ids[1]
+    folder_index.invalidate()
+    entries = list_folders(services.drive, [folder])[folder]
+    assert sorted(entry.name for entry in entries) == ["a", "b"]
+
+
+def test_sheets_listed_twice_are_created_once(services: Services, folder: str) -> None:
+    ids = create_google_sheets(services.drive, [(folder, "s"), (folder, "s")])
+
+    assert ids[0] == ids[1]
+    assert len(list_folders(services.drive, [folder])[folder]) == 1
@@ -0,0 +1,35 @@
+import io
+
+import pytest
+
+from gpush.client import MAX_MESSAGE_SIZE, ServerError, encode_message, read_message
+
+
+def test_messages_round_trip() -> None:
+    stream = io.BytesIO(encode_message({"ok": True}) + encode_message({"ok": False}))
+    assert read_message(stream) == {"ok": True}
+    assert read_message(stream) == {"ok": False}
+
+
+def test_a_message_at_the_size_limit_is_read() -> None:
+    padding = "x" * (MAX_MESSAGE_SIZE - len('{"p": ""}\n'))
+    assert read_message(io.BytesIO(encode_message({"p": padding}))) == {"p": padding}
+
+
+def test_oversized_messages_are_rejected() -> None:
+    padding = "x" * MAX_MESSAGE_SIZE
+    with pytest.raises(ServerError, match="too large"):
+        read_message(io.BytesIO(encode_message({"p": padding})))
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        (b"", "closed without a message"),
+        (b"{not json\n", "not valid JSON"),
+        (b"[1, 2]\n", "not a JSON object"),
+    ],
+)
+def test_malformed_messages_are_rejected(data: bytes, message: str) -> None:
+    with pytest.raises(ServerError, match=message):
+        read_message(io.BytesIO(data))
@@ -0,0 +1,81 @@
+import os
+from typing import Any, Dict
+
+from fake_google import FakeGoogleProcess
+
+from gpush.auth.services import Services
+from gpush.cli import build_parser
+from gpush.handlers.upload import FileDetails, upload_file
+from gpush.requests.gdrive import create_drive_folder, list_folder
+
+OPERATIONS = ("drive.files.copy", "drive.files.create[upload]")
+CHUNK = 256 * 1024
+
+
+def push(
+    google: FakeGoogleProcess,
+    services: Services,
+    folder_id: str,
+    path: Any,
+    *options: str
+) -> Dict[str, int]:
+    """Push the file at `path` and return the number of copies and uploads it made."""
+    args = build_parser().parse_args([str(path), "--chunk-size", "0.25", *options])
+    before = google.stats()["calls"]
+    upload_file(services, folder_id, FileDetails.from_args(args))
+    calls = google.stats()["calls"]
+    return {op: calls.get(op, 0) - before.get(op, 0) for op in OPERATIONS}
+
+
+def test_content_pushed_before_is_copied(
+    google: FakeGoogleProcess, services: Services, folder: str, tmp_path: Any
+) -> None:
+    path = tmp_path / "model.bin"
+    path.write_bytes(os.urandom(2 * CHUNK))
+    first = create_drive_folder(services.drive, "first", folder)
+    second = create_drive_folder(services.drive, "second", folder)
+
+    assert push(google, services, first, path, "--dedup") == {
+        "drive.files.copy": 0,
+        "drive.files.create[upload]": 1,
+    }
+    assert push(google, services, second, path, "--dedup") == {
+        "drive.files.copy": 1,
+        "drive.files.create[upload]": 0,
+    }
+    copy = list_folder(services.drive, second)["model.bin"]
+    assert (
+        copy.md5_checksum
+        == list_folder(services.drive, first)["model.bin"].md5_checksum
+    )
+
+
+def test_content_of_listed_folders_is_copied(
+    google: FakeGoogleProcess, services: Services, folder: str, tmp_path: Any
+) -> None:
+    path = tmp_path / "model.bin"
+    path.write_bytes(os.urandom(2 * CHUNK))
+    first = create_drive_folder(services.drive, "first", folder)
+    second = create_drive_folder(services.drive, "second", folder)
+    # Uploaded without --dedup, so only the listing of the folder knows its checksum
+    push(google, services, first, path)
+
+    assert push(google, services, second, path, "--dedup") == {
+        "drive.files.copy": 1,
+        "drive.files.create[upload]": 0,
+    }
+
+
+def test_files_of_one_chunk_are_uploaded(
+    google: FakeGoogleProcess, services: Services, folder: str, tmp_path: Any
+) -> None:
+    path = tmp_path / "small.bin"
+    path.write_bytes(os.urandom(CHUNK))
+    first = create_drive_folder(services.drive, "first", folder)
+    second = create_drive_folder(services.drive, "second", folder)
+
+    push(google, services, first, path, "--dedup")
+    assert push(google, services, second, path, "--dedup") == {
+        "drive.files.copy": 0,
+        "drive.files.create[upload]": 1,
+    }
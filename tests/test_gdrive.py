@@ -0,0 +1,48 @@
+import time
+
+from gpush.auth.services import Services
+from gpush.handlers.caches import forget_listings
+from gpush.requests.gdrive import (
+    SPREADSHEET_MIME_TYPE,
+    create_drive_folder,
+    create_google_sheet,
+    find_file,
+    folder_index,
+    list_folder,
+)
+from gpush.requests.gsheets import spreadsheet_session
+
+
+def test_find_file_skips_entries_of_another_type(services: Services) -> None:
+    parent = create_drive_folder(services.drive, "typed", "root")
+    folder_id = create_drive_folder(services.drive, "it's", parent)
+    sheet_id = create_google_sheet(services.drive, parent, "it's")
+    folder_index.invalidate()
+
+    # The listing keeps the folder for the name
+    assert find_file(services.drive, parent, "it's") == folder_id
+    assert find_file(services.drive, parent, "it's", SPREADSHEET_MIME_TYPE) == sheet_id
+    assert find_file(services.drive, parent, "missing", SPREADSHEET_MIME_TYPE) is None
+
+
+def test_expire_drops_old_listings_only(services: Services) -> None:
+    # New folders are known to be empty, so they count as listed when created
+    old = create_drive_folder(services.drive, "old", "root")
+    time.sleep(0.2)
+    new = create_drive_folder(services.drive, "new", "root")
+    list_folder(services.drive, new)
+
+    folder_index.expire(0.1)
+    assert not folder_index.is_loaded(old)
+    assert folder_index.is_loaded(new)
+
+
+def test_forget_listings_drops_the_sessions_of_the_folder(services: Services) -> None:
+    folder_id = create_drive_folder(services.drive, "sessions", "root")
+    sheet_id = create_google_sheet(services.drive, folder_id, "sheet")
+    list_folder(services.drive, folder_id)
+    session = spreadsheet_session(services.sheets, sheet_id)
+
+    forget_listings(folder_id)
+    assert not folder_index.is_loaded(folder_id)
+    assert spreadsheet_session(services.sheets, sheet_id) is not session
@@ -0,0 +1,35 @@
+from typing import Any, List
+
+import pytest
+
+from gpush.auth.services import Services
+from gpush.requests.gdrive import create_google_sheet
+from gpush.requests.gsheets import (
+    read_rows,
+    spreadsheet_session,
+    upload_data_to_spreadsheet,
+)
+
+
+def sheet_with(services: Services, rows: List[List[Any]]) -> Any:
+    spreadsheet_id = create_google_sheet(services.drive, "root", "rows")
+    upload_data_to_spreadsheet(services.sheets, spreadsheet_id, "rows", rows, "Data")
+    session = spreadsheet_session(services.sheets, spreadsheet_id)
+    session.reset()
+    return spreadsheet_id, session.sheets["Data"]
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 100])
+def test_gaps_are_kept_and_trailing_blank_rows_dropped(
+    services: Services, block_size: int
+) -> None:
+    rows = [["a", "1"], [], [], ["b"], [], [], [], ["c", "3"], [], []]
+    spreadsheet_id, sheet = sheet_with(services, rows)
+
+    read = list(read_rows(services.sheets, spreadsheet_id, sheet, block_size))
+    assert read == rows[:8]
+
+
+def test_an_empty_sheet_has_no_rows(services: Services) -> None:
+    spreadsheet_id, sheet = sheet_with(services, [[], []])
+    assert list(read_rows(services.sheets, spreadsheet_id, sheet, 1)) == []
@@ -0,0 +1,85 @@
+import csv
+from typing import Any, Dict, List
+
+from fake_google import FakeGoogleProcess
+
+from gpush.auth.services import Services
+from gpush.cli import build_parser
+from gpush.handlers.upload import FileDetails, upload_file
+from gpush.requests.gdrive import SPREADSHEET_MIME_TYPE, find_file
+from gpush.requests.gsheets import (
+    create_missing_sheets,
+    list_sheets,
+    read_rows,
+    spreadsheet_session,
+)
+
+OPERATIONS = ("drive.files.create[upload]", "drive.files.update[upload]")
+ROWS = [["id", "name"], ["1", "ada"], ["2", "bob"]]
+
+
+def push(
+    google: FakeGoogleProcess, services: Services, folder_id: str, path: Any, mode: str
+) -> Dict[str, int]:
+    """Push the CSV at `path` and return the number of media uploads it made."""
+    args = build_parser().parse_args(
+        [str(path), "--sheet", "Data", "--import-mode", mode]
+    )
+    before = google.stats()["calls"]
+    upload_file(services, folder_id, FileDetails.from_args(args))
+    calls = google.stats()["calls"]
+    return {op: calls.get(op, 0) - before.get(op, 0) for op in OPERATIONS}
+
+
+def write_csv(path: Any, rows: List[List[str]]) -> Any:
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows(rows)
+    return path
+
+
+def spreadsheet(services: Services, folder_id: str, name: str) -> str:
+    spreadsheet_id = find_file(services.drive, folder_id, name, SPREADSHEET_MIME_TYPE)
+    assert spreadsheet_id is not None
+    spreadsheet_session(services.sheets, spreadsheet_id).reset()
+    return spreadsheet_id
+
+
+def test_an_imported_csv_is_converted_by_drive(
+    google: FakeGoogleProcess, services: Services, folder: str, tmp_path: Any
+) -> None:
+    path = write_csv(tmp_path / "people.csv", ROWS)
+
+    assert push(google, services, folder, path, "always") == {
+        "drive.files.create[upload]": 1,
+        "drive.files.update[upload]": 0,
+    }
+    # Importing again replaces the media of the same spreadsheet
+    write_csv(path, ROWS[:2])
+    assert push(google, services, folder, path, "always") == {
+        "drive.files.create[upload]": 0,
+        "drive.files.update[upload]": 1,
+    }
+
+    spreadsheet_id = spreadsheet(services, folder, "people.csv")
+    assert list_sheets(services.sheets, spreadsheet_id) == ["Data"]
+    sheet = spreadsheet_session(services.sheets, spreadsheet_id).sheets["Data"]
+    rows = list(read_rows(services.sheets, spreadsheet_id, sheet))
+    assert [[str(value) for value in row] for row in rows] == ROWS[:2]
+
+
+def test_auto_mode_keeps_the_other_sheets_of_a_spreadsheet(
+    google: FakeGoogleProcess, services: Services, folder: str, tmp_path: Any
+) -> None:
+    path = write_csv(tmp_path / "people.csv", ROWS)
+    push(google, services, folder, path, "never")
+    spreadsheet_id = spreadsheet(services, folder, "people.csv")
+    create_missing_sheets(services.sheets, spreadsheet_id, ["Notes"])
+
+    # Even a threshold of zero does not let an import wipe the "Notes" sheet
+    args = build_parser().parse_args(
+        [str(path), "--sheet", "Data", "--import-threshold", "0"]
+    )
+    upload_file(services, folder, FileDetails.from_args(args))
+
+    spreadsheet_id = spreadsheet(services, folder, "people.csv")
+    assert "Notes" in list_sheets(services.sheets, spreadsheet_id)
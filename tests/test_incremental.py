@@ -0,0 +1,74 @@
+import csv
+from typing import Any, Dict, List
+
+from fake_google import FakeGoogleProcess
+
+from gpush.auth.services import Services
+from gpush.cli import build_parser
+from gpush.handlers.upload import FileDetails, upload_file
+from gpush.requests.gdrive import SPREADSHEET_MIME_TYPE, find_file
+from gpush.requests.gsheets import read_rows, spreadsheet_session
+
+OPERATIONS = ("sheets.values.append", "sheets.values.batchUpdate")
+
+
+def push(
+    google: FakeGoogleProcess,
+    services: Services,
+    folder_id: str,
+    path: Any,
+    rows: List[List[str]],
+    *options: str,
+) -> Dict[str, int]:
+    """Push `rows` as a CSV and return the number of appends and targeted updates."""
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows(rows)
+    args = build_parser().parse_args([str(path), "--sheet", "Data", *options])
+    before = google.stats()["calls"]
+    upload_file(services, folder_id, FileDetails.from_args(args))
+    calls = google.stats()["calls"]
+    return {op: calls.get(op, 0) - before.get(op, 0) for op in OPERATIONS}
+
+
+def sheet_rows(services: Services, folder_id: str, name: str) -> List[List[Any]]:
+    spreadsheet_id = find_file(services.drive, folder_id, name, SPREADSHEET_MIME_TYPE)
+    assert spreadsheet_id is not None
+    session = spreadsheet_session(services.sheets, spreadsheet_id)
+    session.reset()
+    return list(read_rows(services.sheets, spreadsheet_id, session.sheets["Data"]))
+
+
+def test_upsert_updates_rows_by_key_and_appends_new_ones(
+    google: FakeGoogleProcess, services: Services, folder: str, tmp_path: Any
+) -> None:
+    path = tmp_path / "people.csv"
+    rows = [["id", "name"], ["1", "ada"], ["2", "bob"], ["3", "cy"]]
+    push(google, services, folder, path, rows, "--upsert", "id")
+
+    # Reordered locally: rows keep their place in the sheet, matched by their key
+    changed = [["id", "name"], ["3", "cy"], ["4", "dee"], ["2", "bo"], ["1", "ada"]]
+    calls = push(google, services, folder, path, changed, "--upsert", "id")
+
+    assert calls == {"sheets.values.append": 1, "sheets.values.batchUpdate": 1}
+    assert sheet_rows(services, folder, "people.csv") == [
+        ["id", "name"],
+        ["1", "ada"],
+        ["2", "bo"],
+        ["3", "cy"],
+        ["4", "dee"],
+    ]
+
+
+def test_append_sends_only_new_rows(
+    google: FakeGoogleProcess, services: Services, folder: str, tmp_path: Any
+) -> None:
+    path = tmp_path / "log.csv"
+    rows = [["n"], ["1"], ["2"]]
+    push(google, services, folder, path, rows, "--append")
+
+    calls = push(google, services, folder, path, rows, "--append")
+    assert calls == {"sheets.values.append": 0, "sheets.values.batchUpdate": 0}
+
+    calls = push(google, services, folder, path, rows + [["3"]], "--append")
+    assert calls == {"sheets.values.append": 1, "sheets.values.batchUpdate": 1}
+    assert sheet_rows(services, folder, "log.csv") == rows + [["3"]]
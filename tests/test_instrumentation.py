@@ -0,0 +1,49 @@
+import json
+from typing import Any, Iterator
+
+import pytest
+
+from gpush.auth.services import Services
+from gpush.requests.gdrive import create_drive_folder, list_folder
+from gpush.requests.instrumentation import StatsCollector, instrumentation
+
+
+@pytest.fixture
+def collector() -> Iterator[StatsCollector]:
+    collector = instrumentation.add_observer(StatsCollector())
+    yield collector
+    instrumentation.remove_observer(collector)
+
+
+def test_api_calls_are_counted_per_operation(
+    services: Services, collector: StatsCollector, tmp_path: Any
+) -> None:
+    folder_id = create_drive_folder(services.drive, "stats", "root")
+    list_folder(services.drive, create_drive_folder(services.drive, "sub", folder_id))
+
+    path = tmp_path / "stats.json"
+    collector.write(str(path))
+    summary = json.loads(path.read_text())
+
+    create = summary["operations"]["drive.files.create"]
+    assert create["count"] == 2
+    assert create["errors"] == 0
+    assert create["statuses"] == {"200": 2}
+    assert create["bytes_sent"] > 0 and create["bytes_received"] > 0
+    assert summary["requests"] >= 2
+
+
+def test_stats_are_written_in_the_prometheus_format(
+    services: Services, collector: StatsCollector, tmp_path: Any
+) -> None:
+    create_drive_folder(services.drive, "prom", "root")
+
+    path = tmp_path / "gpush.prom"
+    collector.write(str(path))
+    lines = path.read_text().splitlines()
+
+    operation = 'operation="drive.files.create"'
+    assert "# TYPE gpush_requests_total counter" in lines
+    assert f'gpush_requests_total{{{operation},status="200"}} 1' in lines
+    assert f"gpush_request_duration_seconds_count{{{operation}}} 1" in lines
+    assert oct(path.stat().st_mode & 0o777) == oct(0o644)
@@ -0,0 +1,73 @@
+import os
+from typing import Any
+
+import pytest
+
+import gpush.journal
+from gpush.journal import Journal
+
+
+def test_completions_survive_reopening(tmp_path: Any) -> None:
+    path = tmp_path / "a.txt"
+    path.write_text("a")
+    journal = Journal("push")
+    journal.start([(str(path), "create", 1), ("b.txt", "create", 1)], resume=False)
+    journal.complete(str(path), "a-id", os.stat(path))
+    journal.close()
+
+    journal = Journal("push")
+    assert journal.interrupted()
+    (completed,) = journal.completed().items()
+    assert completed[0] == str(path)
+    assert completed[1].file_id == "a-id"
+    assert completed[1].size == 1
+    assert completed[1].mtime_ns == os.stat(path).st_mtime_ns
+    journal.close()
+
+    other = Journal("another push")
+    assert not other.interrupted()
+    other.close()
+
+
+def test_a_new_push_forgets_the_interrupted_one() -> None:
+    journal = Journal("push")
+    journal.start([("a.txt", "create", 1)], resume=False)
+    journal.complete("a.txt", "a-id")
+
+    journal.start([("a.txt", "create", 1)], resume=True)
+    assert list(journal.completed()) == ["a.txt"]
+    journal.start([("a.txt", "create", 1)], resume=False)
+    assert journal.completed() == {}
+    journal.close()
+
+
+def test_a_finished_push_leaves_no_journal() -> None:
+    journal = Journal("push")
+    journal.start([("a.txt", "create", 1)], resume=False)
+    journal.complete("a.txt", "a-id")
+    journal.finish()
+    journal.close()
+
+    journal = Journal("push")
+    assert not journal.interrupted()
+    assert journal.completed() == {}
+    journal.close()
+
+
+def test_completions_are_committed_in_batches(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(gpush.journal, "COMMIT_EVERY", 3)
+    monkeypatch.setattr(gpush.journal, "COMMIT_INTERVAL", 3600.0)
+    journal = Journal("push")
+    journal.start([(f"{n}.txt", "create", 1) for n in range(4)], resume=False)
+    reader = Journal("push")
+
+    for n in range(2):
+        journal.complete(f"{n}.txt", f"{n}-id")
+    assert reader.completed() == {}
+    journal.complete("2.txt", "2-id")
+    assert len(reader.completed()) == 3
+
+    journal.complete("3.txt", "3-id")
+    journal.close()
+    assert len(reader.completed()) == 4
+    reader.close()
@@ -0,0 +1,84 @@
+import json
+import re
+import sys
+from typing import Any, List, Optional
+
+import pytest
+
+from gpush.cli import build_parser, main
+from gpush.manifest import ManifestError, load_manifest
+
+
+def load(
+    path: Any, entries: Any, folder_id: Optional[str] = "default-folder"
+) -> List[Any]:
+    path.write_text(entries if isinstance(entries, str) else json.dumps(entries))
+    args = build_parser().parse_args(["--manifest", str(path)])
+    return load_manifest(str(path), args, folder_id)
+
+
+def test_entries_are_relative_to_the_manifest(tmp_path: Any) -> None:
+    (entry,) = load(
+        tmp_path / "jobs.json",
+        [{"source": "daily/sales.csv", "name": "Sales", "sheet": "Today"}],
+    )
+    assert entry.source == str(tmp_path / "daily" / "sales.csv")
+    assert entry.target == ("default-folder", "Sales")
+    assert entry.file.sheet == "Today"
+
+
+def test_csv_manifests_and_modes(tmp_path: Any) -> None:
+    sales, stock = load(
+        tmp_path / "jobs.csv",
+        "source,folder,name,sheet,mode,key\n"
+        "sales.csv,,Sales,,sync,\n"
+        "\n"
+        "stock.csv,other,Stock,,upsert,sku\n",
+    )
+    assert sales.file.sync and sales.folder_id == "default-folder"
+    assert stock.file.upsert == "sku" and stock.folder_id == "other"
+    assert stock.location.endswith("jobs.csv:4")
+
+
+@pytest.mark.parametrize(
+    "entries, message",
+    [
+        ([], "has no entries"),
+        ({"jobs": []}, "must hold a list of entries"),
+        ([{"name": "x"}], "source is missing"),
+        ([{"source": "x", "colour": "red"}], "unknown key(s) colour"),
+        ([{"source": "x", "mode": "merge"}], "unknown mode 'merge'"),
+        ([{"source": "x", "mode": "upsert"}], "needs a key column"),
+        ([{"source": "x", "key": "id"}], "only applies to mode 'upsert'"),
+    ],
+)
+def test_invalid_manifests_are_rejected(
+    tmp_path: Any, entries: Any, message: str
+) -> None:
+    with pytest.raises(ManifestError, match=re.escape(message)):
+        load(tmp_path / "jobs.json", entries)
+
+
+def test_unknown_csv_columns_are_rejected(tmp_path: Any) -> None:
+    with pytest.raises(ManifestError, match="unknown column"):
+        load(tmp_path / "jobs.csv", "source,target\nx,y\n")
+
+
+def test_entries_need_a_folder(tmp_path: Any) -> None:
+    with pytest.raises(ManifestError, match=r"jobs.json\[0\]: no folder given"):
+        load(tmp_path / "jobs.json", [{"source": "x"}], folder_id=None)
+
+
+@pytest.mark.parametrize("jobs", ["0", "-2"])
+def test_jobs_below_one_are_rejected(
+    tmp_path: Any,
+    jobs: str,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture,
+) -> None:
+    monkeypatch.setattr(
+        sys, "argv", ["gpush", "--manifest", str(tmp_path / "jobs.csv"), "-j", jobs]
+    )
+    with pytest.raises(SystemExit):
+        main()
+    assert "--jobs must be positive" in capsys.readouterr().err
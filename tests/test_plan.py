@@ -0,0 +1,110 @@
+import os
+from typing import Any, List
+
+import pytest
+
+from gpush.auth.services import Services
+from gpush.cli import _file_details, _run_plan, build_parser
+from gpush.handlers.plan import Action, Operation, Plan, resume_plan
+from gpush.handlers.upload import FileDetails, UploadType
+from gpush.journal import Journal
+from gpush.requests.resumable import upload_key
+
+
+def make_tree(root: Any, names: List[str]) -> Plan:
+    """A plan that updates every file of a flat directory, as `make_plan` would."""
+    root.mkdir()
+    file = FileDetails(path=str(root), name="tree", sheet="Sheet1", type=UploadType.DIR)
+    plan = Plan("folder", file)
+    parent = plan.add(
+        Operation(Action.SKIP, str(root), "tree", UploadType.DIR, file_id="tree-id")
+    )
+    for name in names:
+        path = root / name
+        path.write_bytes(name.encode())
+        plan.add(
+            Operation(
+                Action.UPDATE,
+                str(path),
+                name,
+                UploadType.OTHER,
+                parent,
+                file_id=f"{name}-id",
+                size=len(name),
+            )
+        )
+    return plan
+
+
+def journal_of(plan: Plan) -> Journal:
+    return Journal(upload_key(plan.file.path, plan.folder_id, plan.file.name))
+
+
+def interrupt(plan: Plan, pushed: List[int]) -> None:
+    """Journal a push of the plan that stopped after the given operations."""
+    journal = journal_of(plan)
+    journal.start(
+        ((op.path, op.action.value, op.size) for op in plan.operations), resume=False
+    )
+    for index in pushed:
+        operation = plan.operations[index]
+        journal.complete(operation.path, operation.file_id, os.stat(operation.path))
+    journal.close()
+
+
+def actions(plan: Plan) -> List[Action]:
+    return [operation.action for operation in plan.operations[1:]]
+
+
+def test_files_pushed_before_the_interruption_are_skipped(tmp_path: Any) -> None:
+    plan = make_tree(tmp_path / "tree", ["a", "b", "c"])
+    interrupt(plan, pushed=[1, 3])
+
+    resumed = resume_plan(plan)
+    assert resumed.file.resume
+    assert actions(resumed) == [Action.SKIP, Action.UPDATE, Action.SKIP]
+    assert resumed.operations[1].reason == "pushed before the interruption"
+
+
+def test_files_changed_since_the_interruption_are_pushed_again(tmp_path: Any) -> None:
+    plan = make_tree(tmp_path / "tree", ["a", "b"])
+    interrupt(plan, pushed=[1, 2])
+    (tmp_path / "tree" / "b").write_bytes(b"changed")
+
+    assert actions(resume_plan(plan)) == [Action.SKIP, Action.UPDATE]
+
+
+def test_nothing_is_skipped_without_a_journal(tmp_path: Any) -> None:
+    plan = make_tree(tmp_path / "tree", ["a", "b"])
+    assert actions(resume_plan(plan)) == [Action.UPDATE, Action.UPDATE]
+
+
+def test_a_finished_push_leaves_nothing_to_resume(tmp_path: Any) -> None:
+    plan = make_tree(tmp_path / "tree", ["a", "b"])
+    interrupt(plan, pushed=[1, 2])
+    journal = journal_of(plan)
+    journal.finish()
+    journal.close()
+
+    assert actions(resume_plan(plan)) == [Action.UPDATE, Action.UPDATE]
+
+
+def test_a_saved_plan_is_loaded_once(
+    tmp_path: Any, services: Services, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = str(tmp_path / "plan.json")
+    make_tree(tmp_path / "tree", ["a.bin"]).save(path)
+    loads = []
+    load = Plan.load
+
+    def counting_load(plan_path: str) -> Plan:
+        loads.append(plan_path)
+        return load(plan_path)
+
+    monkeypatch.setattr(Plan, "load", staticmethod(counting_load))
+    parser = build_parser()
+    file, plan = _file_details(parser, parser.parse_args(["--plan", path, "--dry-run"]))
+
+    assert plan is not None and file.plan == path
+    assert _run_plan(services, None, file, plan) is False
+    assert loads == [path]
@@ -0,0 +1,65 @@
+import csv
+import os
+from typing import Any, List
+
+from googleapiclient.http import MediaInMemoryUpload  # type: ignore
+
+from gpush.auth.services import Services
+from gpush.pull import pull
+from gpush.requests.gdrive import create_drive_folder, create_google_sheet
+from gpush.requests.gsheets import upload_data_to_spreadsheet
+
+
+def create_file(services: Services, folder_id: str, name: str, data: bytes) -> str:
+    metadata = {"name": name, "parents": [folder_id]}
+    media = MediaInMemoryUpload(
+        data, mimetype="application/octet-stream", resumable=True
+    )
+    return (
+        services.drive.files().create(body=metadata, media_body=media).execute()["id"]
+    )
+
+
+def read_csv(path: str) -> List[List[Any]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_entries_with_the_same_local_name_are_all_pulled(
+    services: Services, tmp_path: Any
+) -> None:
+    folder_id = create_drive_folder(services.drive, "collisions", "root")
+    first = create_file(services, folder_id, "data.csv", b"first\n")
+    second = create_file(services, folder_id, "data.csv", b"second\n")
+    sheet_id = create_google_sheet(services.drive, folder_id, "data")
+    upload_data_to_spreadsheet(services.sheets, sheet_id, "data", [["a", "b"]])
+
+    out = tmp_path / "out"
+    pull(services, folder_id, str(out))
+
+    # Files keep the name before sheets, and the file with the lower ID before others
+    kept, renamed = sorted([(first, "first\n"), (second, "second\n")])
+    assert sorted(os.listdir(out)) == sorted(
+        ["data.csv", f"data ({renamed[0]}).csv", f"data ({sheet_id}).csv"]
+    )
+    assert (out / "data.csv").read_text() == kept[1]
+    assert (out / f"data ({renamed[0]}).csv").read_text() == renamed[1]
+    assert read_csv(str(out / f"data ({sheet_id}).csv"))[0][:2] == ["a", "b"]
+
+
+def test_exported_rows_are_padded_to_the_widest_row(
+    services: Services, tmp_path: Any
+) -> None:
+    sheet_id = create_google_sheet(services.drive, "root", "ragged")
+    rows = [["a", "b", "c"], ["1"], [], ["2", "3"]]
+    upload_data_to_spreadsheet(services.sheets, sheet_id, "ragged", rows)
+
+    path = str(tmp_path / "ragged.csv")
+    pull(services, sheet_id, path)
+
+    assert read_csv(path) == [
+        ["a", "b", "c"],
+        ["1", "", ""],
+        ["", "", ""],
+        ["2", "3", ""],
+    ]
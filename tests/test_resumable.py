@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+from gpush.requests.resumable import StreamUpload
+
+
+class Trickle(io.RawIOBase):
+    """A forward-only stream that returns at most a few bytes per read, like a pipe."""
+
+    def __init__(self, data: bytes, step: int = 3) -> None:
+        self._data = data
+        self._step = step
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        size = self._step if size < 0 else min(size, self._step)
+        data, self._data = self._data[:size], self._data[size:]
+        return data
+
+
+def test_size_is_known_once_the_last_chunk_is_next() -> None:
+    upload = StreamUpload(Trickle(bytes(range(25))), "application/x-tar", chunksize=10)
+    assert upload.size() is None
+    assert upload.getbytes(0, 10) == bytes(range(10))
+    assert upload.size() is None
+    assert upload.getbytes(10, 10) == bytes(range(10, 20))
+    # The read-ahead reaches the end of the stream before the final chunk is sent
+    assert upload.size() == 25
+    assert upload.getbytes(20, 10) == bytes(range(20, 25))
+
+
+def test_a_stream_of_exactly_one_chunk_carries_its_size() -> None:
+    upload = StreamUpload(io.BytesIO(b"x" * 10), "application/x-tar", chunksize=10)
+    assert upload.size() == 10
+
+
+def test_a_failed_chunk_is_resent_from_the_confirmed_byte() -> None:
+    upload = StreamUpload(
+        io.BytesIO(bytes(range(30))), "application/x-tar", chunksize=10
+    )
+    upload.size()
+    assert upload.getbytes(0, 10) == bytes(range(10))
+    upload.size()
+    upload.getbytes(10, 10)
+    # The server only confirmed 15 bytes of the second chunk
+    assert upload.getbytes(15, 10) == bytes(range(15, 25))
+
+
+def test_dropped_bytes_cannot_be_resent() -> None:
+    upload = StreamUpload(
+        io.BytesIO(bytes(range(30))), "application/x-tar", chunksize=10
+    )
+    upload.size()
+    upload.getbytes(0, 10)
+    upload.size()
+    upload.getbytes(10, 10)
+    with pytest.raises(ValueError):
+        upload.getbytes(5, 10)
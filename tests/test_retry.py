@@ -0,0 +1,67 @@
+import json
+import socket
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from gpush.requests import retry
+from gpush.requests.retry import (
+    RetryPolicy,
+    TokenBucket,
+    backoff,
+    backoff_delay,
+    is_retryable,
+)
+
+
+def http_error(status: int, reason: str = "", **headers: str) -> HttpError:
+    content = json.dumps({"error": {"errors": [{"reason": reason}]}}).encode()
+    return HttpError(httplib2.Response({"status": status, **headers}), content)
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_server_errors_are_retried_when_idempotent(status: int) -> None:
+    assert is_retryable(http_error(status), idempotent=True)
+
+
+@pytest.mark.parametrize("status", [400, 401, 404, 409])
+def test_client_errors_are_not_retried(status: int) -> None:
+    assert not is_retryable(http_error(status), idempotent=True)
+
+
+def test_rate_limits_are_retried_even_when_not_idempotent() -> None:
+    assert is_retryable(http_error(429), idempotent=False)
+    assert is_retryable(http_error(403, "userRateLimitExceeded"), idempotent=False)
+    assert not is_retryable(http_error(403, "insufficientPermissions"), True)
+
+
+def test_unknown_outcomes_are_only_retried_when_idempotent() -> None:
+    for error in (http_error(503), ConnectionError(), socket.timeout()):
+        assert is_retryable(error, idempotent=True)
+        assert not is_retryable(error, idempotent=False)
+
+
+def test_backoff_honours_retry_after(monkeypatch: pytest.MonkeyPatch) -> None:
+    slept = []
+    monkeypatch.setattr(retry.time, "sleep", slept.append)
+    backoff(http_error(503, **{"retry-after": "7"}), 0, TokenBucket(10, 10))
+    assert slept == [7.0]
+
+
+def test_backoff_is_jittered_and_bounded() -> None:
+    policy = RetryPolicy(base_delay=1.0, max_delay=8.0)
+    bucket = TokenBucket(10, 10)
+    for attempt in range(10):
+        delay = backoff_delay(http_error(500), attempt, bucket, policy)
+        assert 0 <= delay <= min(8.0, 2**attempt)
+
+
+def test_rate_limited_backoff_pauses_the_bucket() -> None:
+    bucket = TokenBucket(1000, 1000)
+    backoff_delay(http_error(429, **{"retry-after": "5"}), 0, bucket)
+    assert bucket.reserve() > 4
+
+    bucket = TokenBucket(1000, 1000)
+    backoff_delay(http_error(503, **{"retry-after": "5"}), 0, bucket)
+    assert bucket.reserve() == 0
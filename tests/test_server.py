@@ -0,0 +1,63 @@
+import threading
+from typing import Any, Iterator
+
+import pytest
+
+import gpush.server
+from gpush.auth.services import Services
+from gpush.cli import build_parser
+from gpush.client import PROTOCOL_VERSION, submit
+from gpush.requests.gdrive import create_drive_folder, folder_index, list_folder
+from gpush.server import PushServer
+
+
+@pytest.fixture
+def server(services: Services, folder: str, tmp_path: Any) -> Iterator[PushServer]:
+    server = PushServer(str(tmp_path / "push.sock"), services, folder_id=folder, jobs=2)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join(10)
+
+
+def test_uploads_are_run_by_the_server(
+    server: PushServer, services: Services, folder: str, tmp_path: Any
+) -> None:
+    path = tmp_path / "notes.txt"
+    path.write_text("notes")
+    args = build_parser().parse_args([str(path)])
+
+    response = submit(args, socket_path=server.socket_path)
+    assert response["ok"], response
+    assert "notes.txt" in list_folder(services.drive, folder)
+
+    args = build_parser().parse_args([str(tmp_path / "missing.txt")])
+    response = submit(args, socket_path=server.socket_path)
+    assert not response["ok"]
+
+
+def test_a_failed_upload_forgets_only_the_listing_of_its_folder(
+    server: PushServer,
+    services: Services,
+    folder: str,
+    tmp_path: Any,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    other = create_drive_folder(services.drive, "other", folder)
+    list_folder(services.drive, folder)
+    list_folder(services.drive, other)
+
+    def fail(*args: Any) -> None:
+        raise RuntimeError("Drive is down")
+
+    monkeypatch.setattr(gpush.server, "upload_file", fail)
+    path = tmp_path / "notes.txt"
+    path.write_text("notes")
+    args = vars(build_parser().parse_args([str(path)]))
+
+    response = server.run({"version": PROTOCOL_VERSION, "args": args})
+    assert response == {"ok": False, "error": "Drive is down"}
+    assert not folder_index.is_loaded(folder)
+    assert folder_index.is_loaded(other)
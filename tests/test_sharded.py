@@ -0,0 +1,64 @@
+import csv
+from typing import Any, List
+
+from gpush.auth.services import Services
+from gpush.cli import build_parser
+from gpush.handlers.upload import FileDetails, upload_file
+from gpush.requests.gdrive import SPREADSHEET_MIME_TYPE, find_file
+from gpush.requests.gsheets import (
+    create_missing_sheets,
+    list_sheets,
+    read_rows,
+    spreadsheet_session,
+)
+
+
+def push_shards(services: Services, folder_id: str, path: Any, rows: int) -> str:
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows([["id"]] + [[str(i)] for i in range(rows)])
+    args = build_parser().parse_args(
+        [str(path), "--sheet", "Data", "--shard", "--shard-rows", "3"]
+    )
+    upload_file(services, folder_id, FileDetails.from_args(args))
+    spreadsheet_id = find_file(
+        services.drive, folder_id, path.name, SPREADSHEET_MIME_TYPE
+    )
+    assert spreadsheet_id is not None
+    spreadsheet_session(services.sheets, spreadsheet_id).reset()
+    return spreadsheet_id
+
+
+def tab(services: Services, spreadsheet_id: str, title: str) -> List[List[Any]]:
+    sheet = spreadsheet_session(services.sheets, spreadsheet_id).sheets[title]
+    return list(read_rows(services.sheets, spreadsheet_id, sheet))
+
+
+def test_a_csv_is_split_into_tabs_with_an_index(
+    services: Services, folder: str, tmp_path: Any
+) -> None:
+    spreadsheet_id = push_shards(services, folder, tmp_path / "big.csv", 7)
+
+    assert tab(services, spreadsheet_id, "Data 1") == [["id"], ["0"], ["1"], ["2"]]
+    assert tab(services, spreadsheet_id, "Data 3") == [["id"], ["6"]]
+    index = tab(services, spreadsheet_id, "Index")
+    assert [row[2] for row in index[1:]] == ["Data 1", "Data 2", "Data 3"]
+
+
+def test_only_stale_shard_tabs_are_deleted(
+    services: Services, folder: str, tmp_path: Any
+) -> None:
+    path = tmp_path / "big.csv"
+    spreadsheet_id = push_shards(services, folder, path, 10)
+    # Tabs of the user's that look like shards, but are not listed in the index
+    create_missing_sheets(services.sheets, spreadsheet_id, ["Data 2024", "Data 5"])
+
+    push_shards(services, folder, path, 4)
+
+    assert sorted(list_sheets(services.sheets, spreadsheet_id)) == [
+        "Data 1",
+        "Data 2",
+        "Data 2024",
+        "Data 5",
+        "Index",
+        "Sheet1",
+    ]
@@ -0,0 +1,58 @@
+import csv
+import math
+from typing import Any, List
+
+import pytest
+from fake_google import FakeGoogleProcess
+
+from gpush.auth.services import Services
+from gpush.cli import build_parser
+from gpush.handlers.upload import FileDetails, upload_file
+from gpush.requests.gdrive import find_file
+from gpush.requests.gsheets import read_rows, spreadsheet_session
+
+
+def write_csv(path: Any, rows: List[List[str]]) -> str:
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+
+def sheet_rows(services: Services, folder_id: str, name: str) -> List[List[Any]]:
+    spreadsheet_id = find_file(services.drive, folder_id, name)
+    assert spreadsheet_id is not None
+    session = spreadsheet_session(services.sheets, spreadsheet_id)
+    session.reset()
+    return list(read_rows(services.sheets, spreadsheet_id, session.sheets["Data"]))
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 1000])
+def test_a_streamed_csv_is_written_block_by_block(
+    google: FakeGoogleProcess,
+    services: Services,
+    folder: str,
+    tmp_path: Any,
+    block_size: int,
+) -> None:
+    rows = [["id", "value"]] + [[str(i), f"v{i}"] for i in range(10)]
+    path = write_csv(tmp_path / "data.csv", rows)
+    args = build_parser().parse_args(
+        [path, "--sheet", "Data", "--stream", "--block-size", str(block_size)]
+    )
+
+    before = google.stats()["calls"].get("sheets.values.update", 0)
+    upload_file(services, folder, FileDetails.from_args(args))
+    updates = google.stats()["calls"].get("sheets.values.update", 0) - before
+
+    # The first block is written with the sheet's preparation, the others one by one
+    assert updates == math.ceil(len(rows) / block_size) - 1
+    assert sheet_rows(services, folder, "data.csv") == rows
+
+
+@pytest.mark.parametrize("block_size", ["0", "-1"])
+def test_block_sizes_below_one_are_rejected(tmp_path: Any, block_size: str) -> None:
+    path = write_csv(tmp_path / "data.csv", [["a"]])
+    args = build_parser().parse_args([path, "--stream", "--block-size", block_size])
+
+    with pytest.raises(ValueError, match="--block-size"):
+        FileDetails.from_args(args)
@@ -0,0 +1,91 @@
+from typing import Any, Dict
+
+from fake_google import FakeGoogleProcess
+
+from gpush.auth.services import Services
+from gpush.checksums import local_hashes
+from gpush.handlers.upload import FileDetails, UploadType, upload_file
+from gpush.requests.gdrive import folder_index, list_folder
+
+
+def push(services: Services, folder_id: str, root: Any) -> None:
+    file = FileDetails(str(root), root.name, "Sheet1", UploadType.DIR, sync=True)
+    upload_file(services, folder_id, file)
+    folder_index.invalidate()
+
+
+def uploads(google: FakeGoogleProcess, before: Dict[str, int]) -> Dict[str, int]:
+    calls = google.stats()["calls"]
+    return {
+        operation: calls.get(operation, 0) - before.get(operation, 0)
+        for operation in ("drive.files.create[upload]", "drive.files.update[upload]")
+    }
+
+
+def test_only_changed_files_are_pushed_again(
+    google: FakeGoogleProcess, services: Services, folder: str, tmp_path: Any
+) -> None:
+    root = tmp_path / "tree"
+    root.mkdir()
+    for name in ("a.bin", "b.bin", "c.bin"):
+        (root / name).write_bytes(name.encode())
+    push(services, folder, root)
+    tree = list_folder(services.drive, folder)["tree"]
+    ids = {name: r.id for name, r in list_folder(services.drive, tree.id).items()}
+
+    before = google.stats()["calls"]
+    push(services, folder, root)
+    assert uploads(google, before) == {
+        "drive.files.create[upload]": 0,
+        "drive.files.update[upload]": 0,
+    }
+
+    (root / "b.bin").write_bytes(b"changed")
+    (root / "d.bin").write_bytes(b"new")
+    before = google.stats()["calls"]
+    push(services, folder, root)
+    assert uploads(google, before) == {
+        "drive.files.create[upload]": 1,
+        "drive.files.update[upload]": 1,
+    }
+
+    entries = list_folder(services.drive, tree.id)
+    # Changed files are updated in place
+    assert entries["b.bin"].id == ids["b.bin"]
+    assert entries["b.bin"].size == len(b"changed")
+    assert sorted(entries) == ["a.bin", "b.bin", "c.bin", "d.bin"]
+
+
+def test_unchanged_files_are_not_read_again(
+    services: Services, folder: str, tmp_path: Any, monkeypatch: Any
+) -> None:
+    root = tmp_path / "tree"
+    root.mkdir()
+    (root / "a.bin").write_bytes(b"a")
+    # New files need no checksum; the second push hashes it to compare it with Drive's
+    push(services, folder, root)
+    push(services, folder, root)
+
+    def md5_file(path: str) -> str:
+        raise AssertionError(f"{path} was hashed again")
+
+    monkeypatch.setattr("gpush.checksums.md5_file", md5_file)
+    push(services, folder, root)
+    assert local_hashes.md5(str(root / "a.bin"))
+
+
+def test_an_unchanged_csv_is_not_written_again(
+    google: FakeGoogleProcess, services: Services, folder: str, tmp_path: Any
+) -> None:
+    path = tmp_path / "data.csv"
+    path.write_text("a,b\n1,2\n")
+    file = FileDetails(str(path), "data", "Data", UploadType.CSV, sync=True)
+    upload_file(services, folder, file)
+
+    before = sum(google.stats()["calls"].values())
+    upload_file(services, folder, file)
+    assert sum(google.stats()["calls"].values()) == before
+
+    path.write_text("a,b\n1,3\n")
+    upload_file(services, folder, file)
+    assert sum(google.stats()["calls"].values()) > before
@@ -0,0 +1,66 @@
+from typing import Any, Dict, Union
+
+from gpush.auth.services import Services
+from gpush.handlers.upload import FileDetails, UploadType, upload_file
+from gpush.requests.gdrive import folder_index, list_folder, list_folders
+
+Tree = Dict[str, Union["Tree", int]]
+
+
+def make_tree(root: Any, depth: int, width: int) -> None:
+    root.mkdir()
+    for index in range(width):
+        (root / f"file{index}.bin").write_bytes(b"x" * (depth * 10 + index))
+    if depth > 0:
+        for index in range(2):
+            make_tree(root / f"dir{index}", depth - 1, width)
+
+
+def local_tree(root: Any) -> Tree:
+    return {
+        path.name: local_tree(path) if path.is_dir() else path.stat().st_size
+        for path in root.iterdir()
+    }
+
+
+def remote_tree(services: Services, folder_id: str) -> Tree:
+    """The names and sizes below a Drive folder, listed afresh."""
+    folder_index.invalidate(folder_id)
+    return {
+        name: (
+            remote_tree(services, remote.id) if remote.is_folder else remote.size or 0
+        )
+        for name, remote in list_folder(services.drive, folder_id).items()
+    }
+
+
+def push(services: Services, folder_id: str, root: Any, jobs: int) -> None:
+    file = FileDetails(str(root), root.name, "Sheet1", UploadType.DIR, jobs=jobs)
+    upload_file(services, folder_id, file)
+
+
+def test_a_tree_is_mirrored_by_concurrent_workers(
+    services: Services, folder: str, tmp_path: Any
+) -> None:
+    root = tmp_path / "tree"
+    make_tree(root, depth=2, width=5)
+
+    push(services, folder, root, jobs=4)
+
+    assert remote_tree(services, folder) == {"tree": local_tree(root)}
+
+
+def test_pushing_a_tree_again_reuses_its_folders(
+    services: Services, folder: str, tmp_path: Any
+) -> None:
+    root = tmp_path / "tree"
+    make_tree(root, depth=1, width=2)
+
+    push(services, folder, root, jobs=4)
+    folder_index.invalidate()
+    push(services, folder, root, jobs=4)
+
+    # Drive allows duplicate names; list every entry to see them
+    (tree,) = list_folders(services.drive, [folder])[folder]
+    entries = list_folders(services.drive, [tree.id])[tree.id]
+    assert sorted(r.name for r in entries if r.is_folder) == ["dir0", "dir1"]
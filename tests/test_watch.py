@@ -0,0 +1,89 @@
+import threading
+import time
+from typing import Any, Optional, Set
+
+from gpush.auth.services import Services
+from gpush.handlers.upload import FileDetails, UploadType
+from gpush.requests.gdrive import list_folder
+from gpush.watch import DirectoryWatch, InotifyWatcher, PollingWatcher
+
+
+class Stop(Exception):
+    pass
+
+
+class StoppableWatcher(PollingWatcher):
+    def __init__(self, root: str, stop: threading.Event) -> None:
+        super().__init__(root, interval=0.05)
+        self.stop = stop
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        if self.stop.is_set():
+            raise Stop()
+        return super().wait(timeout)
+
+
+def wait_for(condition: Any, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_inotify_reports_written_files_and_new_directories(tmp_path: Any) -> None:
+    watcher = InotifyWatcher(str(tmp_path))
+    try:
+        (tmp_path / "a.txt").write_text("a")
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "b.txt").write_text("b")
+
+        changed: Set[str] = set()
+        wait_for(lambda: changed.update(watcher.wait(0.1)) or len(changed) == 2)
+        assert changed == {str(tmp_path / "a.txt"), str(tmp_path / "sub" / "b.txt")}
+    finally:
+        watcher.close()
+
+
+def test_polling_reports_changed_files_only(tmp_path: Any) -> None:
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "b.txt").write_text("b")
+    watcher = PollingWatcher(str(tmp_path), interval=0.01)
+
+    (tmp_path / "b.txt").write_text("bb")
+    assert watcher.wait() == {str(tmp_path / "b.txt")}
+    assert watcher.wait() == set()
+
+
+def test_changes_are_pushed_while_watching(
+    services: Services, folder: str, tmp_path: Any, monkeypatch: Any
+) -> None:
+    root = tmp_path / "tree"
+    root.mkdir()
+    (root / "a.txt").write_text("a")
+    file = FileDetails(str(root), "tree", "Sheet1", UploadType.DIR)
+    watch = DirectoryWatch(services, folder, file, debounce=0.05, poll_interval=0.05)
+    stop = threading.Event()
+    monkeypatch.setattr(watch, "_watcher", lambda: StoppableWatcher(str(root), stop))
+
+    def run() -> None:
+        try:
+            watch.run()
+        except Stop:
+            pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        wait_for(lambda: "tree" in list_folder(services.drive, folder))
+        tree = list_folder(services.drive, folder)["tree"].id
+        wait_for(lambda: "a.txt" in list_folder(services.drive, tree))
+
+        (root / "sub").mkdir()
+        (root / "sub" / "b.txt").write_text("b")
+        wait_for(lambda: "sub" in list_folder(services.drive, tree))
+        sub = list_folder(services.drive, tree)["sub"].id
+        wait_for(lambda: "b.txt" in list_folder(services.drive, sub))
+    finally:
+        stop.set()
+        thread.join(10)
+    assert not thread.is_alive()
@@ -0,0 +1,37 @@
+from typing import Any, List
+
+from openpyxl import Workbook
+
+from gpush.auth.services import Services
+from gpush.cli import build_parser
+from gpush.handlers.upload import FileDetails, upload_file
+from gpush.requests.gdrive import find_file
+from gpush.requests.gsheets import read_rows, spreadsheet_session
+
+
+def write_workbook(path: Any, rows: List[List[str]]) -> str:
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = "Data"
+    for row in rows:
+        worksheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+def test_a_shorter_workbook_leaves_no_stale_rows(
+    services: Services, folder: str, tmp_path: Any
+) -> None:
+    path = tmp_path / "book.xlsx"
+    rows = [["id", "value"]] + [[str(i), f"v{i}"] for i in range(5)]
+
+    for count in (len(rows), 2):
+        args = build_parser().parse_args([write_workbook(path, rows[:count])])
+        upload_file(services, folder, FileDetails.from_args(args))
+
+    spreadsheet_id = find_file(services.drive, folder, "book.xlsx")
+    assert spreadsheet_id is not None
+    session = spreadsheet_session(services.sheets, spreadsheet_id)
+    session.reset()
+    written = list(read_rows(services.sheets, spreadsheet_id, session.sheets["Data"]))
+    assert written == rows[:2]